@@ -0,0 +1,73 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from database import NotesDatabase
+
+
+class AsyncNotesDatabase:
+    """Accesso asincrono a NotesDatabase per gli endpoint FastAPI.
+
+    Le letture girano su un pool di thread (in WAL più lettori procedono in
+    parallelo), le scritture su un unico thread dedicato, così non si
+    contendono mai il lock di scrittura di SQLite. Con `readers=0` i metodi
+    vengono eseguiti direttamente nel loop (utile solo per confronti).
+    """
+
+    READ_METHODS = frozenset({
+        'get_folders', 'get_tags', 'get_notes', 'count_notes', 'note_exists',
+        'get_note_by_id', 'get_notes_by_ids', 'search_notes', 'suggest', 'get_note_history',
+        'count_note_history', 'get_note_version', 'diff_note_versions',
+        'get_changes', 'latest_change_seq', 'sync', 'get_stats', 'check_counters',
+        'data_version',
+    })
+    WRITE_METHODS = frozenset({
+        'create_folder', 'update_folder', 'delete_folder', 'create_tag',
+        'create_note', 'update_note', 'delete_note', 'rebuild_search_index',
+        'import_notes', 'batch_update_notes', 'prune_change_log', 'apply_autosaves',
+        'rebuild_counters',
+    })
+
+    def __init__(self, db: NotesDatabase, readers: Optional[int] = None):
+        if readers is None:
+            # Una connessione del pool resta sempre disponibile per lo scrittore
+            readers = max(1, db.pool.max_size - 1)
+        self.db = db
+        self.readers = readers
+        self._read_executor = None
+        self._write_executor = None
+        if readers:
+            self._read_executor = ThreadPoolExecutor(
+                max_workers=readers, thread_name_prefix='notes-db-read'
+            )
+            self._write_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='notes-db-write'
+            )
+
+    async def _run(self, executor, fn, *args, **kwargs):
+        if executor is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+    def __getattr__(self, name):
+        if name in self.READ_METHODS:
+            executor = self._read_executor
+        elif name in self.WRITE_METHODS:
+            executor = self._write_executor
+        else:
+            raise AttributeError(name)
+
+        method = getattr(self.db, name)
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self._run(executor, method, *args, **kwargs)
+
+        return call
+
+    def close(self):
+        for executor in (self._read_executor, self._write_executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
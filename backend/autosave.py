@@ -0,0 +1,112 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from async_db import AsyncNotesDatabase
+
+# Massimo numero di appunti in un singolo commit di gruppo
+MAX_BATCH = 256
+
+
+class _Pending:
+    __slots__ = ('fields', 'future', 'requests')
+
+    def __init__(self, future: asyncio.Future):
+        self.fields: Dict[str, Any] = {}
+        self.future = future
+        self.requests = 0
+
+
+class AutosaveQueue:
+    """Raggruppa i salvataggi automatici degli appunti (group commit).
+
+    Gli aggiornamenti arrivati entro `window` secondi vengono scritti
+    insieme in un'unica transazione; più aggiornamenti dello stesso appunto
+    nella finestra si fondono (l'ultimo valore di ogni campo vince). Ogni
+    richiesta attende il commit del proprio gruppo e riceve l'appunto
+    aggiornato, quindi un salvataggio confermato è già sul database.
+    """
+
+    def __init__(self, adb: AsyncNotesDatabase, window: float = 0.2, max_batch: int = MAX_BATCH):
+        self.adb = adb
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[str, _Pending] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes = set()
+
+        # Metriche
+        self._requests = 0
+        self._merged = 0
+        self._commits = 0
+        self._notes_written = 0
+        self._errors = 0
+
+    async def submit(self, note_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Accoda un aggiornamento e attende il commit; None se l'appunto non esiste"""
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(note_id)
+        if pending is None:
+            pending = self._pending[note_id] = _Pending(loop.create_future())
+        else:
+            self._merged += 1
+        auto_create = pending.fields.get('auto_create_tags', False) or fields.get('auto_create_tags', False)
+        pending.fields.update({key: value for key, value in fields.items() if value is not None})
+        pending.fields['auto_create_tags'] = auto_create
+        pending.requests += 1
+        self._requests += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+
+        # shield: una richiesta annullata non annulla il salvataggio delle altre
+        return await asyncio.shield(pending.future)
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: Dict[str, _Pending]):
+        try:
+            notes = await self.adb.apply_autosaves(
+                {note_id: pending.fields for note_id, pending in batch.items()}
+            )
+        except Exception as e:
+            self._errors += 1
+            for pending in batch.values():
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        self._commits += 1
+        self._notes_written += len(batch)
+        for note_id, pending in batch.items():
+            if not pending.future.done():
+                pending.future.set_result(notes.get(note_id))
+
+    async def close(self):
+        """Scrive gli aggiornamenti ancora in coda"""
+        self._schedule_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'window_ms': round(self.window * 1000, 1),
+            'pending': len(self._pending),
+            'requests': self._requests,
+            'merged': self._merged,
+            'commits': self._commits,
+            'notes_written': self._notes_written,
+            'commits_saved': self._requests - self._commits,
+            'avg_batch': round(self._notes_written / self._commits, 2) if self._commits else 0.0,
+            'errors': self._errors,
+        }
@@ -0,0 +1 @@
+"""Benchmark del backend (eseguire dalla cartella backend con `python -m benchmarks.<nome>`)"""
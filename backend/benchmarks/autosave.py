@@ -0,0 +1,101 @@
+"""Salvataggio automatico: una transazione per richiesta contro il group commit.
+
+N editor modificano ciascuno un appunto di codice e salvano ogni
+`--interval` secondi; si confrontano transazioni al secondo, commit
+risparmiati, versioni scritte nello storico e latenza delle richieste.
+
+    python -m benchmarks.autosave --editors 20 --interval 0.05 --duration 5
+"""
+import argparse
+import asyncio
+import time
+
+from async_db import AsyncNotesDatabase
+from autosave import AutosaveQueue
+from benchmarks.common import temp_database, summarize
+
+
+async def workload(save, note_ids, interval, duration):
+    samples = []
+    deadline = time.monotonic() + duration
+
+    async def timed_save(note_id, content):
+        started = time.perf_counter()
+        await save(note_id, content)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    async def editor(note_id):
+        # Come il browser: i salvataggi partono a intervalli regolari senza
+        # attendere la risposta del precedente
+        lines = [f'line {i}' for i in range(200)]
+        saves = []
+        edit = 0
+        while time.monotonic() < deadline:
+            edit += 1
+            lines[edit % len(lines)] = f'line {edit} edited'
+            saves.append(asyncio.create_task(timed_save(note_id, '\n'.join(lines))))
+            await asyncio.sleep(interval)
+        await asyncio.gather(*saves)
+
+    await asyncio.gather(*(editor(note_id) for note_id in note_ids))
+    return samples
+
+
+def run(editors, interval, duration, window):
+    results = {}
+    for mode in ('per_request', 'group_commit'):
+        db = temp_database()
+        note_ids = [db.create_note(f'editor {i}', '', 'code')['id'] for i in range(editors)]
+        adb = AsyncNotesDatabase(db)
+        writes_before = db.pool_stats()['writes']
+
+        async def main():
+            if mode == 'per_request':
+                save = lambda note_id, content: adb.update_note(note_id, content=content)
+                return await workload(save, note_ids, interval, duration), None
+            queue = AutosaveQueue(adb, window=window)
+            save = lambda note_id, content: queue.submit(note_id, {'content': content})
+            samples = await workload(save, note_ids, interval, duration)
+            await queue.close()
+            return samples, queue.stats()
+
+        started = time.perf_counter()
+        samples, queue_stats = asyncio.run(main())
+        elapsed = time.perf_counter() - started
+
+        commits = db.pool_stats()['writes'] - writes_before
+        with db.get_connection() as conn:
+            versions = conn.execute('SELECT COUNT(*) FROM note_history').fetchone()[0] - editors
+        result = {
+            'saves': len(samples),
+            'saves_per_sec': round(len(samples) / elapsed, 1),
+            'commits': commits,
+            'commits_per_sec': round(commits / elapsed, 1),
+            'commits_saved': len(samples) - commits,
+            'history_versions': versions,
+            'latency': summarize(samples),
+        }
+        if queue_stats:
+            result['queue'] = queue_stats
+        results[mode] = result
+        print(f'{mode:>12}: {result["saves"]} saves ({result["saves_per_sec"]}/s), '
+              f'{commits} commits ({result["commits_per_sec"]}/s), '
+              f'{versions} history versions, p50={result["latency"]["p50_ms"]:.1f}ms '
+              f'p99={result["latency"]["p99_ms"]:.1f}ms')
+        adb.close()
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--editors', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05, help='Seconds between autosaves')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--window', type=float, default=0.2, help='Group commit window (s)')
+    args = parser.parse_args()
+    run(args.editors, args.interval, args.duration, args.window)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Riorganizzazione di una cartella grande con le operazioni batch.
+
+    python -m benchmarks.batch_ops --size 10000
+"""
+import argparse
+import time
+
+from benchmarks.common import temp_database, populate_notes
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+def run(size):
+    db = temp_database()
+    archive = db.create_folder('Archivio')['id']
+    populate_notes(db, size)
+    with db.get_connection() as conn:
+        conn.execute("UPDATE notes SET folder_id = 'work'")
+
+    steps = [
+        ('move', lambda: db.batch_update_notes(
+            'move', filters={'folder_id': 'work'}, folder_id=archive)),
+        ('tag', lambda: db.batch_update_notes(
+            'tag', filters={'folder_id': archive}, tag_names=['archiviato'],
+            auto_create_tags=True)),
+        ('untag', lambda: db.batch_update_notes(
+            'untag', filters={'folder_id': archive}, tag_names=['todo'])),
+        ('delete', lambda: db.batch_update_notes(
+            'delete', filters={'tag': 'archiviato'})),
+    ]
+    results = {}
+    for name, fn in steps:
+        result, ms = timed(fn)
+        results[name] = {'ms': ms, 'matched': result['matched'], 'affected': result['affected']}
+        print(f'{name:>6}: {result["matched"]:>7} matched {result["affected"]:>7} affected  {ms}ms')
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=10000, help='Notes in the folder')
+    args = parser.parse_args()
+    run(args.size)
+
+
+if __name__ == '__main__':
+    main()
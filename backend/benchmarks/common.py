@@ -0,0 +1,99 @@
+import itertools
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from content_store import store_content
+from database import NotesDatabase
+
+WORDS = (
+    'react python sqlite docker algoritmi backend frontend idea progetto '
+    'lista spesa codice funzione classe modulo test deploy cache indice'
+).split()
+
+
+def vocabulary(size: int = 20000, seed: int = 42) -> List[str]:
+    """Parole sintetiche pronunciabili, per testi con una distribuzione realistica"""
+    rng = random.Random(seed)
+    syllables = ['ba', 'ce', 'di', 'fo', 'gu', 'la', 'me', 'ni', 'po', 'ru',
+                 'sa', 'te', 'vi', 'zo', 'ca', 'lo', 'mi', 'ne', 'ra', 'to']
+    words = set(WORDS)
+    while len(words) < size:
+        words.add(''.join(rng.choices(syllables, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+VOCABULARY = vocabulary()
+_ZIPF_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def temp_database(name: str = 'bench.db', **options) -> NotesDatabase:
+    """Database vuoto (solo dati seed) in una cartella temporanea"""
+    path = Path(tempfile.mkdtemp(prefix='notes-bench-')) / name
+    return NotesDatabase(str(path), **options)
+
+
+def populate_notes(db: NotesDatabase, count: int, content_size: int = 200,
+                   tags_per_note: int = 2, batch: int = 10000) -> List[str]:
+    """Inserisce `count` appunti sintetici direttamente via executemany"""
+    rng = random.Random(count)
+    folders = [f['id'] for f in db.get_folders()]
+    tag_ids = [t['id'] for t in db.get_tags()]
+    note_ids = []
+
+    with db.get_connection() as conn:
+        for start in range(0, count, batch):
+            notes, links = [], []
+            for i in range(start, min(start + batch, count)):
+                note_id = str(uuid.uuid4())
+                note_ids.append(note_id)
+                # Distribuzione tipo Zipf: poche parole frequenti, coda lunga di rare
+                words = rng.choices(VOCABULARY, cum_weights=_ZIPF_WEIGHTS,
+                                    k=max(1, content_size // 7))
+                notes.append((
+                    note_id,
+                    f'{rng.choice(VOCABULARY).capitalize()} {i}',
+                    store_content(conn, ' '.join(words)[:content_size]),
+                    rng.choice(('text', 'code', 'list')),
+                    rng.choice(folders),
+                    f'2026-01-01 00:00:{i % 60:02d}',
+                ))
+                for tag_id in rng.sample(tag_ids, min(tags_per_note, len(tag_ids))):
+                    links.append((note_id, tag_id))
+            conn.executemany('''
+                INSERT INTO notes (id, title, content_id, type, folder_id, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', notes)
+            conn.executemany('INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)', links)
+            conn.commit()
+
+    return note_ids
+
+
+def measure(fn: Callable[[], object], iterations: int) -> Dict[str, float]:
+    """Latenze in millisecondi di `iterations` chiamate a `fn`"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'p50_ms': round(pct(50), 4),
+        'p95_ms': round(pct(95), 4),
+        'p99_ms': round(pct(99), 4),
+    }
@@ -0,0 +1,79 @@
+"""Latenza degli endpoint di lettura con N client concorrenti, con e senza
+l'esecuzione delle query fuori dal loop degli eventi (richiede httpx).
+
+    python -m benchmarks.concurrency --notes 5000 --clients 1 16 128
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+import server
+from async_db import AsyncNotesDatabase
+from benchmarks.common import temp_database, populate_notes, summarize
+
+
+async def drive(app, note_ids, clients, requests_per_client):
+    transport = httpx.ASGITransport(app=app)
+    samples = []
+
+    async def client(seed):
+        rng = random.Random(seed)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+            for _ in range(requests_per_client):
+                choice = rng.random()
+                if choice < 0.5:
+                    url = f'/api/notes/{rng.choice(note_ids)}'
+                elif choice < 0.8:
+                    url = '/api/notes?limit=50&fields=list'
+                else:
+                    url = '/api/folders'
+                started = time.perf_counter()
+                response = await http.get(url)
+                samples.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    result = summarize(samples)
+    result['requests_per_sec'] = round(len(samples) / elapsed, 1)
+    return result
+
+
+def run(note_count, client_counts, requests_per_client):
+    db = temp_database()
+    note_ids = populate_notes(db, note_count)
+    app = server.create_app()
+
+    results = []
+    for mode, readers in (('blocking', 0), ('executor', None)):
+        adb = AsyncNotesDatabase(db, readers=readers)
+        # ASGITransport non esegue il lifespan: il database viene iniettato
+        app.dependency_overrides[server.get_db] = lambda: adb
+        for clients in client_counts:
+            result = asyncio.run(drive(app, note_ids, clients, requests_per_client))
+            result.update({'mode': mode, 'clients': clients})
+            results.append(result)
+            print(f'{mode:>9} {clients:>4} clients  p50={result["p50_ms"]:.2f}ms '
+                  f'p99={result["p99_ms"]:.2f}ms  {result["requests_per_sec"]} req/s')
+        adb.close()
+
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--notes', type=int, default=5000)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 16, 128])
+    parser.add_argument('--requests', type=int, default=50, help='Requests per client')
+    args = parser.parse_args()
+    run(args.notes, args.clients, args.requests)
+
+
+if __name__ == '__main__':
+    main()
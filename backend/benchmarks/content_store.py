@@ -0,0 +1,91 @@
+"""Spazio e scansioni con il testo nel content store, contro il testo in riga in `notes`.
+
+Per il confronto il benchmark ricrea, nello stesso database, una copia di
+`notes` con il testo in riga (`notes_inline`, lo schema prima della
+migrazione 9). `--duplicates` è la frazione di appunti con un testo già
+presente (copie, modelli).
+
+    python -m benchmarks.content_store --sizes 10000 50000 --content-size 2000
+"""
+import argparse
+import random
+
+from benchmarks.common import temp_database, populate_notes, measure
+
+# Scansione completa che legge solo metadati (nessun indice sul tipo)
+SCAN_QUERY = 'SELECT type, COUNT(*) FROM {table} WHERE title != \'\' GROUP BY type'
+
+
+def table_bytes(conn, *names) -> int:
+    """Byte occupati da tabelle e relativi indici (dbstat)"""
+    placeholders = ','.join('?' * len(names))
+    return conn.execute(f'''
+        SELECT COALESCE(SUM(pgsize), 0) FROM dbstat
+        WHERE name IN ({placeholders})
+           OR name IN (SELECT name FROM sqlite_master WHERE tbl_name IN ({placeholders}) AND type = 'index')
+    ''', names + names).fetchone()[0]
+
+
+def run(sizes, content_size, duplicates, iterations):
+    results = []
+    for size in sizes:
+        db = temp_database(cache_size=0)
+        note_ids = populate_notes(db, size, content_size=content_size)
+        rng = random.Random(0)
+        for note_id in rng.sample(note_ids, int(size * duplicates)):
+            source = db.get_note_by_id(rng.choice(note_ids))
+            db.create_note(f'Copia {note_id[:8]}', source['content'], source['type'])
+
+        with db.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE notes_inline AS
+                SELECT n.id, n.title, note_body(c.id, c.codec, c.data) AS content, n.type,
+                       n.folder_id, n.created_at, n.updated_at
+                FROM notes n JOIN note_contents c ON c.id = n.content_id
+            ''')
+            conn.commit()
+            text_bytes = conn.execute('SELECT SUM(LENGTH(CAST(content AS BLOB))) FROM notes_inline').fetchone()[0]
+            inline_bytes = table_bytes(conn, 'notes_inline')
+            notes_bytes = table_bytes(conn, 'notes')
+            store_bytes = table_bytes(conn, 'note_contents')
+
+        def scan(table):
+            with db.get_connection() as conn:
+                conn.execute(SCAN_QUERY.format(table=table)).fetchall()
+
+        result = {
+            'notes': size,
+            'text_bytes': text_bytes,
+            'inline_bytes': inline_bytes,
+            'store_bytes': notes_bytes + store_bytes,
+            'metadata_bytes': notes_bytes,
+            'ratio': round(inline_bytes / (notes_bytes + store_bytes), 2),
+            'scan_inline': measure(lambda: scan('notes_inline'), iterations),
+            'scan_store': measure(lambda: scan('notes'), iterations),
+            'page_list': measure(lambda: db.get_notes(limit=50, fields='list'), iterations),
+            'page_preview': measure(lambda: db.get_notes(limit=50, fields='preview'), iterations),
+            'page_full': measure(lambda: db.get_notes(limit=50), iterations),
+        }
+        results.append(result)
+        print(f'{size:>9} notes  inline {inline_bytes / 1e6:.1f} MB -> store '
+              f'{(notes_bytes + store_bytes) / 1e6:.1f} MB ({result["ratio"]}x, metadati '
+              f'{notes_bytes / 1e6:.1f} MB)  scan p50 {result["scan_inline"]["p50_ms"]:.2f} -> '
+              f'{result["scan_store"]["p50_ms"]:.2f}ms  page list/preview/full p50 '
+              f'{result["page_list"]["p50_ms"]:.2f}/{result["page_preview"]["p50_ms"]:.2f}/'
+              f'{result["page_full"]["p50_ms"]:.2f}ms')
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--content-size', type=int, default=2000, help='Characters per note')
+    parser.add_argument('--duplicates', type=float, default=0.05)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.content_size, args.duplicates, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
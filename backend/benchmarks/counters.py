@@ -0,0 +1,91 @@
+"""Contatori materializzati: barra laterale e statistiche contro i COUNT sulle tabelle.
+
+Per ogni dimensione misura get_folders e get_stats (senza cache) contro le
+stesse informazioni calcolate con COUNT, poi il costo dei trigger sulle
+scritture: import di appunti con e senza i trigger dei contatori.
+
+    python -m benchmarks.counters --sizes 10000 100000 500000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import temp_database, populate_notes, measure
+from counters import COUNTERS_SCHEMA
+
+# Come get_folders prima dei contatori, più i conteggi per tag e per tipo
+COUNT_QUERIES = [
+    '''
+    SELECT id, name, created_at,
+           (SELECT COUNT(*) FROM notes WHERE folder_id = folders.id) AS note_count
+    FROM folders ORDER BY name
+    ''',
+    'SELECT tag_id, COUNT(*) FROM note_tags GROUP BY tag_id',
+    'SELECT type, COUNT(*) FROM notes GROUP BY type',
+]
+
+
+def import_rate(with_counters: bool, count: int) -> float:
+    """Appunti importati al secondo (con tag e versione iniziale)"""
+    db = temp_database(cache_size=0, query_metrics=False)
+    if not with_counters:
+        with db.get_connection() as conn:
+            for step in COUNTERS_SCHEMA[1:]:
+                conn.execute(f'DROP TRIGGER {step.split()[5]}')
+            conn.commit()
+    rng = random.Random(0)
+    notes = [{
+        'title': f'Nota {i}', 'content': f'contenuto {i}', 'type': rng.choice(('text', 'code', 'list')),
+        'folder_id': rng.choice(('work', 'personal', None)), 'tag_names': rng.sample(['python', 'idea', 'todo'], 2),
+    } for i in range(count)]
+    started = time.perf_counter()
+    db.import_notes(notes)
+    seconds = time.perf_counter() - started
+    db.close()
+    return count / seconds
+
+
+def run(sizes, iterations, import_count):
+    results = []
+    for size in sizes:
+        db = temp_database(cache_size=0, query_metrics=False)
+        populate_notes(db, size, content_size=50)
+        assert not db.check_counters()
+
+        def count_scan():
+            with db.get_connection() as conn:
+                for sql in COUNT_QUERIES:
+                    conn.execute(sql).fetchall()
+
+        result = {
+            'notes': size,
+            'get_folders': measure(db.get_folders, iterations),
+            'get_stats': measure(db.get_stats, iterations),
+            'count_scan': measure(count_scan, max(3, iterations // 20)),
+            'check_counters': measure(db.check_counters, 1),
+        }
+        results.append(result)
+        print(f'{size:>9} notes  get_folders p50={result["get_folders"]["p50_ms"]:.3f}ms  '
+              f'get_stats p50={result["get_stats"]["p50_ms"]:.3f}ms  '
+              f'COUNT scan p50={result["count_scan"]["p50_ms"]:.1f}ms  '
+              f'check_counters={result["check_counters"]["p50_ms"]:.0f}ms')
+        db.close()
+
+    rates = {label: import_rate(with_counters, import_count)
+             for label, with_counters in (('without', False), ('with', True))}
+    print(f'import {import_count} notes: {rates["without"]:.0f} notes/s without counters, '
+          f'{rates["with"]:.0f} notes/s with counters')
+    return {'reads': results, 'import_rate': rates}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--import-count', type=int, default=50000)
+    args = parser.parse_args()
+    run(args.sizes, args.iterations, args.import_count)
+
+
+if __name__ == '__main__':
+    main()
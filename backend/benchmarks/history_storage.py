@@ -0,0 +1,68 @@
+"""Spazio occupato dallo storico di un appunto di codice modificato molte volte.
+
+    python -m benchmarks.history_storage --size 50000 --edits 500
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import temp_database, measure
+
+
+def run(size, edits):
+    db = temp_database()
+    rng = random.Random(0)
+    lines = [f'    value_{i} = compute({i}, {i * 7 % 13})\n' for i in range(size // 36)]
+    note = db.create_note('snippet', ''.join(lines), 'code')
+
+    full_bytes = len(''.join(lines).encode())
+    started = time.perf_counter()
+    for edit in range(edits):
+        # Piccole modifiche locali, come un autosave durante l'editing
+        i = rng.randrange(len(lines))
+        lines[i] = f'    value_{i} = compute({edit}, {i})\n'
+        if edit % 10 == 0:
+            lines.insert(i, f'    # edit {edit}\n')
+        db.update_note(note['id'], content=''.join(lines))
+        full_bytes += len(''.join(lines).encode())
+    write_seconds = time.perf_counter() - started
+
+    with db.get_connection() as conn:
+        # Delta in note_history più gli snapshot nel content store
+        stored = conn.execute('''
+            SELECT SUM(LENGTH(h.content)) + SUM(COALESCE(LENGTH(h.data), 0))
+                   + COALESCE((SELECT SUM(LENGTH(data)) FROM note_contents WHERE id IN (
+                       SELECT content_id FROM note_history)), 0)
+            FROM note_history h
+        ''').fetchone()[0]
+
+    page = measure(lambda: db.get_note_history(note['id'], limit=20, offset=edits // 2), 50)
+    version = measure(lambda: db.get_note_version(note['id'], rng.randint(1, edits + 1)), 200)
+
+    result = {
+        'versions': edits + 1,
+        'full_copies_bytes': full_bytes,
+        'stored_bytes': stored,
+        'ratio': round(full_bytes / stored, 1),
+        'update_ms': round(write_seconds * 1000 / edits, 3),
+        'history_page_20': page,
+        'get_note_version': version,
+    }
+    print(f'{edits + 1} versions: {full_bytes / 1e6:.2f} MB as full copies, '
+          f'{stored / 1e6:.3f} MB stored ({result["ratio"]}x)')
+    print(f'update {result["update_ms"]}ms/edit, history page p50={page["p50_ms"]:.2f}ms, '
+          f'single version p50={version["p50_ms"]:.2f}ms')
+    db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=50000, help='Snippet size in bytes')
+    parser.add_argument('--edits', type=int, default=500)
+    args = parser.parse_args()
+    run(args.size, args.edits)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Elenco appunti con tag: query GROUP_CONCAT originale contro caricamento in due fasi.
+
+    python -m benchmarks.note_list --sizes 1000 10000 100000
+"""
+import argparse
+
+from benchmarks.common import temp_database, populate_notes, measure
+
+# Query di get_notes prima del caricamento in due fasi, per confronto
+GROUP_CONCAT_QUERY = '''
+    SELECT n.*,
+           GROUP_CONCAT(t.name) as tag_names,
+           GROUP_CONCAT(t.color) as tag_colors
+    FROM notes n
+    LEFT JOIN note_tags nt ON n.id = nt.note_id
+    LEFT JOIN tags t ON nt.tag_id = t.id
+    WHERE 1=1 {condition}
+    GROUP BY n.id ORDER BY n.updated_at DESC, n.id DESC
+    LIMIT ?
+'''
+
+
+def group_concat(db, limit, tag=None):
+    condition, params = ('AND t.name = ?', [tag]) if tag else ('', [])
+    with db.get_connection() as conn:
+        rows = conn.execute(GROUP_CONCAT_QUERY.format(condition=condition), params + [limit])
+        notes = []
+        for row in rows:
+            note = dict(row)
+            names, colors = note.pop('tag_names'), note.pop('tag_colors')
+            note['tags'] = ([{'name': n, 'color': c} for n, c in zip(names.split(','), colors.split(','))]
+                            if names else [])
+            notes.append(note)
+        return notes
+
+
+def run(sizes, iterations, limit):
+    results = []
+    for size in sizes:
+        # Senza cache, per misurare le query
+        db = temp_database(cache_size=0)
+        populate_notes(db, size)
+
+        row = {'notes': size}
+        for name, old, new in [
+            ('page', lambda: group_concat(db, limit), lambda: db.get_notes(limit=limit)),
+            ('tag', lambda: group_concat(db, limit, 'python'),
+             lambda: db.get_notes(tag='python', limit=limit)),
+        ]:
+            row[f'{name}_group_concat'] = measure(old, iterations)
+            row[f'{name}_two_phase'] = measure(new, iterations)
+            print(f'{size:>9} notes  {name:<4} group_concat p50={row[f"{name}_group_concat"]["p50_ms"]:.2f}ms  '
+                  f'two-phase p50={row[f"{name}_two_phase"]["p50_ms"]:.2f}ms')
+        results.append(row)
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.iterations, args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Latenza di get_note_by_id / get_notes_by_ids al crescere del numero di appunti.
+
+    python -m benchmarks.note_lookup --sizes 100 10000 1000000
+"""
+import argparse
+import random
+
+from benchmarks.common import temp_database, populate_notes, measure
+
+
+def run(sizes, iterations):
+    results = []
+    for size in sizes:
+        db = temp_database()
+        note_ids = populate_notes(db, size)
+        rng = random.Random(0)
+
+        single = measure(lambda: db.get_note_by_id(rng.choice(note_ids)), iterations)
+        batch = measure(lambda: db.get_notes_by_ids(rng.sample(note_ids, min(50, size))),
+                        max(1, iterations // 10))
+        results.append({'notes': size, 'get_note_by_id': single, 'get_notes_by_ids_50': batch})
+        print(f'{size:>9} notes  get_note_by_id p50={single["p50_ms"]:.3f}ms '
+              f'p99={single["p99_ms"]:.3f}ms  get_notes_by_ids(50) p50={batch["p50_ms"]:.3f}ms')
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+    run(args.sizes, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
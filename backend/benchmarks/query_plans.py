@@ -0,0 +1,122 @@
+"""Controllo di regressione sui piani di esecuzione delle query "calde".
+
+Esegue i metodi di NotesDatabase su un database di prova, cattura le SELECT
+effettivamente inviate a SQLite e ne analizza l'EXPLAIN QUERY PLAN: esce con
+codice 1 se una di esse scansiona per intero una tabella grande.
+
+    python -m benchmarks.query_plans
+"""
+import sys
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.common import temp_database, populate_notes
+from database import encode_cursor
+
+# Tabelle piccole per costruzione: una scansione completa è accettabile
+SMALL_TABLES = {'folders', 'tags'}
+
+# Scansioni note e non ancora risolte, con il motivo
+KNOWN_SCANS: Dict[str, str] = {}
+
+
+def hot_paths(db, note_ids) -> List[Tuple[str, Callable]]:
+    note_id = note_ids[0]
+    return [
+        ('get_folders', lambda: db.get_folders()),
+        ('get_stats', lambda: db.get_stats()),
+        ('get_note_by_id', lambda: db.get_note_by_id(note_id)),
+        ('get_notes_by_ids', lambda: db.get_notes_by_ids(note_ids[:20])),
+        ('get_notes page', lambda: db.get_notes(limit=50, fields='list')),
+        ('get_notes preview', lambda: db.get_notes(limit=50, fields='preview')),
+        ('get_notes folder', lambda: db.get_notes(folder_id='work', limit=50)),
+        ('get_notes tag', lambda: db.get_notes(tag='python', limit=50)),
+        ('get_notes search', lambda: db.get_notes(search='react', limit=50)),
+        ('count_notes folder', lambda: db.count_notes(folder_id='work')),
+        ('count_notes tag', lambda: db.count_notes(tag='python')),
+        ('search_notes', lambda: db.search_notes('react')),
+        ('suggest short prefix', lambda: db.suggest('re')),
+        ('suggest', lambda: db.suggest('react')),
+        ('suggest typo', lambda: db.suggest('raect idea')),
+        ('suggest typo only', lambda: db.suggest('pyhton')),
+        ('q tags and/not page', lambda: db.get_notes(q='tag:python AND NOT tag:todo', limit=50)),
+        ('q tags or page', lambda: db.get_notes(q='tag:python OR tag:react', limit=50, fields='list')),
+        ('q folder + updated page', lambda: db.get_notes(q='folder:work updated:>2026-01-01', limit=50)),
+        ('q sort:title page', lambda: db.get_notes(q='type:code sort:title', limit=50)),
+        ('q sort:created cursor', lambda: db.get_notes(
+            q='tag:python sort:created:asc', limit=50,
+            cursor=encode_cursor('2026-01-01 00:00:00', note_id))),
+        ('q count tags', lambda: db.count_notes(q='tag:python tag:react')),
+        ('q count tags or', lambda: db.count_notes(q='(tag:python OR tag:react) -tag:todo')),
+        ('q count folder + text', lambda: db.count_notes(q='folder:work react')),
+        ('get_note_history', lambda: db.get_note_history(note_id)),
+        ('count_note_history', lambda: db.count_note_history(note_id)),
+        ('update_note', lambda: db.update_note(note_id, content='changed')),
+    ]
+
+
+def full_scans(sql: str, plan: List[str]) -> List[str]:
+    """Passi del piano che leggono un'intera tabella grande.
+
+    Una scansione lungo un indice già ordinato come la ORDER BY, con LIMIT,
+    si ferma dopo poche righe e non viene segnalata.
+    """
+    bounded = 'LIMIT' in sql.upper() and not any('TEMP B-TREE' in d for d in plan)
+    # Le sottoquery (FROM (SELECT ...) AS alias) hanno il proprio piano
+    subqueries = {d.split()[-1] for d in plan if d.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    scans = []
+    for detail in plan:
+        if not detail.startswith('SCAN '):
+            continue
+        table = detail.split()[1]
+        if (table.startswith('(') or table in SMALL_TABLES or table in subqueries
+                or 'VIRTUAL TABLE' in detail):
+            continue
+        if bounded and 'USING' in detail:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def check(note_count: int = 2000) -> Dict[str, List[Tuple[str, List[str]]]]:
+    # Senza cache: ogni chiamata deve arrivare a SQLite
+    db = temp_database(cache_size=0)
+    note_ids = populate_notes(db, note_count)
+    problems = {}
+
+    for name, call in hot_paths(db, note_ids):
+        if name in KNOWN_SCANS:
+            continue
+        statements = []
+        with db.get_connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                call()
+            finally:
+                conn.set_trace_callback(None)
+
+            for sql in statements:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+                scans = full_scans(sql, plan)
+                if scans:
+                    problems.setdefault(name, []).append((' '.join(sql.split()), scans))
+
+    db.close()
+    return problems
+
+
+def main():
+    problems = check()
+    for name, reason in KNOWN_SCANS.items():
+        print(f'skipped {name}: {reason}')
+    for name, entries in problems.items():
+        for sql, scans in entries:
+            print(f'FULL SCAN in {name}: {scans}\n    {sql}\n')
+    if problems:
+        sys.exit(1)
+    print('OK: no hot query performs a full table scan')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Latenza della ricerca full-text (FTS5) confrontata con la vecchia scansione LIKE.
+
+    python -m benchmarks.search --sizes 10000 100000 300000
+"""
+import argparse
+import random
+
+from benchmarks.common import VOCABULARY, temp_database, populate_notes, measure
+
+
+def run(sizes, iterations):
+    results = []
+    for size in sizes:
+        db = temp_database()
+        populate_notes(db, size)
+        rng = random.Random(0)
+
+        def like_scan():
+            term = f'%{rng.choice(VOCABULARY)}%'
+            with db.get_connection() as conn:
+                conn.execute('''
+                    SELECT note_rowid FROM notes_text WHERE title LIKE ? OR content LIKE ?
+                ''', (term, term)).fetchall()
+
+        fts = measure(lambda: db.search_notes(rng.choice(VOCABULARY), limit=20), iterations)
+        like = measure(like_scan, max(1, iterations // 10))
+        results.append({'notes': size, 'fts_search': fts, 'like_scan': like})
+        print(f'{size:>9} notes  fts p50={fts["p50_ms"]:.3f}ms p99={fts["p99_ms"]:.3f}ms  '
+              f'like p50={like["p50_ms"]:.3f}ms')
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    run(args.sizes, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
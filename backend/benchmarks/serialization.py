@@ -0,0 +1,155 @@
+"""Serializzazione delle risposte: response_model di FastAPI contro fast_json.
+
+Misura, per 10k appunti (o `--notes`), il tempo per trasformare il
+risultato di get_notes in byte JSON nei due modi (validazione pydantic +
+json, oppure Shape + orjson, anche a blocchi come lo stream), poi la
+latenza di GET /api/notes con le due impostazioni, senza e con gzip.
+Controlla anche che gli endpoint serializzati in fast_json diano lo stesso
+JSON del percorso validato.
+
+    python -m benchmarks.serialization --notes 10000 --content-size 500
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+from pydantic import TypeAdapter
+
+import server
+import serialization
+from benchmarks.common import populate_notes, summarize
+from models import NoteListItem
+from settings import Settings
+
+
+def validated_bytes(adapter: TypeAdapter, notes) -> bytes:
+    """Come FastAPI con response_model_exclude_unset e JSONResponse"""
+    content = adapter.dump_python(adapter.validate_python(notes), mode='json', exclude_unset=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def measure_ms(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def encoding_cases(db, iterations: int) -> dict:
+    adapter = TypeAdapter(List[NoteListItem])
+    shape = server.NOTE_LIST_SHAPE
+    results = {}
+    for fields in ('full', 'preview', 'list'):
+        notes = db.get_notes(fields=fields)
+        validated = validated_bytes(adapter, notes)
+        fast = serialization.dumps(shape.many(notes))
+        streamed = b''.join(serialization._array_chunks(notes, shape))
+        assert json.loads(validated) == json.loads(fast) == json.loads(streamed), fields
+
+        results[fields] = {
+            'notes': len(notes),
+            'bytes': len(fast),
+            'validated': measure_ms(lambda: validated_bytes(adapter, notes), iterations),
+            'fast': measure_ms(lambda: serialization.dumps(shape.many(notes)), iterations),
+            'fast_stream': measure_ms(
+                lambda: b''.join(serialization._array_chunks(notes, shape)), iterations
+            ),
+        }
+        case = results[fields]
+        print(f'  {fields:<8} {len(notes)} notes, {len(fast) / 1e6:.1f} MB: '
+              f'validated p50={case["validated"]["p50_ms"]:.1f}ms  '
+              f'fast p50={case["fast"]["p50_ms"]:.1f}ms  '
+              f'stream p50={case["fast_stream"]["p50_ms"]:.1f}ms  '
+              f'({case["validated"]["p50_ms"] / case["fast"]["p50_ms"]:.1f}x)')
+    return results
+
+
+def check_urls(db, note_ids) -> List[str]:
+    code_id = next(note['id'] for note in db.get_notes(q='type:code', limit=1, fields='list'))
+    return [
+        '/api/folders', '/api/tags',
+        '/api/notes?limit=50', '/api/notes?limit=50&fields=list',
+        '/api/notes?limit=50&fields=preview', '/api/notes?q=tag:python&limit=20',
+        f'/api/notes/{note_ids[0]}', '/api/notes/search?q=react',
+        f'/api/notes/{code_id}/history', f'/api/notes/{code_id}/history/1',
+        '/api/sync',
+    ]
+
+
+async def api_cases(db_path: str, notes: int, content_size: int, iterations: int) -> dict:
+    apps = {}
+    for fast_json in (False, True):
+        settings = Settings.from_env(db_path=db_path, fast_json=fast_json, metrics=False)
+        apps[fast_json] = server.create_app(settings)
+
+    async with apps[False].router.lifespan_context(apps[False]), \
+            apps[True].router.lifespan_context(apps[True]):
+        db = apps[True].state.db.db
+        note_ids = populate_notes(db, notes, content_size=content_size)
+        db.update_note(next(note['id'] for note in db.get_notes(q='type:code', limit=1)),
+                       content='changed')
+        clients = {
+            fast_json: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench')
+            for fast_json, app in apps.items()
+        }
+
+        # Stesso JSON (a meno della formattazione) con e senza fast_json
+        for url in check_urls(db, note_ids):
+            responses = [await clients[fast_json].get(url) for fast_json in (False, True)]
+            for response in responses:
+                response.raise_for_status()
+            assert responses[0].json() == responses[1].json(), url
+        print('  fast_json responses match the validated ones')
+
+        # Con gzip buona parte del tempo è la compressione, uguale nei due casi
+        results = {}
+        for fast_json, client in clients.items():
+            for encoding in ('identity', 'gzip'):
+                samples = []
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    response = await client.get('/api/notes', headers={'Accept-Encoding': encoding})
+                    response.raise_for_status()
+                    samples.append((time.perf_counter() - started) * 1000)
+                label = f'{"fast_json" if fast_json else "validated"} {encoding}'
+                results[label] = summarize(samples)
+                print(f'  GET /api/notes ({notes} notes) {label:<19} '
+                      f'p50={results[label]["p50_ms"]:.1f}ms')
+            await client.aclose()
+        return results
+
+
+def run(notes: int, content_size: int, iterations: int) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix='notes-bench-'))
+    print(f'Serialization orjson={serialization.orjson is not None}')
+    print(f'Encoding ({notes} notes):')
+    db_settings = Settings.from_env(db_path=str(workdir / 'encode.db'), cache_size=0)
+    db = server.NotesDatabase.from_settings(db_settings)
+    populate_notes(db, notes, content_size=content_size)
+    encoding = encoding_cases(db, iterations)
+    db.close()
+
+    print('API:')
+    api = asyncio.run(api_cases(str(workdir / 'api.db'), notes, content_size, iterations))
+    return {'encoding': encoding, 'api': api}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--content-size', type=int, default=500, help='Characters per note')
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+    run(args.notes, args.content_size, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Avvio a freddo: tempo di `import server` e tempo fino alla prima risposta.
+
+Ogni misura gira in un processo Python nuovo, con un database vuoto in una
+cartella temporanea (NOTES_DB_PATH).
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import summarize
+
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(server.app) as client:
+    client.get("/api/folders").raise_for_status()
+    first = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "first_request_ms": (first - started) * 1000}))
+'''
+
+
+def probe(backend_dir: Path) -> dict:
+    env = dict(os.environ, NOTES_DB_PATH=str(Path(tempfile.mkdtemp(prefix='notes-bench-')) / 'notes.db'))
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=backend_dir, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs):
+    backend_dir = Path(__file__).resolve().parent.parent
+    samples = [probe(backend_dir) for _ in range(runs)]
+    result = {
+        'import_server': summarize([s['import_ms'] for s in samples]),
+        'first_request': summarize([s['first_request_ms'] for s in samples]),
+    }
+    print(f'import server      p50={result["import_server"]["p50_ms"]:.0f}ms')
+    print(f'first request      p50={result["first_request"]["p50_ms"]:.0f}ms (import included)')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    run(args.runs)
+
+
+if __name__ == '__main__':
+    main()
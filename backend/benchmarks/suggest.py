@@ -0,0 +1,82 @@
+"""Latenza di NotesDatabase.suggest (apertura rapida) a ogni tasto, contro una scansione LIKE.
+
+Simula la digitazione del titolo di appunti a caso, un carattere alla volta,
+e la prima parola del titolo con due lettere scambiate (errore di
+battitura, di solito assente dai titoli). Riporta anche la frazione di casi
+in cui l'appunto cercato è tra i suggerimenti per la parola sbagliata
+seguita dal resto del titolo.
+
+    python -m benchmarks.suggest --sizes 100000 500000
+"""
+import argparse
+import random
+
+from benchmarks.common import temp_database, populate_notes, measure
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """Due lettere vicine scambiate, non all'inizio"""
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def run(sizes, samples, iterations):
+    results = []
+    for size in sizes:
+        db = temp_database(cache_size=0, query_metrics=False)
+        note_ids = populate_notes(db, size, content_size=50)
+        rng = random.Random(0)
+        targets = db.get_notes_by_ids(rng.sample(note_ids, samples))
+
+        keystrokes = [note['title'][:length] for note in targets
+                      for length in range(1, len(note['title']) + 1)]
+        words = [(note, note['title'].split()[0]) for note in targets]
+        typos = [(note, typo(word, rng)) for note, word in words if len(word) >= 5]
+
+        queries = iter(keystrokes * iterations)
+        typing = measure(lambda: db.suggest(next(queries)), len(keystrokes) * iterations)
+        typo_queries = iter([text for _, text in typos] * iterations)
+        fuzzy = measure(lambda: db.suggest(next(typo_queries)), len(typos) * iterations)
+        found = sum(
+            any(match['id'] == note['id'] for match in db.suggest(f'{text} {note["title"].split()[1]}')['notes'])
+            for note, text in typos
+        )
+
+        # La scansione è lenta: basta un tasto su dieci
+        like_queries = iter(keystrokes[::10])
+
+        def like_scan():
+            with db.get_connection() as conn:
+                conn.execute('''
+                    SELECT id, title FROM notes WHERE title LIKE ?
+                    ORDER BY updated_at DESC LIMIT 10
+                ''', (f'%{next(like_queries)}%',)).fetchall()
+
+        like = measure(like_scan, len(keystrokes[::10]))
+        result = {
+            'notes': size,
+            'keystroke': typing,
+            'typo': fuzzy,
+            'typo_recall': round(found / len(typos), 3),
+            'like_scan': like,
+        }
+        results.append(result)
+        print(f'{size:>9} notes  keystroke p50={typing["p50_ms"]:.2f}ms p95={typing["p95_ms"]:.2f}ms '
+              f'p99={typing["p99_ms"]:.2f}ms  typo p50={fuzzy["p50_ms"]:.2f}ms '
+              f'p95={fuzzy["p95_ms"]:.2f}ms (found {result["typo_recall"]:.0%})  '
+              f'like p50={like["p50_ms"]:.2f}ms')
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 500000])
+    parser.add_argument('--samples', type=int, default=50, help='Titles typed per size')
+    parser.add_argument('--iterations', type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.samples, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+"""Suite di benchmark riproducibile: tutti i metodi di NotesDatabase e tutti
+gli endpoint /api/*, su un dataset sintetico, con risultati in JSON.
+
+Per ogni caso registra latenza (media, p50, p95, p99), throughput di un
+singolo client e picco di memoria allocata da Python (tracemalloc, in un
+passaggio separato per non falsare le latenze). Il dataset è generato con
+seed fissi; gli endpoint sono chiamati in-process (httpx.ASGITransport),
+senza rete. Con `--compare` confronta con un risultato precedente.
+
+    python -m benchmarks.suite --notes 5000 --output results.json
+    python -m benchmarks.suite --compare results-main.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+import server
+from database import NotesDatabase, encode_sync_token
+from settings import Settings
+from benchmarks.common import populate_notes, summarize, VOCABULARY
+
+# Ripetizioni del passaggio con tracemalloc
+MEMORY_ITERATIONS = 5
+
+
+def build_dataset(db: NotesDatabase, notes: int, content_size: int, tags: int,
+                  tags_per_note: int, history_depth: int, history_notes: int, seed: int = 0) -> dict:
+    """Riempie un database vuoto; restituisce gli id utili ai casi di benchmark"""
+    rng = random.Random(seed)
+    existing = {tag['name'] for tag in db.get_tags()}
+    for i in range(max(0, tags - len(existing))):
+        db.create_tag(f'tag-{i}', 'bg-gray-100 text-gray-800')
+
+    note_ids = populate_notes(db, notes, content_size=content_size, tags_per_note=tags_per_note)
+
+    # Storico: versioni successive di alcuni appunti di codice
+    with db.get_connection() as conn:
+        code_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM notes WHERE type = 'code' ORDER BY rowid LIMIT ?", (history_notes,)
+        )]
+    for note_id in code_ids:
+        for version in range(history_depth):
+            words = rng.choices(VOCABULARY, k=max(1, content_size // 7))
+            db.update_note(note_id, content=f'# v{version}\n' + ' '.join(words)[:content_size])
+
+    return {
+        'note_ids': note_ids,
+        'history_ids': code_ids or note_ids[:1],
+        'folder_ids': [folder['id'] for folder in db.get_folders()],
+        'tag_names': [tag['name'] for tag in db.get_tags()],
+        'words': [VOCABULARY[i] for i in (0, 3, 50, 500)],
+    }
+
+
+def note_payload(rng: random.Random, content_size: int, data: dict) -> dict:
+    return {
+        'title': f'{rng.choice(VOCABULARY).capitalize()} benchmark',
+        'content': ' '.join(rng.choices(VOCABULARY, k=max(1, content_size // 7)))[:content_size],
+        'type': rng.choice(('text', 'code', 'list')),
+        'folder_id': rng.choice(data['folder_ids']),
+        'tag_names': rng.sample(data['tag_names'], min(2, len(data['tag_names']))),
+    }
+
+
+def database_cases(db: NotesDatabase, data: dict, content_size: int, iterations: int):
+    """(nome, funzione, ripetizioni): prima le letture, poi le scritture, infine le cancellazioni"""
+    rng = random.Random(1)
+    ids = data['note_ids']
+    history_id = data['history_ids'][0]
+    depth = max(1, db.count_note_history(history_id))
+    few = max(3, iterations // 20)
+    counter = itertools.count()
+    created_folders = []
+
+    def sync_token():
+        return encode_sync_token(max(0, db.latest_change_seq() - 50))
+
+    def create_folder():
+        created_folders.append(db.create_folder(f'Bench {next(counter)}')['id'])
+
+    def new_note():
+        payload = note_payload(rng, content_size, data)
+        db.create_note(payload['title'], payload['content'], payload['type'],
+                       payload['folder_id'], payload['tag_names'])
+
+    return [
+        # Letture
+        ('get_folders', db.get_folders, iterations),
+        ('get_tags', db.get_tags, iterations),
+        ('get_stats', db.get_stats, iterations),
+        ('get_notes', db.get_notes, few),
+        ('get_notes_page', lambda: db.get_notes(limit=50, fields='list'), iterations),
+        ('get_notes_folder', lambda: db.get_notes(folder_id=rng.choice(data['folder_ids']),
+                                                  limit=50, fields='preview'), iterations),
+        ('get_notes_tag', lambda: db.get_notes(tag=rng.choice(data['tag_names']), limit=50), iterations),
+        ('get_notes_search', lambda: db.get_notes(search=rng.choice(data['words']), limit=50), iterations),
+        ('count_notes', lambda: db.count_notes(tag=rng.choice(data['tag_names'])), iterations),
+        ('search_notes', lambda: db.search_notes(rng.choice(data['words'])), iterations),
+        ('get_note_by_id', lambda: db.get_note_by_id(rng.choice(ids)), iterations),
+        ('get_notes_by_ids_50', lambda: db.get_notes_by_ids(rng.sample(ids, min(50, len(ids)))), iterations),
+        ('get_note_history', lambda: db.get_note_history(history_id), iterations),
+        ('get_note_history_page', lambda: db.get_note_history(history_id, limit=10), iterations),
+        ('count_note_history', lambda: db.count_note_history(history_id), iterations),
+        ('get_note_version', lambda: db.get_note_version(history_id, rng.randint(1, depth)), iterations),
+        ('diff_note_versions', lambda: db.diff_note_versions(history_id, 1, depth), iterations),
+        ('get_changes', lambda: db.get_changes(0, 500), iterations),
+        ('latest_change_seq', db.latest_change_seq, iterations),
+        ('sync_full', db.sync, few),
+        ('sync_incremental', lambda: db.sync(sync_token()), iterations),
+        ('export_notes', lambda: sum(1 for _ in db.export_notes()), few),
+        # Scritture
+        ('create_folder', create_folder, iterations),
+        ('update_folder', lambda: db.update_folder(rng.choice(created_folders), f'Bench {next(counter)}'),
+         iterations),
+        ('create_tag', lambda: db.create_tag(f'bench-{next(counter)}', 'bg-gray-100'), iterations),
+        ('create_note', new_note, iterations),
+        ('update_note', lambda: db.update_note(rng.choice(ids), content=f'updated {next(counter)}'),
+         iterations),
+        ('update_note_history', lambda: db.update_note(history_id, content=f'v {next(counter)}'), iterations),
+        ('apply_autosaves_20', lambda: db.apply_autosaves(
+            {note_id: {'content': f'autosave {next(counter)}'} for note_id in rng.sample(ids, 20)}
+        ), iterations),
+        ('batch_tag_50', lambda: db.batch_update_notes(
+            'tag', note_ids=rng.sample(ids, 50), tag_names=[rng.choice(data['tag_names'])]
+        ), iterations),
+        ('batch_move_folder', lambda: db.batch_update_notes(
+            'move', filters={'folder_id': rng.choice(data['folder_ids'])},
+            folder_id=rng.choice(data['folder_ids'])
+        ), few),
+        ('import_notes_100', lambda: db.import_notes(
+            [note_payload(rng, content_size, data) for _ in range(100)]
+        ), few),
+        ('rebuild_search_index', db.rebuild_search_index, 3),
+        ('prune_change_log', db.prune_change_log, few),
+        # Cancellazioni (appunti del dataset, dopo tutte le letture)
+        ('delete_folder', lambda: db.delete_folder(created_folders.pop()), iterations),
+        ('delete_note', lambda: db.delete_note(ids.pop()), iterations),
+        ('batch_delete_10', lambda: db.batch_update_notes(
+            'delete', note_ids=[ids.pop() for _ in range(10)]
+        ), few),
+    ]
+
+
+def api_cases(data: dict, content_size: int, iterations: int):
+    """(nome, coroutine che riceve il client, ripetizioni) per ogni endpoint"""
+    rng = random.Random(2)
+    ids = data['note_ids']
+    history_id = data['history_ids'][0]
+    few = max(3, iterations // 20)
+    counter = itertools.count()
+    created_folders = []
+    etags = {}
+
+    def resolve(value):
+        # Le parti variabili di una richiesta sono funzioni, rivalutate a ogni chiamata
+        return value() if callable(value) else value
+
+    def get(url, **params):
+        async def call(http):
+            response = await http.get(resolve(url), params={k: resolve(v) for k, v in params.items()})
+            response.raise_for_status()
+        return call
+
+    async def conditional_get(http):
+        headers = {'If-None-Match': etags['notes']} if 'notes' in etags else {}
+        response = await http.get('/api/notes', params={'limit': 50, 'fields': 'list'}, headers=headers)
+        if response.status_code != 304:
+            response.raise_for_status()
+        etags['notes'] = response.headers['ETag']
+
+    async def diff(http):
+        versions = (await http.get(f'/api/notes/{history_id}/history')).json()
+        response = await http.get(f'/api/notes/{history_id}/diff',
+                                  params={'from': 1, 'to': versions[-1]['version']})
+        response.raise_for_status()
+
+    async def sync_incremental(http):
+        seq = (await http.get('/api/changes', params={'timeout': 0, 'limit': 1})).json()['last_seq']
+        token = encode_sync_token(max(0, seq - 50))
+        (await http.get('/api/sync', params={'since': token})).raise_for_status()
+
+    async def post_folder(http):
+        response = await http.post('/api/folders', json={'name': f'Bench {next(counter)}'})
+        created_folders.append(response.raise_for_status().json()['id'])
+
+    def send(method, url, body=None, content=None, **params):
+        async def call(http):
+            response = await http.request(method, resolve(url), json=resolve(body),
+                                          content=resolve(content), params=params)
+            response.raise_for_status()
+        return call
+
+    def ndjson():
+        return '\n'.join(json.dumps(note_payload(rng, content_size, data)) for _ in range(100))
+
+    return [
+        # Letture
+        ('GET /api/', get('/api/'), iterations),
+        ('GET /api/db/pool', get('/api/db/pool'), iterations),
+        ('GET /api/cache/stats', get('/api/cache/stats'), iterations),
+        ('GET /api/autosave/stats', get('/api/autosave/stats'), iterations),
+        ('GET /api/metrics', get('/api/metrics'), few),
+        ('GET /api/folders', get('/api/folders'), iterations),
+        ('GET /api/tags', get('/api/tags'), iterations),
+        ('GET /api/notes', get('/api/notes'), few),
+        ('GET /api/notes?limit=50', get('/api/notes', limit=50, fields='list'), iterations),
+        ('GET /api/notes (304)', conditional_get, iterations),
+        ('GET /api/notes?tag', get('/api/notes', tag=lambda: rng.choice(data['tag_names']),
+                                   limit=50, include_total='true'), iterations),
+        ('GET /api/notes/search', get('/api/notes/search', q=lambda: rng.choice(data['words'])),
+         iterations),
+        ('GET /api/notes/{id}', get(lambda: f'/api/notes/{rng.choice(ids)}'), iterations),
+        ('GET /api/notes/{id}/history', get(f'/api/notes/{history_id}/history', limit=10), iterations),
+        ('GET /api/notes/{id}/history/{v}', get(f'/api/notes/{history_id}/history/1'), iterations),
+        ('GET /api/notes/{id}/diff', diff, iterations),
+        ('GET /api/changes', get('/api/changes', since=0, timeout=0), iterations),
+        ('GET /api/sync', get('/api/sync'), few),
+        ('GET /api/sync?since', sync_incremental, iterations),
+        ('GET /api/export', get('/api/export'), few),
+        # Scritture
+        ('POST /api/folders', post_folder, iterations),
+        ('PUT /api/folders/{id}', send('PUT', lambda: f'/api/folders/{rng.choice(created_folders)}',
+                                       lambda: {'name': f'Bench {next(counter)}'}), iterations),
+        ('POST /api/tags', send('POST', '/api/tags',
+                                lambda: {'name': f'bench-{next(counter)}', 'color': 'bg-gray-100'}),
+         iterations),
+        ('POST /api/notes', send('POST', '/api/notes', lambda: note_payload(rng, content_size, data)),
+         iterations),
+        ('PUT /api/notes/{id}', send('PUT', lambda: f'/api/notes/{rng.choice(ids)}',
+                                     lambda: {'content': f'updated {next(counter)}'}), iterations),
+        ('PUT /api/notes/{id}?autosave', send('PUT', lambda: f'/api/notes/{rng.choice(ids)}',
+                                              lambda: {'content': f'autosave {next(counter)}'},
+                                              autosave='true'), iterations),
+        ('POST /api/notes/batch', send('POST', '/api/notes/batch', lambda: {
+            'op': 'tag', 'ids': rng.sample(ids, 50), 'tag_names': [rng.choice(data['tag_names'])]
+        }), iterations),
+        ('POST /api/notes/bulk', send('POST', '/api/notes/bulk', content=ndjson), few),
+        # Cancellazioni
+        ('DELETE /api/folders/{id}', send('DELETE', lambda: f'/api/folders/{created_folders.pop()}'),
+         iterations),
+        ('DELETE /api/notes/{id}', send('DELETE', lambda: f'/api/notes/{ids.pop()}'), iterations),
+    ]
+
+
+def _result(name, samples, peak_bytes):
+    result = summarize(samples)
+    result['name'] = name
+    result['ops_per_sec'] = round(1000 / result['mean_ms'], 1) if result['mean_ms'] else None
+    result['peak_alloc_kb'] = round(peak_bytes / 1024, 1)
+    return result
+
+
+def _report(result):
+    print(f'  {result["name"]:<32} p50={result["p50_ms"]:>8.3f}ms  p95={result["p95_ms"]:>8.3f}ms  '
+          f'p99={result["p99_ms"]:>8.3f}ms  {result["ops_per_sec"]:>9} op/s  '
+          f'peak={result["peak_alloc_kb"]:>8.1f}KB')
+
+
+def run_database(cases):
+    results = []
+    for name, fn, iterations in cases:
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        for _ in range(MEMORY_ITERATIONS):
+            fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results.append(_result(name, samples, peak))
+        _report(results[-1])
+    return results
+
+
+async def run_api(app, cases):
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+        for name, call, iterations in cases:
+            samples = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                await call(http)
+                samples.append((time.perf_counter() - started) * 1000)
+
+            tracemalloc.start()
+            for _ in range(MEMORY_ITERATIONS):
+                await call(http)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results.append(_result(name, samples, peak))
+            _report(results[-1])
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(dataset: dict, iterations: int, skip_api: bool = False) -> dict:
+    dataset_options = {key: value for key, value in dataset.items() if key != 'content_size'}
+    content_size = dataset['content_size']
+    workdir = Path(tempfile.mkdtemp(prefix='notes-bench-'))
+
+    print(f'Dataset: {dataset}')
+    started = time.perf_counter()
+    db = NotesDatabase(str(workdir / 'suite.db'))
+    data = build_dataset(db, content_size=content_size, **dataset_options)
+    print(f'Dataset built in {time.perf_counter() - started:.1f}s\nNotesDatabase:')
+    db_results = run_database(database_cases(db, data, content_size, iterations))
+    db.close()
+
+    api_results = []
+    if not skip_api:
+        # Autosave con finestra minima: si misura il percorso, non l'attesa
+        settings = Settings.from_env(db_path=str(workdir / 'api.db'), autosave_window=0.001)
+        app = server.create_app(settings)
+
+        async def drive():
+            async with app.router.lifespan_context(app):
+                data = build_dataset(app.state.db.db, content_size=content_size, **dataset_options)
+                print('API:')
+                return await run_api(app, api_cases(data, content_size, iterations))
+
+        api_results = asyncio.run(drive())
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'iterations': iterations,
+            # ru_maxrss è in KB su Linux, in byte su macOS
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                           // (1024 if sys.platform == 'darwin' else 1),
+        },
+        'dataset': dataset,
+        'database': db_results,
+        'api': api_results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Casi con p50 peggiorato oltre `threshold` (0.25 = +25%) rispetto al baseline.
+
+    Il p95 viene solo mostrato: con poche ripetizioni è troppo rumoroso.
+    """
+    regressions = []
+    print(f'\nCompared with {baseline["meta"]["commit"]} ({baseline["meta"]["timestamp"]}):')
+    for section in ('database', 'api'):
+        before = {result['name']: result for result in baseline.get(section, [])}
+        for result in current[section]:
+            old = before.get(result['name'])
+            if old is None:
+                continue
+            ratios = {key: result[key] / old[key] for key in ('p50_ms', 'p95_ms') if old[key]}
+            flag = ''
+            if ratios.get('p50_ms', 1.0) > 1 + threshold:
+                flag = '  <-- regression'
+                regressions.append(result['name'])
+            print(f'  {result["name"]:<32} p50 x{ratios.get("p50_ms", 1):.2f}  '
+                  f'p95 x{ratios.get("p95_ms", 1):.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=5000)
+    parser.add_argument('--content-size', type=int, default=500, help='Characters per note')
+    parser.add_argument('--tags', type=int, default=50, help='Distinct tags')
+    parser.add_argument('--tags-per-note', type=int, default=2)
+    parser.add_argument('--history-depth', type=int, default=20, help='Versions per note with history')
+    parser.add_argument('--history-notes', type=int, default=20, help='Notes with history')
+    parser.add_argument('--iterations', type=int, default=200, help='Calls per case')
+    parser.add_argument('--skip-api', action='store_true', help='Only NotesDatabase methods')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='Previous results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='p50 slowdown reported as a regression (0.25 = +25%%)')
+    args = parser.parse_args()
+
+    dataset = {
+        'notes': args.notes,
+        'content_size': args.content_size,
+        'tags': args.tags,
+        'tags_per_note': args.tags_per_note,
+        'history_depth': args.history_depth,
+        'history_notes': args.history_notes,
+    }
+    results = run(dataset, args.iterations, skip_api=args.skip_api)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f'\nResults written to {args.output}')
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get('dataset') != dataset:
+            print('Warning: the baseline was measured on a different dataset')
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Costo di una sincronizzazione incrementale al crescere del database.
+
+    python -m benchmarks.sync --sizes 1000 10000 100000 --changes 100
+"""
+import argparse
+import random
+
+from benchmarks.common import temp_database, populate_notes, measure
+
+
+def run(sizes, changes, iterations):
+    results = []
+    for size in sizes:
+        db = temp_database(cache_size=0)
+        note_ids = populate_notes(db, size)
+        token = db.sync()['token']
+
+        rng = random.Random(0)
+        for note_id in rng.sample(note_ids, changes):
+            db.update_note(note_id, title='changed')
+        db.delete_note(note_ids[0])
+
+        delta = measure(lambda: db.sync(token), iterations)
+        results.append({'notes': size, 'changes': changes + 1, 'sync': delta})
+        print(f'{size:>9} notes  {changes + 1} changes  sync p50={delta["p50_ms"]:.2f}ms '
+              f'p99={delta["p99_ms"]:.2f}ms')
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--changes', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.changes, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
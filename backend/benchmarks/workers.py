@@ -0,0 +1,140 @@
+"""Load test locale della modalità multi-worker: throughput delle letture con
+1/2/4/8 processi uvicorn sullo stesso database, con scritture concorrenti.
+
+Avvia `uvicorn server:app --workers N` su un database di prova e lo carica
+con più processi client (letture) e un processo che aggiorna appunti di
+continuo; conta le risposte in errore (es. 'database is locked').
+
+    python -m benchmarks.workers --workers 1 2 4 8 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import temp_database, populate_notes
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_path: str, workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, NOTES_DB_PATH=db_path, NOTES_SEED='false')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=Path(__file__).resolve().parent.parent, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/api/').status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('Server did not start')
+
+
+async def read_load(base_url, note_ids, connections, duration, seed):
+    rng = random.Random(seed)
+    counts = {'ok': 0, 'errors': 0}
+    deadline = time.monotonic() + duration
+
+    async def connection(http):
+        while time.monotonic() < deadline:
+            choice = rng.random()
+            if choice < 0.5:
+                url = f'/api/notes/{rng.choice(note_ids)}'
+            elif choice < 0.8:
+                url = '/api/notes?limit=50&fields=list'
+            else:
+                url = '/api/folders'
+            response = await http.get(url)
+            counts['ok' if response.status_code == 200 else 'errors'] += 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+        await asyncio.gather(*(connection(http) for _ in range(connections)))
+    return counts
+
+
+async def write_load(base_url, note_ids, duration):
+    rng = random.Random(0)
+    counts = {'ok': 0, 'errors': 0}
+    deadline = time.monotonic() + duration
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+        while time.monotonic() < deadline:
+            response = await http.put(f'/api/notes/{rng.choice(note_ids)}',
+                                      json={'content': f'autosave {time.time()}'})
+            counts['ok' if response.status_code == 200 else 'errors'] += 1
+    return counts
+
+
+def reader_process(args):
+    return asyncio.run(read_load(*args))
+
+
+def writer_process(args):
+    return asyncio.run(write_load(*args))
+
+
+def run(worker_counts, notes, clients, connections, duration):
+    db = temp_database(seed=True)
+    note_ids = populate_notes(db, notes)
+    db_path = db.db_path
+    db.close()
+
+    results = []
+    for workers in worker_counts:
+        port = free_port()
+        server = start_server(db_path, workers, port)
+        base_url = f'http://127.0.0.1:{port}'
+        try:
+            with multiprocessing.Pool(clients + 1) as pool:
+                writes = pool.apply_async(writer_process, ((base_url, note_ids, duration),))
+                reads = pool.map(reader_process, [
+                    (base_url, note_ids, connections, duration, seed) for seed in range(clients)
+                ])
+                writes = writes.get()
+        finally:
+            server.terminate()
+            server.wait()
+
+        result = {
+            'workers': workers,
+            'reads_per_sec': round(sum(r['ok'] for r in reads) / duration, 1),
+            'read_errors': sum(r['errors'] for r in reads),
+            'writes_per_sec': round(writes['ok'] / duration, 1),
+            'write_errors': writes['errors'],
+        }
+        results.append(result)
+        print(f'{workers} workers  reads {result["reads_per_sec"]}/s ({result["read_errors"]} errors)  '
+              f'writes {result["writes_per_sec"]}/s ({result["write_errors"]} errors)')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--notes', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=4, help='Client processes issuing reads')
+    parser.add_argument('--connections', type=int, default=8, help='Concurrent requests per client')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+    args = parser.parse_args()
+    print(f'{os.cpu_count()} CPUs')
+    run(args.workers, args.notes, args.clients, args.connections, args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+_MISSING = object()
+
+
+class QueryCache:
+    """Cache LRU con scadenza (TTL) per i risultati delle letture.
+
+    Le voci appartengono a una regione ('folders', 'tags', 'notes', ...):
+    le scritture invalidano intere regioni. Ogni regione ha un contatore di
+    generazione, così un risultato calcolato mentre una scrittura lo
+    invalidava non viene mai salvato. I valori sono condivisi tra i
+    chiamanti e vanno trattati in sola lettura.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def generation(self, region: str) -> int:
+        with self._lock:
+            return self._generations.get(region, 0)
+
+    def get(self, region: str, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get((region, key))
+            if entry is None:
+                self._misses += 1
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[(region, key)]
+                self._expirations += 1
+                self._misses += 1
+                return _MISSING
+            self._entries.move_to_end((region, key))
+            self._hits += 1
+            return value
+
+    def set(self, region: str, key: Hashable, value: Any, generation: int):
+        with self._lock:
+            if self._generations.get(region, 0) != generation:
+                return
+            self._entries[(region, key)] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end((region, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, *regions: str):
+        with self._lock:
+            for region in regions:
+                self._generations[region] = self._generations.get(region, 0) + 1
+            stale = [key for key in self._entries if key[0] in regions]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            for region in {key[0] for key in self._entries}:
+                self._generations[region] = self._generations.get(region, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
+
+
+def cached(region: str) -> Callable:
+    """Memorizza il risultato di un metodo di lettura di NotesDatabase in `self.cache`.
+
+    Prima della lettura applica le scritture fatte da altri processi
+    (`_sync_changes`), così nessun worker serve dati invalidati altrove.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = self.cache
+            if not cache.enabled:
+                return method(self, *args, **kwargs)
+            self._sync_changes()
+
+            key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            value = cache.get(region, key)
+            if value is not _MISSING:
+                return value
+
+            generation = cache.generation(region)
+            value = method(self, *args, **kwargs)
+            cache.set(region, key, value, generation)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+# Change log: ogni scrittura su notes, folders, tags e note_tags aggiunge
+# una riga (seq, entità, operazione, id) tramite trigger, quindi vale anche
+# per le operazioni batch e l'import. I client tengono l'ultimo `seq` visto
+# e chiedono solo le modifiche successive. Le modifiche ai tag di un
+# appunto sono registrate come 'update' dell'appunto.
+CHANGE_LOG_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL CHECK (entity IN ('note', 'folder', 'tag')),
+        op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+        entity_id TEXT NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+for _table, _entity in (('notes', 'note'), ('folders', 'folder'), ('tags', 'tag')):
+    for _op, _row in (('insert', 'new'), ('update', 'new'), ('delete', 'old')):
+        CHANGE_LOG_SCHEMA.append(f'''
+        CREATE TRIGGER IF NOT EXISTS {_table}_log_{_op} AFTER {_op.upper()} ON {_table} BEGIN
+            INSERT INTO change_log (entity, op, entity_id)
+            VALUES ('{_entity}', '{_op}', {_row}.id);
+        END
+        ''')
+
+CHANGE_LOG_SCHEMA += [
+    '''
+    CREATE TRIGGER IF NOT EXISTS note_tags_log_insert AFTER INSERT ON note_tags BEGIN
+        INSERT INTO change_log (entity, op, entity_id)
+        VALUES ('note', 'update', new.note_id);
+    END
+    ''',
+    # Le righe rimosse in cascata dalla cancellazione dell'appunto non
+    # generano un 'update' dopo il 'delete'
+    '''
+    CREATE TRIGGER IF NOT EXISTS note_tags_log_delete AFTER DELETE ON note_tags
+    WHEN EXISTS (SELECT 1 FROM notes WHERE id = old.note_id) BEGIN
+        INSERT INTO change_log (entity, op, entity_id)
+        VALUES ('note', 'update', old.note_id);
+    END
+    ''',
+]
+
+# Chi è in attesa ricontrolla comunque il change log a questo intervallo:
+# è così che arrivano le scritture fatte da un altro worker
+POLL_INTERVAL = 1.0
+
+
+class ChangeNotifier:
+    """Risveglia i client in attesa (long-poll, SSE) quando il change log cresce.
+
+    `notify()` può essere chiamato da qualunque thread (di solito lo
+    scrittore di AsyncNotesDatabase, dopo il commit); le attese avvengono nel
+    loop asyncio a cui il notifier è stato collegato con `attach()`.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def notify(self):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Ogni attesa usa l'evento corrente: lo si sostituisce dopo averlo
+        # segnalato, così le attese successive ripartono da zero
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def changes_after(self, fetch: Callable[[int], Awaitable[List]], since: int,
+                            timeout: float) -> List:
+        """Modifiche successive a `since`, attendendo al più `timeout` secondi che ce ne siano"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # L'evento va preso prima della lettura: una notifica che arriva
+            # nel frattempo non viene persa
+            event = self._event
+            changes = await fetch(since)
+            remaining = deadline - loop.time()
+            if changes or remaining <= 0:
+                return changes
+            wait = min(remaining, self.poll_interval)
+            if event is None:
+                await asyncio.sleep(wait)
+                continue
+            try:
+                await asyncio.wait_for(event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,211 @@
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from search import FTS_TOKENIZE
+
+# Content store: il testo degli appunti sta fuori da `notes`, nella tabella
+# `note_contents`, una riga per ogni testo distinto (chiave: SHA-256).
+# `notes.content_id` e gli snapshot di `note_history` vi fanno riferimento,
+# quindi le scansioni di `notes` (elenchi, conteggi) leggono solo pagine
+# piccole di metadati e i testi uguali (un appunto e la sua versione
+# iniziale, appunti duplicati) occupano spazio una volta sola. Le righe non
+# più referenziate vengono eliminate dai trigger.
+#
+# FTS5 rilegge i testi dalla vista `notes_text` tramite la funzione SQL
+# note_body(id, codec, data): va registrata su ogni connessione con
+# register_functions() (lo fa il pool di NotesDatabase), quindi la ricerca
+# e le scritture su `notes` non funzionano da una shell sqlite3 qualunque.
+# Gli id non vengono mai riusati (AUTOINCREMENT): il testo di un id non
+# cambia mai e TextCache non ha bisogno di invalidazione.
+
+# Sotto questa dimensione (byte UTF-8) il testo è salvato in chiaro:
+# comprimerlo farebbe risparmiare poco o niente
+COMPRESS_MIN_BYTES = 256
+ZLIB_LEVEL = 6
+
+# Valori della colonna note_contents.codec
+CODEC_RAW = 'raw'
+CODEC_ZLIB = 'zlib'
+
+# Elimina il testo `{ref}.content_id` se nessun appunto o versione lo usa più
+_COLLECT = '''
+        DELETE FROM note_contents WHERE id = {ref}.content_id{extra}
+            AND NOT EXISTS (SELECT 1 FROM notes WHERE content_id = {ref}.content_id)
+            AND NOT EXISTS (SELECT 1 FROM note_history WHERE content_id = {ref}.content_id);'''
+
+# Testo di `{ref}` per l'indice full-text
+_BODY = '(SELECT note_body(id, codec, data) FROM note_contents WHERE id = {ref}.content_id)'
+
+CONTENT_STORE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS note_contents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hash BLOB NOT NULL UNIQUE,
+        size INTEGER NOT NULL,
+        codec TEXT NOT NULL CHECK (codec IN ('raw', 'zlib')),
+        data BLOB NOT NULL
+    )
+    ''',
+    # Vista letta da FTS5 (external content) al posto di `notes`
+    '''
+    CREATE VIEW IF NOT EXISTS notes_text AS
+    SELECT n.rowid AS note_rowid, n.title AS title, note_body(c.id, c.codec, c.data) AS content
+    FROM notes n LEFT JOIN note_contents c ON c.id = n.content_id
+    ''',
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title,
+        content,
+        content='notes_text',
+        content_rowid='note_rowid',
+        tokenize='{FTS_TOKENIZE}'
+    )
+    ''',
+    # Indice full-text e raccolta dei testi orfani: nello stesso trigger, così
+    # il testo vecchio esiste ancora quando FTS5 lo rimuove dall'indice
+    f'''
+    CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts (rowid, title, content)
+        VALUES (new.rowid, new.title, {_BODY.format(ref='new')});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts (notes_fts, rowid, title, content)
+        VALUES ('delete', old.rowid, old.title, {_BODY.format(ref='old')});{_COLLECT.format(ref='old', extra='')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content_id ON notes BEGIN
+        INSERT INTO notes_fts (notes_fts, rowid, title, content)
+        VALUES ('delete', old.rowid, old.title, {_BODY.format(ref='old')});
+        INSERT INTO notes_fts (rowid, title, content)
+        VALUES (new.rowid, new.title, {_BODY.format(ref='new')});{_COLLECT.format(ref='old', extra=' AND old.content_id IS NOT new.content_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS note_history_content_delete AFTER DELETE ON note_history
+    WHEN old.content_id IS NOT NULL BEGIN{_COLLECT.format(ref='old', extra='')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS note_history_content_update AFTER UPDATE OF content_id ON note_history
+    WHEN old.content_id IS NOT NULL AND old.content_id IS NOT new.content_id BEGIN{_COLLECT.format(ref='old', extra='')}
+    END
+    ''',
+]
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def encode_content(text: str) -> Tuple[str, bytes]:
+    """(codec, data) di un testo: compresso solo se è abbastanza grande e ne vale la pena"""
+    raw = text.encode('utf-8')
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, ZLIB_LEVEL)
+        if len(packed) < len(raw):
+            return CODEC_ZLIB, packed
+    return CODEC_RAW, raw
+
+
+def decode_content(codec: str, data: bytes, max_chars: Optional[int] = None) -> str:
+    """Testo salvato; con `max_chars` solo i primi caratteri, senza decomprimere il resto"""
+    if max_chars is None:
+        if codec == CODEC_ZLIB:
+            data = zlib.decompress(data)
+        return data.decode('utf-8')
+    # In UTF-8 un carattere occupa al più 4 byte
+    max_bytes = max_chars * 4
+    if codec == CODEC_ZLIB:
+        data = zlib.decompressobj().decompress(data, max_bytes)
+    else:
+        data = data[:max_bytes]
+    # Il taglio può cadere a metà di un carattere, solo in fondo
+    return data.decode('utf-8', errors='ignore')[:max_chars]
+
+
+def register_functions(conn, cache: 'TextCache' = None):
+    """Registra note_body(id, codec, data), che usa `cache` se indicata"""
+    def note_body(content_id: Optional[int], codec: Optional[str],
+                  data: Optional[bytes]) -> Optional[str]:
+        if data is None:
+            return None
+        if cache is None:
+            return decode_content(codec, data)
+        text = cache.get(content_id)
+        if text is None:
+            text = decode_content(codec, data)
+            cache.put(content_id, text)
+        return text
+
+    conn.create_function('note_body', 3, note_body, deterministic=True)
+
+
+def store_content(conn, text: str) -> int:
+    """Id del testo nel content store, aggiungendolo se non c'è già"""
+    digest = content_hash(text)
+    row = conn.execute('SELECT id FROM note_contents WHERE hash = ?', (digest,)).fetchone()
+    if row is not None:
+        return row[0]
+    codec, data = encode_content(text)
+    cursor = conn.execute(
+        'INSERT INTO note_contents (hash, size, codec, data) VALUES (?, ?, ?, ?)',
+        (digest, len(text.encode('utf-8')), codec, data)
+    )
+    return cursor.lastrowid
+
+
+class TextCache:
+    """LRU dei testi decompressi per id del content store, limitata in caratteri"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._texts: OrderedDict = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, content_id: int) -> Optional[str]:
+        with self._lock:
+            text = self._texts.get(content_id)
+            if text is None:
+                self._misses += 1
+                return None
+            self._texts.move_to_end(content_id)
+            self._hits += 1
+            return text
+
+    def put(self, content_id: int, text: str):
+        # I testi più grandi di un quarto della cache non vengono tenuti
+        if len(text) > self.max_chars // 4:
+            return
+        with self._lock:
+            if content_id in self._texts:
+                return
+            self._texts[content_id] = text
+            self._chars += len(text)
+            while self._chars > self.max_chars:
+                _, evicted = self._texts.popitem(last=False)
+                self._chars -= len(evicted)
+                self._evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._texts),
+                'chars': self._chars,
+                'max_chars': self.max_chars,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
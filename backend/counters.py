@@ -0,0 +1,157 @@
+import argparse
+import sys
+from typing import Any, Dict, List
+
+# Contatori materializzati: appunti per cartella, per tag e per tipo,
+# versioni dello storico per appunto e in totale. Stanno nella tabella
+# `note_counters`, una riga per (ambito, chiave), e sono aggiornati dai
+# trigger su notes, note_tags e note_history, quindi valgono anche per le
+# operazioni batch, l'import e le cancellazioni in cascata. Le righe che
+# arrivano a zero vengono eliminate. Leggerli costa una riga per chiave,
+# indipendentemente dal numero di appunti.
+#
+# Se i conteggi si discostano (es. scritture fatte con i trigger
+# disattivati), `python counters.py` li confronta con le tabelle e
+# `python counters.py --rebuild` li ricalcola.
+
+# Ambiti dei contatori e relative chiavi
+SCOPE_FOLDER = 'folder'      # id della cartella, UNFILED per gli appunti senza
+SCOPE_TAG = 'tag'            # id del tag
+SCOPE_TYPE = 'type'          # tipo dell'appunto
+SCOPE_VERSIONS = 'versions'  # id dell'appunto: versioni nello storico
+SCOPE_TOTAL = 'total'        # TOTAL_HISTORY: versioni di tutti gli appunti
+
+UNFILED = ''
+TOTAL_HISTORY = 'history'
+
+_ADD = '''
+        INSERT INTO note_counters (scope, key, value) VALUES ('{scope}', {key}, 1)
+            ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;'''
+
+_SUBTRACT = '''
+        UPDATE note_counters SET value = value - 1 WHERE scope = '{scope}' AND key = {key};
+        DELETE FROM note_counters WHERE scope = '{scope}' AND key = {key} AND value <= 0;'''
+
+
+def _folder(ref: str) -> str:
+    return f"COALESCE({ref}.folder_id, '{UNFILED}')"
+
+
+COUNTERS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS note_counters (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (scope, key)
+    ) WITHOUT ROWID
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS notes_counters_insert AFTER INSERT ON notes BEGIN{
+        _ADD.format(scope=SCOPE_TYPE, key='new.type')}{
+        _ADD.format(scope=SCOPE_FOLDER, key=_folder('new'))}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS notes_counters_delete AFTER DELETE ON notes BEGIN{
+        _SUBTRACT.format(scope=SCOPE_TYPE, key='old.type')}{
+        _SUBTRACT.format(scope=SCOPE_FOLDER, key=_folder('old'))}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS notes_counters_update_type AFTER UPDATE OF type ON notes
+    WHEN old.type IS NOT new.type BEGIN{
+        _SUBTRACT.format(scope=SCOPE_TYPE, key='old.type')}{
+        _ADD.format(scope=SCOPE_TYPE, key='new.type')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS notes_counters_update_folder AFTER UPDATE OF folder_id ON notes
+    WHEN old.folder_id IS NOT new.folder_id BEGIN{
+        _SUBTRACT.format(scope=SCOPE_FOLDER, key=_folder('old'))}{
+        _ADD.format(scope=SCOPE_FOLDER, key=_folder('new'))}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS note_tags_counters_insert AFTER INSERT ON note_tags BEGIN{
+        _ADD.format(scope=SCOPE_TAG, key='new.tag_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS note_tags_counters_delete AFTER DELETE ON note_tags BEGIN{
+        _SUBTRACT.format(scope=SCOPE_TAG, key='old.tag_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS note_history_counters_insert AFTER INSERT ON note_history BEGIN{
+        _ADD.format(scope=SCOPE_VERSIONS, key='new.note_id')}{
+        _ADD.format(scope=SCOPE_TOTAL, key=f"'{TOTAL_HISTORY}'")}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS note_history_counters_delete AFTER DELETE ON note_history BEGIN{
+        _SUBTRACT.format(scope=SCOPE_VERSIONS, key='old.note_id')}{
+        _SUBTRACT.format(scope=SCOPE_TOTAL, key=f"'{TOTAL_HISTORY}'")}
+    END
+    ''',
+]
+
+# Valori attesi, ricalcolati dalle tabelle: (scope, key, value)
+EXPECTED_COUNTERS = f'''
+    SELECT '{SCOPE_TYPE}', type, COUNT(*) FROM notes GROUP BY type
+    UNION ALL
+    SELECT '{SCOPE_FOLDER}', {_folder('notes')}, COUNT(*) FROM notes GROUP BY 2
+    UNION ALL
+    SELECT '{SCOPE_TAG}', tag_id, COUNT(*) FROM note_tags GROUP BY tag_id
+    UNION ALL
+    SELECT '{SCOPE_VERSIONS}', note_id, COUNT(*) FROM note_history GROUP BY note_id
+    UNION ALL
+    SELECT '{SCOPE_TOTAL}', '{TOTAL_HISTORY}', COUNT(*) FROM note_history HAVING COUNT(*) > 0
+'''
+
+
+def rebuild_counters(conn):
+    """Ricalcola tutti i contatori (nella transazione di `conn`)"""
+    conn.execute('DELETE FROM note_counters')
+    conn.execute(f'INSERT INTO note_counters (scope, key, value) {EXPECTED_COUNTERS}')
+
+
+def counter_drift(conn) -> List[Dict[str, Any]]:
+    """Contatori diversi dal valore ricalcolato dalle tabelle"""
+    expected = {(scope, str(key)): value for scope, key, value in conn.execute(EXPECTED_COUNTERS)}
+    actual = {(scope, key): value
+              for scope, key, value in conn.execute('SELECT scope, key, value FROM note_counters')}
+    return [
+        {'scope': scope, 'key': key,
+         'expected': expected.get((scope, key), 0), 'actual': actual.get((scope, key), 0)}
+        for scope, key in sorted(expected.keys() | actual.keys())
+        if expected.get((scope, key), 0) != actual.get((scope, key), 0)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Controlla i contatori materializzati degli appunti')
+    parser.add_argument('--db-path', help='Database (default: impostazioni, NOTES_DB_PATH)')
+    parser.add_argument('--rebuild', action='store_true', help='Ricalcola i contatori se differiscono')
+    args = parser.parse_args()
+
+    # Import qui: database usa questo modulo
+    from database import NotesDatabase
+    db = NotesDatabase(args.db_path, seed=False)
+    try:
+        drift = db.check_counters()
+        for item in drift:
+            print(f"{item['scope']} {item['key']!r}: {item['actual']} (expected {item['expected']})")
+        if not drift:
+            print('OK: counters match the tables')
+        elif args.rebuild:
+            db.rebuild_counters()
+            print(f'Rebuilt counters ({len(drift)} were wrong)')
+        else:
+            sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,89 +1,329 @@
 import sqlite3
-import os
+import base64
+import functools
+import threading
+import time
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, Tuple
 from datetime import datetime
 import json
 import uuid
 
+from pool import ConnectionPool, serialized_write
+from metrics import QueryMetrics
+from search import TITLE_WEIGHT, CONTENT_WEIGHT, build_match_query
+import suggest
+from query import DEFAULT_SORT, compile_query
+from migrations import apply_migrations
+from cache import QueryCache, cached
+from content_store import TextCache, decode_content, register_functions, store_content
+import counters
+from settings import Settings, get_settings
+import history
+
+# Operazioni supportate da batch_update_notes
+BATCH_OPERATIONS = ('move', 'tag', 'untag', 'delete')
+
+# Descrizione delle versioni create dal salvataggio automatico
+AUTOSAVE_CHANGES = 'Salvataggio automatico'
+
+# Colore dei tag creati automaticamente
+DEFAULT_TAG_COLOR = 'bg-gray-500'
+
+# Limite prudente di parametri per le query `IN (...)`
+MAX_QUERY_PARAMS = 500
+
+# Caratteri del contenuto nella proiezione 'preview'
+PREVIEW_LENGTH = 200
+
+# Colonne selezionate per ogni proiezione di get_notes: il testo viene poi
+# letto dal content store solo per 'full' e 'preview'
+NOTE_PROJECTIONS = {
+    'full': 'n.*',
+    'list': 'n.id, n.title, n.type, n.folder_id, n.created_at, n.updated_at',
+    'preview': 'n.id, n.title, n.type, n.folder_id, n.created_at, n.updated_at, n.content_id',
+}
+
+# Sorgenti dei suggerimenti: indice trigram, tabella, colonne (id e
+# `title`), colonna del titolo e colonna di recenza
+SUGGEST_SOURCES = {
+    'notes': ('notes_title_fts', 'notes', 'id, title, updated_at', 'title', 'updated_at'),
+    'tags': ('tags_name_fts', 'tags', 'id, name AS title', 'name', None),
+}
+
+def encode_cursor(updated_at: str, note_id: str) -> str:
+    """Cursore opaco per la paginazione keyset di get_notes"""
+    raw = json.dumps([updated_at, note_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> List[str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        updated_at, note_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+    return [str(updated_at), str(note_id)]
+
+def next_cursor(notes: List[Dict[str, Any]], limit: Optional[int],
+                sort_key: str = 'updated_at') -> Optional[str]:
+    """Cursore della pagina successiva, o None se questa è l'ultima.
+
+    `sort_key` è la chiave dell'ordinamento usato (vedi query.Sort.key).
+    """
+    if limit is None or len(notes) < limit:
+        return None
+    last = notes[-1]
+    return encode_cursor(last[sort_key], last['id'])
+
+def encode_sync_token(seq: int) -> str:
+    """Token opaco di sincronizzazione (posizione nel change log)"""
+    raw = json.dumps(['sync', seq], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_sync_token(token: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        kind, seq = json.loads(raw)
+        if kind != 'sync':
+            raise ValueError(kind)
+        return int(seq)
+    except (ValueError, TypeError) as e:
+        raise InvalidSyncToken(f'Invalid sync token: {token}') from e
+
+class InvalidCursor(ValueError):
+    """Cursore di paginazione non valido"""
+
+class InvalidSyncToken(ValueError):
+    """Token di sincronizzazione non valido"""
+
+class SyncTokenExpired(Exception):
+    """Il token precede le voci ancora conservate nel change log"""
+
+# Regioni della cache toccate dalle modifiche di ogni entità del change log
+CHANGE_REGIONS = {
+    'note': ('notes', 'folders'),
+    'folder': ('folders', 'notes'),
+    'tag': ('tags', 'notes'),
+}
+
+def _filter_has_condition(folder_id: str = None, search: str = None, tag: str = None,
+                          q: str = None) -> bool:
+    """True se i filtri restringono davvero gli appunti: una ricerca di sola
+    punteggiatura o una `q` con solo l'ordinamento non contano"""
+    return bool(
+        folder_id or tag
+        or (search and build_match_query(search))
+        or (q and compile_query(q).where != '1=1')
+    )
+
+def _chunks(items: List[Any], size: int = MAX_QUERY_PARAMS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 class NotesDatabase:
-    def __init__(self, db_path: str = None):
+    """Accesso al database SQLite degli appunti.
+
+    I parametri non indicati vengono dai Settings (variabili d'ambiente
+    `NOTES_*`). Il costruttore apre il pool, applica le migrazioni e, se
+    richiesto, inserisce i dati iniziali: va creato all'avvio
+    dell'applicazione, non all'import.
+    """
+
+    def __init__(self, db_path: str = None, pool_size: int = None, pool_timeout: float = None,
+                 cache_size: int = None, cache_ttl: float = None,
+                 change_retention_days: float = None, seed: bool = None,
+                 history_window: float = None, query_metrics: bool = None,
+                 slow_query_ms: float = None, content_cache_mb: float = None):
+        settings = get_settings()
         if db_path is None:
-            # Crea directory data se non exists
-            data_dir = Path('/app/data')
-            data_dir.mkdir(exist_ok=True)
-            db_path = data_dir / 'notes.db'
+            db_path = settings.db_path
+        if pool_size is None:
+            pool_size = settings.db_pool_size
+        if pool_timeout is None:
+            pool_timeout = settings.db_pool_timeout
+        if cache_size is None:
+            cache_size = settings.cache_size
+        if cache_ttl is None:
+            cache_ttl = settings.cache_ttl
+        if change_retention_days is None:
+            change_retention_days = settings.change_retention_days
+        if seed is None:
+            seed = settings.seed
+        if history_window is None:
+            history_window = settings.history_window
+        if query_metrics is None:
+            query_metrics = settings.metrics
+        if slow_query_ms is None:
+            slow_query_ms = settings.slow_query_ms
+        if content_cache_mb is None:
+            content_cache_mb = settings.content_cache_mb
         
+        # Crea la directory del database se non esiste
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         self.db_path = str(db_path)
+        # Giorni per cui il change log (e quindi le tombstone) viene conservato
+        self.change_retention_days = change_retention_days
+        # Intervallo minimo tra due versioni create dal salvataggio automatico
+        self.history_window = history_window
+        self.cache = QueryCache(max_entries=cache_size, ttl=cache_ttl)
+        # Testi già decompressi: sopravvivono alle invalidazioni della cache
+        self.contents = TextCache(int(content_cache_mb * 1_000_000))
+        
+        # Mappa nome -> id dei tag, caricata al primo uso
+        self._tag_ids = None
+        self._tag_ids_lock = threading.Lock()
+        
+        # Versioni dei dati per regione (validatori HTTP): l'ultimo seq del
+        # change log che ha toccato la regione, uguale in tutti i processi
+        self._region_seq = {}
+        self._modified_at = {}
+        self._version_lock = threading.Lock()
+        # Callback chiamate dopo ogni scrittura confermata (change feed)
+        self._change_listeners: List[Callable[[], None]] = []
+        # Durata e righe di ogni query (None se le metriche sono disattivate)
+        self.query_metrics = QueryMetrics(slow_query_ms) if query_metrics else None
+        self.pool = ConnectionPool(self.db_path, max_size=pool_size, timeout=pool_timeout,
+                                   query_metrics=self.query_metrics,
+                                   on_connect=functools.partial(register_functions,
+                                                                cache=self.contents))
         self.init_database()
-        self.seed_initial_data()
+        self._watch_changes()
+        if seed:
+            self.seed_initial_data()
+    
+    @classmethod
+    def from_settings(cls, settings: Settings) -> 'NotesDatabase':
+        return cls(
+            db_path=settings.db_path,
+            pool_size=settings.db_pool_size,
+            pool_timeout=settings.db_pool_timeout,
+            cache_size=settings.cache_size,
+            cache_ttl=settings.cache_ttl,
+            change_retention_days=settings.change_retention_days,
+            seed=settings.seed,
+            history_window=settings.history_window,
+            query_metrics=settings.metrics,
+            slow_query_ms=settings.slow_query_ms,
+            content_cache_mb=settings.content_cache_mb,
+        )
     
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Checkout di una connessione dal pool (da usare con `with`)"""
+        return self.pool.connection()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.pool.stats()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+    
+    def content_cache_stats(self) -> Dict[str, Any]:
+        return self.contents.stats()
     
+    def _watch_changes(self):
+        """Prepara il rilevamento delle scritture fatte da altri processi.
+
+        Una connessione dedicata legge `PRAGMA data_version`, che cambia
+        quando un'altra connessione (anche di un altro worker) conferma una
+        transazione: solo allora si rilegge la coda del change log.
+        """
+        self._watch_lock = threading.Lock()
+        self._watch = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._watch_version = None
+        row = self._watch.execute('SELECT uid FROM database_info WHERE id = 1').fetchone()
+        self._uid = row[0]
+        # Regioni senza voci nel change log: ultima modifica all'ultima
+        # migrazione, lo stesso istante per tutti i worker
+        applied_at = self._watch.execute('SELECT MAX(applied_at) FROM schema_version').fetchone()[0]
+        self._migrated_at = datetime.fromisoformat(f'{applied_at}+00:00').timestamp()
+        
+        horizon = self._watch.execute('SELECT seq FROM sync_horizon WHERE id = 1').fetchone()
+        self._seen_seq = horizon[0] if horizon else 0
+        for entity, regions in CHANGE_REGIONS.items():
+            row = self._watch.execute('''
+                SELECT seq, changed_at FROM change_log
+                WHERE entity = ? ORDER BY seq DESC LIMIT 1
+            ''', (entity,)).fetchone()
+            if row:
+                self._record_change(regions, *row)
+                self._seen_seq = max(self._seen_seq, row[0])
+    
+    def _record_change(self, regions: Iterable[str], seq: int, changed_at: str):
+        modified_at = datetime.fromisoformat(f'{changed_at}+00:00').timestamp()
+        with self._version_lock:
+            for region in regions:
+                if seq > self._region_seq.get(region, 0):
+                    self._region_seq[region] = seq
+                    self._modified_at[region] = modified_at
+    
+    def _sync_changes(self, force: bool = False):
+        """Applica le voci nuove del change log: cache, versioni e notifiche.
+
+        Senza `force` non fa nulla se nessuna connessione ha scritto dal
+        controllo precedente (costa una PRAGMA).
+        """
+        with self._watch_lock:
+            version = self._watch.execute('PRAGMA data_version').fetchone()[0]
+            if version == self._watch_version and not force:
+                return
+            self._watch_version = version
+            rows = self._watch.execute('''
+                SELECT entity, MAX(seq), MAX(changed_at) FROM change_log
+                WHERE seq > ? GROUP BY entity
+            ''', (self._seen_seq,)).fetchall()
+            if not rows:
+                return
+            regions = set()
+            for entity, seq, changed_at in rows:
+                self._record_change(CHANGE_REGIONS[entity], seq, changed_at)
+                regions.update(CHANGE_REGIONS[entity])
+                self._seen_seq = max(self._seen_seq, seq)
+        
+        self.cache.invalidate(*regions)
+        for listener in self._change_listeners:
+            listener()
+    
+    def _invalidate(self, *regions: str):
+        """Scarta le letture in cache toccate da una scrittura (dopo il commit)"""
+        self.cache.invalidate(*regions)
+        self._sync_changes(force=True)
+    
+    def add_change_listener(self, listener: Callable[[], None]):
+        """Registra una callback da chiamare dopo ogni scrittura confermata"""
+        self._change_listeners.append(listener)
+    
+    def data_version(self, region: str) -> Tuple[str, float]:
+        """Validatore di una regione di dati: (versione, istante dell'ultima modifica).
+
+        La versione cambia a ogni scrittura che tocca la regione, anche se
+        fatta da un altro processo, ed è la stessa in tutti i worker: può
+        essere usata come ETag.
+        """
+        self._sync_changes()
+        with self._version_lock:
+            seq = self._region_seq.get(region, 0)
+            modified_at = self._modified_at.get(region, self._migrated_at)
+        return f'{self._uid}-{region}-{seq}', modified_at
+    
+    def close(self):
+        with self._watch_lock:
+            self._watch.close()
+        self.pool.close()
+    
+    @serialized_write
     def init_database(self):
-        """Crea tabelle se non esistono"""
+        """Crea o aggiorna lo schema applicando le migrazioni mancanti"""
         with self.get_connection() as conn:
-            # Folders table
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS folders (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Tags table
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS tags (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE,
-                    color TEXT NOT NULL
-                )
-            ''')
-            
-            # Notes table
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS notes (
-                    id TEXT PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    type TEXT NOT NULL CHECK (type IN ('text', 'code', 'list')),
-                    folder_id TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (folder_id) REFERENCES folders (id)
-                )
-            ''')
-            
-            # Note Tags junction table
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS note_tags (
-                    note_id TEXT,
-                    tag_id INTEGER,
-                    PRIMARY KEY (note_id, tag_id),
-                    FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
-                    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            # Note History table
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS note_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    note_id TEXT NOT NULL,
-                    version INTEGER NOT NULL,
-                    content TEXT NOT NULL,
-                    changes TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            conn.commit()
+            apply_migrations(conn)
+    
+    @serialized_write
+    def rebuild_search_index(self):
+        """Ricostruisce gli indici full-text e trigram (necessario dopo un VACUUM)"""
+        with self.get_connection() as conn:
+            for table in ('notes_fts', 'notes_title_fts', 'tags_name_fts'):
+                conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
     
+    @serialized_write
     def seed_initial_data(self):
         """Popola database con dati iniziali se vuoto"""
         with self.get_connection() as conn:
@@ -101,7 +341,7 @@ class NotesDatabase:
             ]
             
             conn.executemany(
-                'INSERT INTO folders (id, name) VALUES (?, ?)',
+                'INSERT OR IGNORE INTO folders (id, name) VALUES (?, ?)',
                 folders
             )
             
@@ -122,23 +362,66 @@ class NotesDatabase:
             ]
             
             conn.executemany(
-                'INSERT INTO tags (name, color) VALUES (?, ?)',
+                'INSERT OR IGNORE INTO tags (name, color) VALUES (?, ?)',
                 tags
             )
             
             conn.commit()
     
+    # STATS
+    @cached('notes')
+    def get_stats(self) -> Dict[str, Any]:
+        """Conteggi per tipo, cartella e tag dai contatori materializzati"""
+        with self.get_connection() as conn:
+            by_scope = {}
+            for row in conn.execute('''
+                SELECT c.scope, COALESCE(t.name, c.key) AS key, c.value
+                FROM note_counters c
+                LEFT JOIN tags t ON c.scope = ? AND t.id = c.key
+                WHERE c.scope IN (?, ?, ?, ?)
+            ''', (counters.SCOPE_TAG, counters.SCOPE_TAG, counters.SCOPE_TYPE,
+                  counters.SCOPE_FOLDER, counters.SCOPE_TOTAL)):
+                by_scope.setdefault(row['scope'], {})[row['key']] = row['value']
+        
+        folders = by_scope.get(counters.SCOPE_FOLDER, {})
+        by_type = by_scope.get(counters.SCOPE_TYPE, {})
+        return {
+            'notes': sum(by_type.values()),
+            'by_type': by_type,
+            'unfiled': folders.pop(counters.UNFILED, 0),
+            'folders': folders,
+            'tags': by_scope.get(counters.SCOPE_TAG, {}),
+            'history_versions': by_scope.get(counters.SCOPE_TOTAL, {}).get(counters.TOTAL_HISTORY, 0),
+        }
+    
+    def check_counters(self) -> List[Dict[str, Any]]:
+        """Contatori materializzati che non corrispondono alle tabelle (scansione completa)"""
+        with self.get_connection() as conn:
+            return counters.counter_drift(conn)
+    
+    @serialized_write
+    def rebuild_counters(self):
+        """Ricalcola i contatori materializzati dalle tabelle"""
+        with self.get_connection() as conn:
+            counters.rebuild_counters(conn)
+            conn.commit()
+        self._invalidate('folders', 'notes')
+    
     # FOLDERS CRUD
+    @cached('folders')
     def get_folders(self) -> List[Dict[str, Any]]:
         with self.get_connection() as conn:
+            # Conteggi dai contatori materializzati: non dipende dal numero di appunti
             cursor = conn.execute('''
-                SELECT id, name, created_at,
-                       (SELECT COUNT(*) FROM notes WHERE folder_id = folders.id) as note_count
-                FROM folders 
-                ORDER BY name
-            ''')
+                SELECT folders.id, folders.name, folders.created_at,
+                       COALESCE(c.value, 0) as note_count
+                FROM folders
+                LEFT JOIN note_counters c ON c.scope = ? AND c.key = folders.id
+                ORDER BY folders.name
+            ''', (counters.SCOPE_FOLDER,))
             return [dict(row) for row in cursor.fetchall()]
     
+    @serialized_write
     def create_folder(self, name: str) -> Dict[str, Any]:
         folder_id = str(uuid.uuid4())
         with self.get_connection() as conn:
@@ -147,8 +430,10 @@ class NotesDatabase:
                 (folder_id, name)
             )
             conn.commit()
-            return {'id': folder_id, 'name': name, 'note_count': 0}
+        self._invalidate('folders')
+        return {'id': folder_id, 'name': name, 'note_count': 0}
     
+    @serialized_write
     def update_folder(self, folder_id: str, name: str) -> Optional[Dict[str, Any]]:
         with self.get_connection() as conn:
             cursor = conn.execute(
@@ -158,20 +443,27 @@ class NotesDatabase:
             if cursor.rowcount == 0:
                 return None
             conn.commit()
-            return {'id': folder_id, 'name': name}
+        self._invalidate('folders')
+        return {'id': folder_id, 'name': name}
     
+    @serialized_write
     def delete_folder(self, folder_id: str) -> bool:
         with self.get_connection() as conn:
+            # Gli appunti della cartella restano, senza cartella
+            conn.execute('UPDATE notes SET folder_id = NULL WHERE folder_id = ?', (folder_id,))
             cursor = conn.execute('DELETE FROM folders WHERE id = ?', (folder_id,))
             conn.commit()
-            return cursor.rowcount > 0
+        self._invalidate('folders', 'notes')
+        return cursor.rowcount > 0
     
     # TAGS CRUD
+    @cached('tags')
     def get_tags(self) -> List[Dict[str, Any]]:
         with self.get_connection() as conn:
             cursor = conn.execute('SELECT * FROM tags ORDER BY name')
             return [dict(row) for row in cursor.fetchall()]
     
+    @serialized_write
     def create_tag(self, name: str, color: str) -> Dict[str, Any]:
         with self.get_connection() as conn:
             cursor = conn.execute(
@@ -180,159 +472,920 @@ class NotesDatabase:
             )
             row = cursor.fetchone()
             conn.commit()
-            return dict(row)
+        with self._tag_ids_lock:
+            if self._tag_ids is not None:
+                self._tag_ids[row['name']] = row['id']
+        self._invalidate('tags')
+        return dict(row)
+    
+    def _resolve_tag_ids(self, conn, tag_names: Iterable[str], pending: Dict[str, int],
+                         auto_create: bool = False) -> Tuple[Dict[str, int], bool]:
+        """Id dei tag indicati: (nome -> id, True se ne sono stati creati).
+
+        I nomi vengono risolti dalla mappa in memoria, i mancanti con una
+        sola query; con `auto_create` quelli inesistenti vengono creati con
+        il colore di default. I tag sconosciuti non creati sono omessi.
+        Gli id letti o creati nella transazione vanno in `pending`, da
+        passare a _remember_tag_ids solo dopo il commit: se la transazione
+        viene annullata, AUTOINCREMENT riassegna gli id dei tag creati.
+        """
+        names = list(dict.fromkeys(tag_names))
+        with self._tag_ids_lock:
+            if self._tag_ids is None and not conn.in_transaction:
+                self._tag_ids = {
+                    row['name']: row['id'] for row in conn.execute('SELECT id, name FROM tags')
+                }
+            known = self._tag_ids or {}
+            resolved = {name: known[name] for name in names if name in known}
+        resolved.update((name, pending[name]) for name in names if name in pending)
+        
+        missing = [name for name in names if name not in resolved]
+        if not missing:
+            return resolved, False
+        
+        # Tag creati da un altro processo o nella transazione corrente
+        found = self._select_tag_ids(conn, missing)
+        pending.update(found)
+        resolved.update(found)
+        
+        created = False
+        missing = [name for name in missing if name not in found]
+        if missing and auto_create:
+            conn.executemany(
+                'INSERT INTO tags (name, color) VALUES (?, ?)',
+                [(name, DEFAULT_TAG_COLOR) for name in missing]
+            )
+            found = self._select_tag_ids(conn, missing)
+            pending.update(found)
+            resolved.update(found)
+            created = True
+        
+        return resolved, created
+    
+    def _remember_tag_ids(self, tag_ids: Dict[str, int]):
+        """Aggiunge alla mappa in memoria gli id di una transazione confermata"""
+        if not tag_ids:
+            return
+        with self._tag_ids_lock:
+            if self._tag_ids is not None:
+                self._tag_ids.update(tag_ids)
+    
+    def _select_tag_ids(self, conn, names: List[str]) -> Dict[str, int]:
+        found = {}
+        for chunk in _chunks(names):
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(f'SELECT id, name FROM tags WHERE name IN ({placeholders})', chunk)
+            found.update((row['name'], row['id']) for row in cursor)
+        return found
+    
+    def _assign_tags(self, conn, note_id: str, tag_names: List[str], pending: Dict[str, int],
+                     auto_create: bool = False) -> Tuple[bool, bool]:
+        """Porta i tag di un appunto a `tag_names` applicando solo le differenze.
+
+        Restituisce (link modificati, tag creati); `pending` come in _resolve_tag_ids.
+        """
+        tag_ids, created = self._resolve_tag_ids(conn, tag_names, pending, auto_create)
+        desired = set(tag_ids.values())
+        current = {
+            row[0] for row in
+            conn.execute('SELECT tag_id FROM note_tags WHERE note_id = ?', (note_id,))
+        }
+        
+        removed = current - desired
+        added = desired - current
+        if removed:
+            conn.executemany(
+                'DELETE FROM note_tags WHERE note_id = ? AND tag_id = ?',
+                [(note_id, tag_id) for tag_id in removed]
+            )
+        if added:
+            conn.executemany(
+                'INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)',
+                [(note_id, tag_id) for tag_id in added]
+            )
+        return bool(removed or added), created
     
     # NOTES CRUD
-    def get_notes(self, folder_id: str = None, search: str = None, tag: str = None) -> List[Dict[str, Any]]:
-        with self.get_connection() as conn:
-            query = '''
-                SELECT DISTINCT n.*, 
-                       GROUP_CONCAT(t.name) as tag_names,
-                       GROUP_CONCAT(t.color) as tag_colors
-                FROM notes n
-                LEFT JOIN note_tags nt ON n.id = nt.note_id
-                LEFT JOIN tags t ON nt.tag_id = t.id
-                WHERE 1=1
+    @cached('notes')
+    def get_notes(self, folder_id: str = None, search: str = None, tag: str = None,
+                  limit: int = None, cursor: str = None, fields: str = 'full',
+                  q: str = None) -> List[Dict[str, Any]]:
+        """Appunti filtrati, dal più recente (o nell'ordine indicato da `q`).
+
+        `q` è una query nel linguaggio di `query.py` (tag in AND/OR/NOT,
+        tipo, intervalli di date, ordinamento), in AND con gli altri filtri.
+        `limit`/`cursor` abilitano la paginazione keyset su (ordinamento, id):
+        il cursore della pagina successiva si ottiene con `next_cursor()`
+        dall'ultimo appunto restituito. `fields` sceglie la proiezione:
+        'full' (tutto), 'list' (senza contenuto) o 'preview' (contenuto troncato).
+        """
+        if fields not in NOTE_PROJECTIONS:
+            raise ValueError(f'Unknown fields projection: {fields}')
+        
+        sort = compile_query(q).sort if q else DEFAULT_SORT
+        condition, params = self._note_filter(folder_id, search, tag, q=q, paged=limit is not None)
+        if cursor:
+            condition += f' AND {sort.after_cursor()}'
+            params.extend(decode_cursor(cursor))
+        
+        query = f'''
+            SELECT {NOTE_PROJECTIONS[fields]} FROM notes n
+            WHERE {condition}
+            ORDER BY {sort.order_by()}
+        '''
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        
+        with self.get_connection() as conn:
+            # Più fasi: prima la pagina di appunti, poi testi e tag di tutta la pagina
+            notes = [dict(row) for row in conn.execute(query, params)]
+            if fields != 'list':
+                self._load_contents(conn, notes, preview=fields == 'preview')
+            tags = self._load_tags(conn, [note['id'] for note in notes])
+            for note in notes:
+                note['tags'] = tags[note['id']]
+            return notes
+    
+    def _note_filter(self, folder_id: str = None, search: str = None, tag: str = None,
+                     q: str = None, paged: bool = False) -> Tuple[str, List[Any]]:
+        """Condizioni SQL (sull'alias `n` di notes) per i filtri degli appunti.
+
+        Con `paged` (ORDER BY updated_at + LIMIT) il filtro per tag è un EXISTS
+        correlato: la scansione dell'indice si ferma a pagina piena. Altrimenti
+        (conteggi, batch) si parte dall'indice di note_tags sul tag. `q` viene
+        compilata da query.compile_query (con cache dei piani).
+        """
+        query = '1=1'
+        params = []
+        
+        if folder_id:
+            query += ' AND n.folder_id = ?'
+            params.append(folder_id)
+        
+        if search:
+            match = build_match_query(search)
+            if match:
+                query += ' AND n.rowid IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)'
+                params.append(match)
+            else:
+                # Nessuna parola cercabile (es. solo punteggiatura): nessun risultato
+                query += ' AND 0'
+        
+        if tag:
+            if paged:
+                query += ''' AND EXISTS (
+                    SELECT 1 FROM note_tags nt JOIN tags t ON t.id = nt.tag_id
+                    WHERE nt.note_id = n.id AND t.name = ?
+                )'''
+            else:
+                query += ''' AND n.id IN (
+                    SELECT nt.note_id FROM note_tags nt JOIN tags t ON t.id = nt.tag_id
+                    WHERE t.name = ?
+                )'''
+            params.append(tag)
+        
+        if q:
+            compiled = compile_query(q, paged)
+            query += f' AND ({compiled.where})'
+            params.extend(compiled.params)
+        
+        return query, params
+    
+    @cached('notes')
+    def count_notes(self, folder_id: str = None, search: str = None, tag: str = None,
+                    q: str = None) -> int:
+        """Numero di appunti per una combinazione di filtri"""
+        with self.get_connection() as conn:
+            condition, params = self._note_filter(folder_id, search, tag, q=q)
+            return conn.execute(f'SELECT COUNT(*) FROM notes n WHERE {condition}', params).fetchone()[0]
+    
+    def _load_tags(self, conn, note_ids: List[str]) -> Dict[str, List[Dict[str, str]]]:
+        """Tag degli appunti indicati, raggruppati per id appunto"""
+        tags = {note_id: [] for note_id in note_ids}
+        for chunk in _chunks(note_ids):
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(f'''
+                SELECT nt.note_id, t.name, t.color
+                FROM note_tags nt
+                JOIN tags t ON t.id = nt.tag_id
+                WHERE nt.note_id IN ({placeholders})
+                ORDER BY t.name
+            ''', chunk)
+            for row in cursor:
+                tags[row['note_id']].append({'name': row['name'], 'color': row['color']})
+        return tags
+    
+    def _load_contents(self, conn, notes: List[Dict[str, Any]], preview: bool = False):
+        """Sostituisce `content_id` degli appunti con il testo (o l'anteprima)
+        preso da self.contents o letto dal content store, una query per blocco"""
+        texts = {}
+        missing = []
+        for content_id in {note['content_id'] for note in notes}:
+            text = self.contents.get(content_id)
+            if text is None:
+                missing.append(content_id)
+            else:
+                texts[content_id] = text
+        
+        for chunk in _chunks(missing):
+            placeholders = ','.join('?' * len(chunk))
+            cursor = conn.execute(
+                f'SELECT id, codec, data FROM note_contents WHERE id IN ({placeholders})', chunk
+            )
+            for row in cursor:
+                if preview:
+                    # Solo l'inizio: il resto non viene decompresso
+                    texts[row['id']] = decode_content(row['codec'], row['data'], PREVIEW_LENGTH)
+                else:
+                    texts[row['id']] = text = decode_content(row['codec'], row['data'])
+                    self.contents.put(row['id'], text)
+        
+        for note in notes:
+            text = texts.get(note.pop('content_id'), '')
+            if preview:
+                note['preview'] = text[:PREVIEW_LENGTH]
+            else:
+                note['content'] = text
+    
+    def search_notes(self, text: str, limit: int = 20, folder_id: str = None) -> List[Dict[str, Any]]:
+        """Ricerca full-text ordinata per rilevanza (bm25) con snippet evidenziati"""
+        match = build_match_query(text)
+        if not match:
+            return []
+        
+        with self.get_connection() as conn:
+            query = f'''
+                SELECT n.*,
+                       bm25(notes_fts, {TITLE_WEIGHT}, {CONTENT_WEIGHT}) AS score,
+                       highlight(notes_fts, 0, '<mark>', '</mark>') AS title_highlight,
+                       snippet(notes_fts, 1, '<mark>', '</mark>', '…', 16) AS snippet
+                FROM notes_fts
+                JOIN notes n ON n.rowid = notes_fts.rowid
+                WHERE notes_fts MATCH ?
             '''
-            params = []
+            params = [match]
             
             if folder_id:
                 query += ' AND n.folder_id = ?'
                 params.append(folder_id)
             
-            if search:
-                query += ' AND (n.title LIKE ? OR n.content LIKE ?)'
-                search_term = f'%{search}%'
-                params.extend([search_term, search_term])
-            
-            if tag:
-                query += ' AND t.name = ?'
-                params.append(tag)
+            query += ' ORDER BY score LIMIT ?'
+            params.append(limit)
             
-            query += ' GROUP BY n.id ORDER BY n.updated_at DESC'
-            
-            cursor = conn.execute(query, params)
-            notes = []
+            notes = [dict(row) for row in conn.execute(query, params)]
+            self._load_contents(conn, notes)
+            tags = self._load_tags(conn, [n['id'] for n in notes])
+            for note in notes:
+                note['tags'] = tags[note['id']]
+            return notes
+    
+    def suggest(self, prefix: str, limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+        """Appunti e tag il cui titolo (o nome) corrisponde al testo digitato.
+
+        Pensato per l'apertura rapida, a ogni tasto: prima le corrispondenze
+        esatte (inizio del titolo, inizio di parola, sottostringa), dalla
+        modifica più recente, poi quelle con errori di battitura. Solo id e
+        titolo. Non usa la cache delle query: ogni tasto è una chiave diversa
+        e ne farebbe uscire le pagine di appunti.
+        """
+        text = suggest.normalize(prefix)
+        if not text:
+            return {'notes': [], 'tags': []}
+        
+        with self.get_connection() as conn:
+            notes = self._suggest_rows(conn, text, limit, SUGGEST_SOURCES['notes'])
+            tags = self._suggest_rows(conn, text, limit, SUGGEST_SOURCES['tags'])
+        return {
+            'notes': [{'id': row['id'], 'title': row['title']} for row in notes],
+            'tags': [{'id': row['id'], 'name': row['title']} for row in tags],
+        }
+    
+    def _suggest_rows(self, conn, text: str, limit: int, source: Tuple) -> List[Dict[str, Any]]:
+        fts, table, columns, title, recency = source
+        
+        def indexed(condition: str, params: List[str], count: int) -> Dict[Any, Dict[str, Any]]:
+            """Candidati dall'indice trigram: i più recenti (per rowid) tra quelli trovati"""
+            query = f'''
+                SELECT {columns} FROM (
+                    SELECT rowid FROM {fts} WHERE {condition} ORDER BY rowid DESC LIMIT ?
+                ) m JOIN {table} ON {table}.rowid = m.rowid
+            '''
+            return {row['id']: dict(row) for row in conn.execute(query, [*params, count])}
+        
+        def recent(condition: str, params: List[str], size: int) -> Dict[Any, Dict[str, Any]]:
+            """Righe della finestra delle `size` modificate più di recente (senza
+            colonna di recenza: tutte) che soddisfano `condition`"""
+            window = table
+            if recency:
+                window = (f'(SELECT {columns} FROM {table} ORDER BY {recency} DESC, id DESC '
+                          f'LIMIT {size}) AS recent')
+            query = f'SELECT {columns} FROM {window} WHERE {condition}'
+            return {row['id']: dict(row) for row in conn.execute(query, params)}
+        
+        match = suggest.match_query(text)
+        if match:
+            # Titoli che contengono tutte le parole: i più recenti
+            # nell'indice più quelli modificati di recente
+            candidates = indexed(f'{fts} MATCH ?', [match], suggest.CANDIDATES)
+            if recency:
+                patterns = suggest.like_words(text)
+                condition = ' AND '.join(f"{title} LIKE ? ESCAPE '\\'" for _ in patterns)
+                candidates.update(recent(condition, patterns, suggest.RECENT_WINDOW))
+        else:
+            # Meno di 3 caratteri: il trigram non aiuta, si cerca il prefisso
+            # (del titolo o di una parola) tra gli appunti modificati di recente
+            candidates = recent(f"{title} LIKE ? ESCAPE '\\' OR {title} LIKE ? ESCAPE '\\'",
+                                list(suggest.like_prefix(text)), suggest.SHORT_PREFIX_WINDOW)
+        
+        exact = any(suggest.tier(text, row['title']) < suggest.TIER_FUZZY for row in candidates.values())
+        if not exact and len(text) >= suggest.FUZZY_MIN_LENGTH:
+            # Errori di battitura: le parole presenti nell'indice restringono i
+            # candidati, le altre vengono verificate da suggest.rank
+            words = [word for word in text.split(' ') if len(word) >= 3]
+            found = [word for word in words if conn.execute(
+                f'SELECT 1 FROM {fts} WHERE {fts} MATCH ? LIMIT 1', (suggest.phrase(word),)
+            ).fetchone()]
+            if found:
+                fuzzy = indexed(f'{fts} MATCH ?', [' '.join(map(suggest.phrase, found))],
+                                suggest.FUZZY_CANDIDATES)
+            elif words:
+                # Nessuna parola nell'indice: varianti della più lunga
+                word = max(words, key=len)
+                patterns = suggest.edit_patterns(word)
+                union = ' UNION '.join(
+                    f'SELECT * FROM (SELECT rowid FROM {fts} WHERE {title} LIKE ? '
+                    f'ORDER BY rowid DESC LIMIT {suggest.FUZZY_CANDIDATES})' for _ in patterns
+                )
+                fuzzy = indexed(f'rowid IN ({union})', patterns, suggest.FUZZY_CANDIDATES) if patterns else {}
+                if len(word) < suggest.FUZZY_SHORT_WORD:
+                    # Parola corta: parte delle varianti non usa l'indice
+                    fuzzy.update(indexed(f'{fts} MATCH ?', [suggest.trigram_query(word)],
+                                         suggest.FUZZY_CANDIDATES))
+                    fuzzy.update(recent('1', [], suggest.RECENT_WINDOW))
+            else:
+                fuzzy = {}
+            for row_id, row in fuzzy.items():
+                candidates.setdefault(row_id, row)
+        
+        return suggest.rank(text, list(candidates.values()), limit, recency=recency)
+    
+    def get_notes_by_ids(self, note_ids: List[str]) -> List[Dict[str, Any]]:
+        """Lookup per chiave primaria di più appunti, nell'ordine richiesto"""
+        note_ids = list(dict.fromkeys(note_ids))
+        if not note_ids:
+            return []
+        
+        with self.get_connection() as conn:
+            found = {}
+            for chunk in _chunks(note_ids):
+                placeholders = ','.join('?' * len(chunk))
+                cursor = conn.execute(
+                    f'SELECT * FROM notes WHERE id IN ({placeholders})', chunk
+                )
+                for row in cursor:
+                    found[row['id']] = dict(row)
             
-            for row in cursor.fetchall():
-                note = dict(row)
-                # Parse tags
-                if note['tag_names']:
-                    tag_names = note['tag_names'].split(',')
-                    tag_colors = note['tag_colors'].split(',')
-                    note['tags'] = [{'name': name, 'color': color} 
-                                  for name, color in zip(tag_names, tag_colors)]
-                else:
-                    note['tags'] = []
-                
-                del note['tag_names']
-                del note['tag_colors']
+            self._load_contents(conn, list(found.values()))
+            tags = self._load_tags(conn, list(found))
+        
+        notes = []
+        for note_id in note_ids:
+            note = found.get(note_id)
+            if note is not None:
+                note['tags'] = tags[note_id]
                 notes.append(note)
-            
-            return notes
+        return notes
+    
+    def note_exists(self, note_id: str) -> bool:
+        with self.get_connection() as conn:
+            return conn.execute('SELECT 1 FROM notes WHERE id = ?', (note_id,)).fetchone() is not None
     
     def get_note_by_id(self, note_id: str) -> Optional[Dict[str, Any]]:
-        notes = self.get_notes()
-        return next((n for n in notes if n['id'] == note_id), None)
+        with self.get_connection() as conn:
+            row = conn.execute('SELECT * FROM notes WHERE id = ?', (note_id,)).fetchone()
+            if row is None:
+                return None
+            note = dict(row)
+            self._load_contents(conn, [note])
+            note['tags'] = self._load_tags(conn, [note_id])[note_id]
+            return note
     
+    @serialized_write
     def create_note(self, title: str, content: str, note_type: str, 
-                   folder_id: str = None, tag_names: List[str] = None) -> Dict[str, Any]:
+                   folder_id: str = None, tag_names: List[str] = None,
+                   auto_create_tags: bool = False) -> Dict[str, Any]:
         note_id = str(uuid.uuid4())
+        tags_created = False
+        tag_ids = {}
         
         with self.get_connection() as conn:
             # Create note
+            content_id = store_content(conn, content)
             conn.execute('''
-                INSERT INTO notes (id, title, content, type, folder_id) 
+                INSERT INTO notes (id, title, content_id, type, folder_id) 
                 VALUES (?, ?, ?, ?, ?)
-            ''', (note_id, title, content, note_type, folder_id))
+            ''', (note_id, title, content_id, note_type, folder_id))
             
             # Add tags
             if tag_names:
-                for tag_name in tag_names:
-                    # Get tag ID
-                    cursor = conn.execute('SELECT id FROM tags WHERE name = ?', (tag_name,))
-                    tag_row = cursor.fetchone()
-                    if tag_row:
-                        conn.execute(
-                            'INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)',
-                            (note_id, tag_row['id'])
-                        )
+                _, tags_created = self._assign_tags(conn, note_id, tag_names, tag_ids,
+                                                    auto_create_tags)
             
-            # Create initial history entry for code notes
+            # Create initial history entry for code notes (stesso testo nel content store)
             if note_type == 'code':
-                conn.execute('''
-                    INSERT INTO note_history (note_id, version, content, changes)
-                    VALUES (?, 1, ?, 'Versione iniziale')
-                ''', (note_id, content))
+                self._append_history(conn, note_id, content, 'Versione iniziale')
             
             conn.commit()
+        self._remember_tag_ids(tag_ids)
+        self._invalidate('notes', 'folders', *(['tags'] if tags_created else []))
         
         return self.get_note_by_id(note_id)
     
+    @serialized_write
     def update_note(self, note_id: str, title: str = None, content: str = None, 
-                   tag_names: List[str] = None) -> Optional[Dict[str, Any]]:
+                   tag_names: List[str] = None, auto_create_tags: bool = False) -> Optional[Dict[str, Any]]:
+        tag_ids = {}
         with self.get_connection() as conn:
-            # Get current note for history
-            current = self.get_note_by_id(note_id)
-            if not current:
+            found, tags_created = self._update_note(conn, note_id, title, content, tag_names,
+                                                    tag_ids, auto_create_tags)
+            if not found:
                 return None
-            
-            # Update note
-            if title is not None:
-                conn.execute('UPDATE notes SET title = ?, updated_at = ? WHERE id = ?',
-                           (title, datetime.now().isoformat(), note_id))
-            
-            if content is not None:
-                conn.execute('UPDATE notes SET content = ?, updated_at = ? WHERE id = ?', 
-                           (content, datetime.now().isoformat(), note_id))
-                
-                # Add history entry for code notes if content changed
-                if current['type'] == 'code' and content != current['content']:
-                    # Get next version number
-                    cursor = conn.execute(
-                        'SELECT MAX(version) FROM note_history WHERE note_id = ?', 
-                        (note_id,)
-                    )
-                    max_version = cursor.fetchone()[0] or 0
-                    
-                    conn.execute('''
-                        INSERT INTO note_history (note_id, version, content, changes)
-                        VALUES (?, ?, ?, 'Modifica contenuto')
-                    ''', (note_id, max_version + 1, content))
-            
-            # Update tags
-            if tag_names is not None:
-                # Remove old tags
-                conn.execute('DELETE FROM note_tags WHERE note_id = ?', (note_id,))
-                
-                # Add new tags
-                for tag_name in tag_names:
-                    cursor = conn.execute('SELECT id FROM tags WHERE name = ?', (tag_name,))
-                    tag_row = cursor.fetchone()
-                    if tag_row:
-                        conn.execute(
-                            'INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)',
-                            (note_id, tag_row['id'])
-                        )
-            
             conn.commit()
+        self._remember_tag_ids(tag_ids)
+        self._invalidate('notes', 'folders', *(['tags'] if tags_created else []))
         
         return self.get_note_by_id(note_id)
     
+    def _update_note(self, conn, note_id: str, title: str = None, content: str = None,
+                     tag_names: List[str] = None, pending: Dict[str, int] = None,
+                     auto_create_tags: bool = False,
+                     history_window: float = None) -> Tuple[bool, bool]:
+        """Aggiorna un appunto nella transazione corrente: (trovato, tag creati).
+
+        `pending` raccoglie gli id dei tag della transazione (vedi _resolve_tag_ids).
+
+        Con `history_window` (secondi) una modifica del contenuto entro quella
+        finestra dall'ultima versione automatica la aggiorna invece di
+        aggiungerne una nuova.
+        """
+        # Get current note for history
+        current = conn.execute('SELECT type, content_id FROM notes WHERE id = ?', (note_id,)).fetchone()
+        if not current:
+            return False, False
+        
+        # Update note
+        if title is not None:
+            conn.execute('UPDATE notes SET title = ?, updated_at = ? WHERE id = ?',
+                       (title, datetime.now().isoformat(), note_id))
+        
+        if content is not None:
+            # Testi uguali hanno lo stesso id nel content store
+            content_id = store_content(conn, content)
+            conn.execute('UPDATE notes SET content_id = ?, updated_at = ? WHERE id = ?', 
+                       (content_id, datetime.now().isoformat(), note_id))
+            
+            # Add history entry for code notes if content changed
+            if current['type'] == 'code' and content_id != current['content_id']:
+                if history_window is None:
+                    self._append_history(conn, note_id, content, 'Modifica contenuto')
+                else:
+                    self._append_history(conn, note_id, content, AUTOSAVE_CHANGES,
+                                         amend_within=history_window)
+        
+        # Update tags (solo le differenze)
+        tags_created = False
+        if tag_names is not None:
+            _, tags_created = self._assign_tags(conn, note_id, tag_names,
+                                                {} if pending is None else pending,
+                                                auto_create_tags)
+        
+        return True, tags_created
+    
+    @serialized_write
+    def apply_autosaves(self, updates: Dict[str, Dict[str, Any]],
+                        history_window: float = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Applica gli aggiornamenti di più appunti in un'unica transazione (group commit).
+
+        `updates` associa l'id dell'appunto ai campi da aggiornare (title,
+        content, tag_names, auto_create_tags). Restituisce gli appunti
+        aggiornati, None per quelli inesistenti.
+        """
+        if history_window is None:
+            history_window = self.history_window
+        found = []
+        tags_created = False
+        tag_ids = {}
+        with self.get_connection() as conn:
+            for note_id, fields in updates.items():
+                ok, created = self._update_note(
+                    conn, note_id, fields.get('title'), fields.get('content'),
+                    fields.get('tag_names'), tag_ids, fields.get('auto_create_tags', False),
+                    history_window=history_window
+                )
+                if ok:
+                    found.append(note_id)
+                tags_created = tags_created or created
+            conn.commit()
+        self._remember_tag_ids(tag_ids)
+        if found:
+            self._invalidate('notes', 'folders', *(['tags'] if tags_created else []))
+        
+        notes = {note['id']: note for note in self.get_notes_by_ids(found)}
+        return {note_id: notes.get(note_id) for note_id in updates}
+    
+    @serialized_write
     def delete_note(self, note_id: str) -> bool:
         with self.get_connection() as conn:
             cursor = conn.execute('DELETE FROM notes WHERE id = ?', (note_id,))
             conn.commit()
-            return cursor.rowcount > 0
+        self._invalidate('notes', 'folders')
+        return cursor.rowcount > 0
+    
+    # BATCH OPERATIONS
+    @serialized_write
+    def batch_update_notes(self, op: str, note_ids: List[str] = None, filters: Dict[str, Any] = None,
+                           folder_id: str = None, tag_names: List[str] = None,
+                           auto_create_tags: bool = False) -> Dict[str, Any]:
+        """Applica un'operazione a un insieme di appunti con una sola istruzione SQL.
+
+        Gli appunti sono indicati da `note_ids` oppure da `filters` (stesse
+        chiavi di count_notes). Operazioni: 'move' nella cartella
+        `folder_id` (None = nessuna), 'tag'/'untag' con `tag_names`, 'delete'.
+        Restituisce gli appunti selezionati e le righe modificate.
+        """
+        if op not in BATCH_OPERATIONS:
+            raise ValueError(f'Unknown batch operation: {op}')
+        if (note_ids is None) == (filters is None):
+            raise ValueError('Specify either note ids or a filter')
+        
+        if note_ids is not None:
+            selection = 'SELECT value FROM json_each(?)'
+            selection_params = [json.dumps(note_ids)]
+        else:
+            # Un'operazione su insiemi non deve mai ricadere sull'intera tabella
+            if not _filter_has_condition(**filters):
+                raise ValueError('The filter has no condition: it would select every note')
+            condition, selection_params = self._note_filter(**filters)
+            selection = f'SELECT n.id FROM notes n WHERE {condition}'
+        
+        tags_created = False
+        pending = {}
+        with self.get_connection() as conn:
+            matched = conn.execute(
+                f'SELECT COUNT(*) FROM notes WHERE id IN ({selection})', selection_params
+            ).fetchone()[0]
+            
+            if op == 'move':
+                cursor = conn.execute(
+                    f'UPDATE notes SET folder_id = ?, updated_at = ? WHERE id IN ({selection})',
+                    [folder_id, datetime.now().isoformat()] + selection_params
+                )
+            elif op == 'delete':
+                cursor = conn.execute(f'DELETE FROM notes WHERE id IN ({selection})', selection_params)
+            else:
+                tag_ids, tags_created = self._resolve_tag_ids(conn, tag_names or [], pending,
+                                                              auto_create_tags)
+                tag_ids_json = json.dumps(list(tag_ids.values()))
+                if op == 'tag':
+                    cursor = conn.execute(f'''
+                        INSERT OR IGNORE INTO note_tags (note_id, tag_id)
+                        SELECT notes.id, t.value FROM notes, json_each(?) t
+                        WHERE notes.id IN ({selection})
+                    ''', [tag_ids_json] + selection_params)
+                else:
+                    cursor = conn.execute(f'''
+                        DELETE FROM note_tags
+                        WHERE tag_id IN (SELECT value FROM json_each(?))
+                          AND note_id IN ({selection})
+                    ''', [tag_ids_json] + selection_params)
+            
+            affected = cursor.rowcount
+            conn.commit()
+        self._remember_tag_ids(pending)
+        self._invalidate('notes', 'folders', *(['tags'] if tags_created else []))
+        
+        return {'op': op, 'matched': matched, 'affected': affected}
+    
+    # BULK IMPORT / EXPORT
+    @serialized_write
+    def import_notes(self, notes: Iterable[Dict[str, Any]], batch_size: int = 1000,
+                     auto_create_tags: bool = False) -> Dict[str, Any]:
+        """Importa molti appunti in un'unica transazione.
+
+        Ogni appunto ha le stesse chiavi di create_note (`type` al posto di
+        `note_type`) più, opzionalmente, `id`, `created_at` e `updated_at`
+        per reimportare un export. I tag sconosciuti vengono ignorati, o
+        creati con `auto_create_tags`.
+        """
+        started = time.perf_counter()
+        imported = 0
+        tags_created = False
+        tag_ids = {}
+        
+        with self.get_connection() as conn:
+            now = datetime.now().isoformat()
+            
+            batch = []
+            for note in notes:
+                batch.append(note)
+                if len(batch) >= batch_size:
+                    tags_created |= self._insert_note_batch(conn, batch, now, tag_ids,
+                                                               auto_create_tags)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                tags_created |= self._insert_note_batch(conn, batch, now, tag_ids,
+                                                        auto_create_tags)
+                imported += len(batch)
+            
+            conn.commit()
+        self._remember_tag_ids(tag_ids)
+        self._invalidate('notes', 'folders', *(['tags'] if tags_created else []))
+        
+        seconds = time.perf_counter() - started
+        return {
+            'imported': imported,
+            'seconds': round(seconds, 3),
+            'notes_per_sec': round(imported / seconds, 1) if seconds > 0 else None,
+        }
+    
+    def _insert_note_batch(self, conn, batch: List[Dict[str, Any]], now: str,
+                           pending: Dict[str, int], auto_create_tags: bool) -> bool:
+        tag_ids, tags_created = self._resolve_tag_ids(
+            conn, (name for note in batch for name in note.get('tag_names') or []), pending,
+            auto_create_tags
+        )
+        rows, links, versions = [], [], []
+        for note in batch:
+            note_id = note.get('id') or str(uuid.uuid4())
+            content_id = store_content(conn, note['content'])
+            rows.append((
+                note_id, note['title'], content_id, note['type'], note.get('folder_id'),
+                note.get('created_at') or now, note.get('updated_at') or now,
+            ))
+            for tag_name in dict.fromkeys(note.get('tag_names') or []):
+                if tag_name in tag_ids:
+                    links.append((note_id, tag_ids[tag_name]))
+            if note['type'] == 'code':
+                # La versione iniziale è uno snapshot: stesso testo dell'appunto
+                versions.append((note_id, 'Versione iniziale', history.STORAGE_STORED, content_id))
+        
+        conn.executemany('''
+            INSERT INTO notes (id, title, content_id, type, folder_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.executemany('INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)', links)
+        conn.executemany('''
+            INSERT INTO note_history (note_id, version, content, changes, storage, content_id)
+            VALUES (?, 1, '', ?, ?, ?)
+        ''', versions)
+        return tags_created
     
-    def get_note_history(self, note_id: str) -> List[Dict[str, Any]]:
+    def export_notes(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Tutti gli appunti, a blocchi: la memoria usata non dipende dal numero di appunti"""
+        last_rowid = 0
+        while True:
+            with self.get_connection() as conn:
+                rows = conn.execute('''
+                    SELECT rowid, id, title, content_id, type, folder_id, created_at, updated_at
+                    FROM notes WHERE rowid > ? ORDER BY rowid LIMIT ?
+                ''', (last_rowid, batch_size)).fetchall()
+                if not rows:
+                    return
+                notes = [dict(row) for row in rows]
+                self._load_contents(conn, notes)
+                tags = self._load_tags(conn, [row['id'] for row in rows])
+            
+            for note in notes:
+                del note['rowid']
+                note['tag_names'] = [tag['name'] for tag in tags[note['id']]]
+                yield note
+            last_rowid = rows[-1]['rowid']
+    
+    # HISTORY
+    def _append_history(self, conn, note_id: str, content: str, changes: str,
+                        amend_within: float = None):
+        """Aggiunge una versione: snapshot nel content store o delta dalla versione precedente.
+
+        Con `amend_within` (secondi), se l'ultima versione ha la stessa
+        descrizione ed è più recente, viene sovrascritta: durante l'editing
+        lo storico conserva al più una versione per intervallo.
+        """
+        if amend_within is not None:
+            latest = conn.execute('''
+                SELECT id, version FROM note_history
+                WHERE note_id = ? AND version = (
+                    SELECT MAX(version) FROM note_history WHERE note_id = ?
+                ) AND changes = ? AND version > 1
+                  AND timestamp > datetime('now', ?)
+            ''', (note_id, note_id, changes, f'-{amend_within} seconds')).fetchone()
+            if latest:
+                version = latest['version']
+                previous = None
+                if not history.is_snapshot_version(version):
+                    previous = self._load_history(conn, note_id, version - 1, version - 1)[0]['content']
+                storage, data, content_id = self._encode_version(conn, version, content, previous)
+                conn.execute(
+                    'UPDATE note_history SET storage = ?, data = ?, content_id = ? WHERE id = ?',
+                    (storage, data, content_id, latest['id'])
+                )
+                return
+        
+        cursor = conn.execute(
+            'SELECT MAX(version) FROM note_history WHERE note_id = ?', 
+            (note_id,)
+        )
+        max_version = cursor.fetchone()[0] or 0
+        version = max_version + 1
+        
+        previous = None
+        if max_version and not history.is_snapshot_version(version):
+            previous = self._load_history(conn, note_id, max_version, max_version)[0]['content']
+        
+        storage, data, content_id = self._encode_version(conn, version, content, previous)
+        conn.execute('''
+            INSERT INTO note_history (note_id, version, content, changes, storage, data, content_id)
+            VALUES (?, ?, '', ?, ?, ?, ?)
+        ''', (note_id, version, changes, storage, data, content_id))
+    
+    def _encode_version(self, conn, version: int, content: str,
+                        previous: Optional[str]) -> Tuple[str, Optional[bytes], Optional[int]]:
+        """(storage, data, content_id) di una versione: gli snapshot vanno nel
+        content store, deduplicati con il testo degli appunti"""
+        if previous is None or history.is_snapshot_version(version):
+            return history.STORAGE_STORED, None, store_content(conn, content)
+        storage, data = history.encode_version(version, content, previous)
+        return storage, data, None
+    
+    def _load_history(self, conn, note_id: str, first_version: int,
+                      last_version: int) -> List[Dict[str, Any]]:
+        """Versioni first..last ricostruite a partire dallo snapshot precedente"""
+        cursor = conn.execute('''
+            SELECT COALESCE(MAX(version), 1) FROM note_history
+            WHERE note_id = ? AND version <= ? AND storage != ?
+        ''', (note_id, first_version, history.STORAGE_DELTA))
+        start = cursor.fetchone()[0]
+        
+        rows = conn.execute('''
+            SELECT h.id, h.version, h.content, h.changes, h.timestamp, h.storage,
+                   COALESCE(c.data, h.data) AS data, c.codec
+            FROM note_history h
+            LEFT JOIN note_contents c ON c.id = h.content_id
+            WHERE h.note_id = ? AND h.version BETWEEN ? AND ?
+            ORDER BY h.version
+        ''', (note_id, start, last_version)).fetchall()
+        
+        entries = []
+        for row, content in zip(rows, history.reconstruct(rows)):
+            if row['version'] >= first_version:
+                entries.append({
+                    'id': row['id'],
+                    'version': row['version'],
+                    'content': content,
+                    'changes': row['changes'],
+                    'timestamp': row['timestamp'],
+                })
+        return entries
+    
+    def get_note_history(self, note_id: str, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Versioni di un appunto in ordine crescente, opzionalmente paginate"""
         with self.get_connection() as conn:
             cursor = conn.execute('''
-                SELECT * FROM note_history 
-                WHERE note_id = ? 
-                ORDER BY version
-            ''', (note_id,))
-            return [dict(row) for row in cursor.fetchall()]
+                SELECT MIN(version), MAX(version) FROM (
+                    SELECT version FROM note_history
+                    WHERE note_id = ?
+                    ORDER BY version
+                    LIMIT ? OFFSET ?
+                )
+            ''', (note_id, -1 if limit is None else limit, offset))
+            first_version, last_version = cursor.fetchone()
+            if first_version is None:
+                return []
+            return self._load_history(conn, note_id, first_version, last_version)
+    
+    def count_note_history(self, note_id: str) -> int:
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                'SELECT value FROM note_counters WHERE scope = ? AND key = ?',
+                (counters.SCOPE_VERSIONS, note_id)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else 0
+    
+    def get_note_version(self, note_id: str, version: int) -> Optional[Dict[str, Any]]:
+        with self.get_connection() as conn:
+            entries = self._load_history(conn, note_id, version, version)
+            return entries[0] if entries else None
+    
+    def diff_note_versions(self, note_id: str, from_version: int, to_version: int) -> Optional[str]:
+        """Diff unificato tra due versioni, o None se una delle due non esiste"""
+        with self.get_connection() as conn:
+            old = self._load_history(conn, note_id, from_version, from_version)
+            new = self._load_history(conn, note_id, to_version, to_version)
+            if not old or not new:
+                return None
+            return history.unified_diff(old[0]['content'], new[0]['content'],
+                                        from_version, to_version)
 
-# Global database instance
-db = NotesDatabase()
\ No newline at end of file
+    # CHANGE FEED
+    def get_changes(self, since: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """Voci del change log successive a `since`, in ordine di sequenza"""
+        # Risveglia anche i client in attesa delle scritture di altri worker
+        self._sync_changes()
+        with self.get_connection() as conn:
+            cursor = conn.execute('''
+                SELECT seq, entity, op, entity_id AS id, changed_at
+                FROM change_log
+                WHERE seq > ?
+                ORDER BY seq
+                LIMIT ?
+            ''', (since, limit))
+            return [dict(row) for row in cursor]
+    
+    def latest_change_seq(self) -> int:
+        """Numero di sequenza dell'ultima modifica registrata"""
+        with self.get_connection() as conn:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+    
+    @serialized_write
+    def prune_change_log(self, max_age_days: float = None) -> int:
+        """Elimina le voci del change log più vecchie di `max_age_days`.
+
+        I client con un token di sincronizzazione anteriore dovranno
+        ripartire da una sincronizzazione completa.
+        """
+        if max_age_days is None:
+            max_age_days = self.change_retention_days
+        with self.get_connection() as conn:
+            # seq e changed_at crescono insieme: basta trovare la prima voce da tenere
+            row = conn.execute('''
+                SELECT seq FROM change_log
+                WHERE changed_at >= datetime('now', ?)
+                ORDER BY seq LIMIT 1
+            ''', (f'-{max_age_days} days',)).fetchone()
+            keep_from = row[0] if row else self.latest_change_seq() + 1
+            deleted = conn.execute('DELETE FROM change_log WHERE seq < ?', (keep_from,)).rowcount
+            if deleted:
+                conn.execute('''
+                    INSERT INTO sync_horizon (id, seq) VALUES (1, ?)
+                    ON CONFLICT (id) DO UPDATE SET seq = MAX(seq, excluded.seq)
+                ''', (keep_from - 1,))
+            conn.commit()
+        return deleted
+    
+    # SYNC
+    def sync(self, token: str = None, limit: int = 1000) -> Dict[str, Any]:
+        """Entità create, modificate o eliminate dopo `token`.
+
+        Senza token restituisce tutti i dati (sincronizzazione completa).
+        Altrimenti legge al più `limit` voci del change log, raggruppate per
+        entità: quelle che esistono ancora vengono restituite per intero,
+        le altre come id eliminati. Con `has_more` il client deve ripetere
+        la chiamata con il nuovo token.
+        """
+        if token is None:
+            seq = self.latest_change_seq()
+            return {
+                'token': encode_sync_token(seq),
+                'full': True,
+                'has_more': False,
+                'notes': self.get_notes(),
+                'folders': self.get_folders(),
+                'tags': self.get_tags(),
+                'deleted': {'notes': [], 'folders': [], 'tags': []},
+            }
+        
+        since = decode_sync_token(token)
+        with self.get_connection() as conn:
+            horizon = conn.execute('SELECT seq FROM sync_horizon WHERE id = 1').fetchone()
+            if horizon and since < horizon[0]:
+                raise SyncTokenExpired(f'Sync token {token} is older than the change log')
+            
+            rows = conn.execute('''
+                SELECT seq, entity, entity_id FROM change_log
+                WHERE seq > ? ORDER BY seq LIMIT ?
+            ''', (since, limit)).fetchall()
+        
+        changed = {'note': set(), 'folder': set(), 'tag': set()}
+        for row in rows:
+            changed[row['entity']].add(row['entity_id'])
+        
+        notes = self.get_notes_by_ids(list(changed['note'])) if changed['note'] else []
+        folders = ([f for f in self.get_folders() if f['id'] in changed['folder']]
+                   if changed['folder'] else [])
+        tags = [t for t in self.get_tags() if str(t['id']) in changed['tag']] if changed['tag'] else []
+        
+        return {
+            'token': encode_sync_token(rows[-1]['seq'] if rows else since),
+            'full': False,
+            'has_more': len(rows) == limit,
+            'notes': notes,
+            'folders': folders,
+            'tags': tags,
+            'deleted': {
+                'notes': sorted(changed['note'] - {n['id'] for n in notes}),
+                'folders': sorted(changed['folder'] - {f['id'] for f in folders}),
+                'tags': sorted(int(t) for t in changed['tag'] - {str(t['id']) for t in tags}),
+            },
+        }
@@ -0,0 +1,97 @@
+import difflib
+import json
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+from content_store import decode_content
+
+# Ogni quante versioni salvare uno snapshot completo: ricostruire una
+# versione richiede al massimo SNAPSHOT_INTERVAL - 1 delta da applicare.
+SNAPSHOT_INTERVAL = 20
+
+# Valori della colonna note_history.storage
+STORAGE_TEXT = 'text'          # contenuto in chiaro in `content` (righe legacy)
+STORAGE_SNAPSHOT = 'snapshot'  # contenuto completo compresso in `data` (prima del content store)
+STORAGE_STORED = 'stored'      # contenuto completo nel content store (`content_id`)
+STORAGE_DELTA = 'delta'        # differenze per righe dalla versione precedente in `data`
+
+
+def is_snapshot_version(version: int) -> bool:
+    return (version - 1) % SNAPSHOT_INTERVAL == 0
+
+
+def encode_snapshot(content: str) -> bytes:
+    return zlib.compress(content.encode('utf-8'))
+
+
+def make_delta(old: str, new: str) -> bytes:
+    """Delta per righe da `old` a `new`, compresso.
+
+    Le righe invariate sono riferimenti `[inizio, fine]` alle righe di
+    `old`, le righe nuove sono salvate per esteso.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(''.join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode('utf-8'))
+
+
+def apply_delta(old: str, delta: bytes) -> str:
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(delta)):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(old_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def encode_version(version: int, content: str, previous: Optional[str]) -> Tuple[str, bytes]:
+    """Sceglie la rappresentazione di una nuova versione: (storage, data)"""
+    if previous is None or is_snapshot_version(version):
+        return STORAGE_SNAPSHOT, encode_snapshot(content)
+    return STORAGE_DELTA, make_delta(previous, content)
+
+
+def decode_version(storage: str, content: str, data: Optional[bytes],
+                   previous: Optional[str], codec: Optional[str] = None) -> str:
+    """Contenuto di una versione; per STORAGE_STORED `data` e `codec` vengono dal content store"""
+    if storage == STORAGE_TEXT:
+        return content
+    if storage == STORAGE_STORED:
+        return decode_content(codec, data)
+    if storage == STORAGE_SNAPSHOT:
+        return zlib.decompress(data).decode('utf-8')
+    if previous is None:
+        raise ValueError('Delta version without a preceding version')
+    return apply_delta(previous, data)
+
+
+def reconstruct(rows: Iterable) -> List[str]:
+    """Contenuto di ogni riga, date le righe in ordine di versione a partire da uno snapshot.
+
+    Le righe hanno le colonne storage, content, data e codec.
+    """
+    contents = []
+    previous = None
+    for row in rows:
+        previous = decode_version(row['storage'], row['content'], row['data'], previous,
+                                  row['codec'])
+        contents.append(previous)
+    return contents
+
+
+def unified_diff(old: str, new: str, from_version: int, to_version: int) -> str:
+    return ''.join(difflib.unified_diff(
+        old.splitlines(keepends=True),
+        new.splitlines(keepends=True),
+        fromfile=f'v{from_version}',
+        tofile=f'v{to_version}',
+    ))
@@ -0,0 +1,86 @@
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Compressione delle risposte: brotli se il pacchetto opzionale
+# `brotli-asgi` è installato (ricade su gzip per i client che non lo
+# supportano), altrimenti solo gzip.
+try:
+    from brotli_asgi import BrotliMiddleware as _Compressor
+    _COMPRESSOR_OPTIONS = {}
+except ImportError:
+    from starlette.middleware.gzip import GZipMiddleware as _Compressor
+    # Il livello 9 di Starlette costa quasi 3 volte il 6 (il default di zlib)
+    # per un 3% di byte in meno sulle liste di appunti
+    _COMPRESSOR_OPTIONS = {'compresslevel': 6}
+
+# Sotto questa dimensione comprimere costa più di quanto fa risparmiare
+COMPRESSION_MIN_SIZE = 1024
+
+
+class CompressionMiddleware:
+    """Comprime le risposte, tranne gli stream Server-Sent Events.
+
+    Il compressore accumula i dati nel proprio buffer: gli eventi di uno
+    stream SSE arriverebbero al client in ritardo, quindi le richieste con
+    `Accept: text/event-stream` passano direttamente all'applicazione.
+    """
+
+    def __init__(self, app, **options):
+        self.app = app
+        self.compressor = _Compressor(app, **{**_COMPRESSOR_OPTIONS, **options})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            accept = dict(scope['headers']).get(b'accept', b'')
+            if b'text/event-stream' in accept:
+                await self.app(scope, receive, send)
+                return
+        await self.compressor(scope, receive, send)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    # Confronto debole: W/"x" e "x" sono equivalenti
+    candidates = [value.strip().removeprefix('W/') for value in header.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+def _not_modified_since(header: str, modified_at: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # Le date HTTP hanno la precisione del secondo
+    return int(modified_at) <= since
+
+
+def conditional(request: Request, response: Response, version: str,
+                modified_at: float) -> Optional[Response]:
+    """Imposta ETag/Last-Modified e restituisce un 304 se il client è aggiornato.
+
+    Se il risultato non è None va restituito direttamente dall'endpoint,
+    senza interrogare il database né serializzare nulla. If-None-Match ha
+    la precedenza: If-Modified-Since ha la granularità del secondo.
+    """
+    etag = f'W/"{version}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': formatdate(modified_at, usegmt=True),
+        'Cache-Control': 'no-cache',
+    }
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get('if-modified-since')
+        fresh = if_modified_since is not None and _not_modified_since(if_modified_since, modified_at)
+
+    if fresh:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
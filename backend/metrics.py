@@ -0,0 +1,421 @@
+import bisect
+import logging
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Limiti superiori dei bucket degli istogrammi
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+# Query più lente di così vengono registrate nel log con il piano di esecuzione
+SLOW_QUERY_MS = 100.0
+
+# Serie (testi SQL distinti) delle metriche per query: le query generate da
+# `q=` possono essere infinite, oltre il limite finiscono in OTHER_QUERY
+MAX_QUERY_SERIES = 500
+OTHER_QUERY = 'other'
+
+# Content-Type del formato testuale di Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """Contatore monotono con etichette"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram:
+    """Istogramma cumulativo alla Prometheus (bucket, _sum, _count)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, lock: threading.Lock = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etichette -> [conteggi per bucket (non cumulativi, +Inf in fondo), somma]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        # Più istogrammi aggiornati insieme possono condividere il lock
+        self._lock = lock or threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            self._observe(value, labels)
+
+    def _observe(self, value: float, labels: Tuple[str, ...]):
+        # Da chiamare con self._lock acquisito
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        names = self.labelnames + ('le',)
+        for labels, counts, total in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+def render(metrics: Iterable) -> str:
+    """Formato testuale di Prometheus (exposition format 0.0.4)"""
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+class StatsMetric:
+    """Un valore di un dizionario di statistiche (es. `pool.stats()`) come metrica"""
+
+    def __init__(self, name: str, help: str, value: float, kind: str = 'gauge'):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.value = value
+
+    def samples(self) -> Iterable[str]:
+        yield f'{self.name} {_number(float(self.value))}'
+
+
+def stats_metrics(prefix: str, stats: Dict[str, Any], counters: Iterable[str] = ()) -> List[StatsMetric]:
+    """Converte un dizionario di statistiche in metriche `<prefix>_<chiave>`.
+
+    Le chiavi in `counters` sono cumulative e prendono il suffisso `_total`.
+    """
+    counters = set(counters)
+    return [
+        StatsMetric(f'{prefix}_{key}_total', key.replace('_', ' '), value, 'counter')
+        if key in counters else
+        StatsMetric(f'{prefix}_{key}', key.replace('_', ' '), value)
+        for key, value in stats.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+
+
+# HTTP
+
+class HttpMetrics:
+    """Latenza, esito e dimensione delle richieste HTTP per route"""
+
+    def __init__(self):
+        self.requests = Counter(
+            'notes_http_requests_total', 'HTTP requests by route and status',
+            ('method', 'route', 'status'),
+        )
+        self.latency = Histogram(
+            'notes_http_request_duration_seconds', 'HTTP request latency',
+            ('method', 'route'),
+        )
+        self.request_size = Histogram(
+            'notes_http_request_size_bytes', 'HTTP request body size',
+            ('method', 'route'), SIZE_BUCKETS,
+        )
+        self.response_size = Histogram(
+            'notes_http_response_size_bytes', 'HTTP response body size (as sent)',
+            ('method', 'route'), SIZE_BUCKETS,
+        )
+
+    def record(self, method: str, route: str, status: int, elapsed: float,
+               request_bytes: int, response_bytes: int):
+        self.requests.inc(method, route, str(status))
+        self.latency.observe(elapsed, method, route)
+        self.request_size.observe(request_bytes, method, route)
+        self.response_size.observe(response_bytes, method, route)
+
+    def metrics(self) -> list:
+        return [self.requests, self.latency, self.request_size, self.response_size]
+
+
+class MetricsMiddleware:
+    """Misura ogni richiesta HTTP e la registra in `HttpMetrics`.
+
+    La route è il modello del percorso (es. `/api/notes/{note_id}`), non
+    l'URL: il numero di serie resta limitato. Va aggiunto per ultimo
+    (middleware più esterno), così misura anche CORS e compressione e conta
+    i byte effettivamente inviati.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+
+        async def receive_counted():
+            nonlocal request_bytes
+            message = await receive()
+            if message['type'] == 'http.request':
+                request_bytes += len(message.get('body', b''))
+            return message
+
+        async def send_counted(message):
+            nonlocal status, response_bytes
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                response_bytes += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            # Il router aggiunge la route allo scope durante la richiesta
+            route = scope.get('route')
+            path = getattr(route, 'path', None)
+            if path is None:
+                path = 'static' if scope.get('endpoint') is not None else 'unmatched'
+            self.metrics.record(scope['method'], path, status, time.perf_counter() - started,
+                                request_bytes, response_bytes)
+
+
+# Query SQLite
+
+_PLACEHOLDER_LIST = re.compile(r'\?(\s*,\s*\?)+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Forma compatta di una query da usare come etichetta.
+
+    Gli spazi vengono compattati e le liste di segnaposto (`IN (?, ?, ...)`)
+    ridotte a una sola forma, così i chunk di dimensioni diverse finiscono
+    nella stessa serie.
+    """
+    sql = ' '.join(sql.split())
+    sql = _PLACEHOLDER_LIST.sub('?, ...', sql)
+    return sql if len(sql) <= 200 else sql[:197] + '...'
+
+
+_NO_PLAN = ('PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE',
+            'CREATE', 'DROP', 'ALTER', 'EXPLAIN', 'VACUUM', 'ANALYZE')
+
+
+class QueryMetrics:
+    """Durata e righe delle query eseguite sulle connessioni instrumentate.
+
+    La durata comprende l'esecuzione e la lettura dei risultati. Le query
+    più lente di `slow_query_ms` vengono scritte nel log con SQL e piano
+    di esecuzione (`EXPLAIN QUERY PLAN`). L'etichetta è il testo SQL
+    normalizzato, per al più `max_series` query distinte: le successive
+    vengono contate insieme come OTHER_QUERY, così la memoria resta
+    limitata anche con query costruite dai client.
+    """
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, max_series: int = MAX_QUERY_SERIES):
+        self.slow_query_ms = slow_query_ms
+        self.max_series = max_series
+        # Un solo lock per durata e righe: record() è nel percorso di ogni query
+        self._lock = threading.Lock()
+        self.latency = Histogram(
+            'notes_db_query_duration_seconds', 'SQLite statement time (execute and fetch)',
+            ('query',), lock=self._lock,
+        )
+        self.rows = Histogram(
+            'notes_db_query_rows', 'Rows returned or changed by a statement',
+            ('query',), ROW_BUCKETS, lock=self._lock,
+        )
+        self.slow = Counter(
+            'notes_db_slow_queries_total', 'Statements slower than the slow query threshold',
+            ('query',),
+        )
+
+    def record(self, conn: sqlite3.Connection, sql: str, params, elapsed: float, rows: int):
+        query = normalize_sql(sql)
+        labels = (query,)
+        with self._lock:
+            if labels not in self.latency._values and len(self.latency._values) >= self.max_series:
+                labels = (OTHER_QUERY,)
+            self.latency._observe(elapsed, labels)
+            if rows >= 0:
+                self.rows._observe(rows, labels)
+        if self.slow_query_ms is not None and elapsed * 1000 >= self.slow_query_ms:
+            self.slow.inc(*labels)
+            logger.warning('Slow query (%.1f ms, %d rows): %s\n%s',
+                           elapsed * 1000, rows, query, self._plan(conn, sql, params))
+
+    def _plan(self, conn: sqlite3.Connection, sql: str, params) -> str:
+        if params is None or sql.lstrip().upper().startswith(_NO_PLAN):
+            return '(no plan)'
+        try:
+            # Connection.execute di base: l'EXPLAIN non viene misurato a sua volta
+            rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        except sqlite3.Error as e:
+            return f'(plan unavailable: {e})'
+        return '\n'.join(f'  {row[3]}' for row in rows)
+
+    def metrics(self) -> list:
+        return [self.latency, self.rows, self.slow]
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursore che misura ogni statement fino alla lettura dei risultati.
+
+    La durata va dalla `execute()` alla fine della lettura: risultati
+    esauriti, `fetchall()`, primo `fetchone()` (lettura di una riga),
+    chiusura del cursore o `execute()` successiva. Si misura solo all'inizio
+    e alla fine, non per ogni riga.
+    """
+
+    _sql = None
+
+    def _finish(self):
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        self.connection.query_metrics.record(self.connection, sql, self._params,
+                                             time.perf_counter() - self._started, self._rows)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._sql, self._params, self._started, self._rows = sql, parameters, started, 0
+        if self.description is None:
+            # Nessun risultato da leggere (INSERT, UPDATE, DDL...)
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        # Senza parametri non si ricava il piano
+        self._sql, self._params, self._started = sql, None, started
+        self._rows = max(self.rowcount, 0)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = super().fetchone()
+        if self._sql is not None:
+            self._rows += row is not None
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if self._sql is not None:
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __iter__(self):
+        # Il generatore conta le righe; la lettura resta il fetchone in C
+        # di sqlite3.Cursor
+        count = 0
+        try:
+            for row in iter(sqlite3.Cursor.fetchone.__get__(self), None):
+                count += 1
+                yield row
+        finally:
+            if self._sql is not None:
+                self._rows += count
+                self._finish()
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Risultati letti solo in parte
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connessione SQLite le cui query vengono registrate in `query_metrics`.
+
+    Va creata con `sqlite3.connect(..., factory=InstrumentedConnection)` e
+    poi assegnando `query_metrics`. Misura anche i commit, dove in WAL si
+    paga la scrittura su disco.
+    """
+
+    query_metrics: Optional[QueryMetrics] = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return sqlite3.Connection.cursor(self, InstrumentedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return sqlite3.Connection.cursor(self, InstrumentedCursor).executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        super().commit()
+        self.query_metrics.record(self, 'COMMIT', (), time.perf_counter() - started, -1)
@@ -0,0 +1,241 @@
+import logging
+from typing import Callable, List, Tuple, Union
+
+import zlib
+
+import history
+from search import FTS_SCHEMA
+from changes import CHANGE_LOG_SCHEMA
+from content_store import CONTENT_STORE_SCHEMA, store_content
+from suggest import SUGGEST_SCHEMA
+from counters import COUNTERS_SCHEMA, rebuild_counters
+
+logger = logging.getLogger(__name__)
+
+# Ogni migrazione è (versione, descrizione, passi): i passi sono istruzioni
+# SQL oppure funzioni che ricevono la connessione. Le versioni sono
+# applicate in ordine, una sola volta, ciascuna nella propria transazione.
+Step = Union[str, Callable]
+
+
+def _backfill_search_index(conn):
+    conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+
+
+def _backfill_suggest_index(conn):
+    conn.execute("INSERT INTO notes_title_fts (notes_title_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO tags_name_fts (tags_name_fts) VALUES ('rebuild')")
+
+
+def _compact_history(conn):
+    """Riscrive lo storico esistente come snapshot compressi + delta"""
+    note_ids = [row[0] for row in conn.execute('SELECT DISTINCT note_id FROM note_history')]
+    for note_id in note_ids:
+        rows = conn.execute('''
+            SELECT id, version, content FROM note_history
+            WHERE note_id = ? ORDER BY version
+        ''', (note_id,)).fetchall()
+        previous = None
+        for row in rows:
+            storage, data = history.encode_version(row['version'], row['content'], previous)
+            conn.execute(
+                "UPDATE note_history SET storage = ?, data = ?, content = '' WHERE id = ?",
+                (storage, data, row['id'])
+            )
+            previous = row['content']
+
+
+def _move_content_to_store(conn, batch_size: int = 1000):
+    """Sposta il testo degli appunti e gli snapshot dello storico nel content store"""
+    # Spostare il testo non è una modifica da sincronizzare: niente change log
+    conn.execute('DROP TRIGGER IF EXISTS notes_log_update')
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            'SELECT rowid, content FROM notes WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (last_rowid, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            'UPDATE notes SET content_id = ? WHERE rowid = ?',
+            [(store_content(conn, row['content']), row['rowid']) for row in rows]
+        )
+        last_rowid = rows[-1]['rowid']
+    conn.execute(next(step for step in CHANGE_LOG_SCHEMA if 'notes_log_update' in step))
+    
+    rows = conn.execute(
+        'SELECT id, data FROM note_history WHERE storage = ?', (history.STORAGE_SNAPSHOT,)
+    ).fetchall()
+    for row in rows:
+        content_id = store_content(conn, zlib.decompress(row['data']).decode('utf-8'))
+        conn.execute(
+            'UPDATE note_history SET storage = ?, data = NULL, content_id = ? WHERE id = ?',
+            (history.STORAGE_STORED, content_id, row['id'])
+        )
+
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'initial schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS folders (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            color TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notes (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('text', 'code', 'list')),
+            folder_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (folder_id) REFERENCES folders (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id TEXT,
+            tag_id INTEGER,
+            PRIMARY KEY (note_id, tag_id),
+            FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
+            FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS note_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            changes TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE
+        )
+        ''',
+    ]),
+    (2, 'full-text search index', FTS_SCHEMA + [_backfill_search_index]),
+    (3, 'secondary indexes', [
+        # Ordinamento di default e paginazione keyset
+        'CREATE INDEX IF NOT EXISTS idx_notes_updated ON notes (updated_at DESC, id DESC)',
+        # Filtro per cartella (già ordinato) e conteggi per cartella
+        'CREATE INDEX IF NOT EXISTS idx_notes_folder_updated '
+        'ON notes (folder_id, updated_at DESC, id DESC)',
+        # Filtro per tag: note_tags ha già (note_id, tag_id) come chiave primaria
+        'CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags (tag_id, note_id)',
+        # MAX(version) e storico ordinato per appunto
+        'CREATE INDEX IF NOT EXISTS idx_note_history_note_version '
+        'ON note_history (note_id, version)',
+    ]),
+    (4, 'delta-compressed note history', [
+        "ALTER TABLE note_history ADD COLUMN storage TEXT NOT NULL DEFAULT 'text'",
+        'ALTER TABLE note_history ADD COLUMN data BLOB',
+        _compact_history,
+    ]),
+    (5, 'change log', CHANGE_LOG_SCHEMA),
+    (6, 'sync horizon', [
+        # Ultimo seq eliminato dal change log: i token precedenti sono scaduti
+        '''
+        CREATE TABLE IF NOT EXISTS sync_horizon (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+        ''',
+    ]),
+    (7, 'database identity', [
+        # Identificativo casuale del database, parte degli ETag: cambia se il
+        # file viene sostituito, è uguale per tutti i worker
+        '''
+        CREATE TABLE IF NOT EXISTS database_info (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            uid TEXT NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO database_info (id, uid) VALUES (1, lower(hex(randomblob(4))))",
+    ]),
+    (8, 'sort indexes', [
+        # Ordinamenti del linguaggio di query (sort:created, sort:title) e
+        # relativa paginazione keyset; percorribili in entrambe le direzioni
+        'CREATE INDEX IF NOT EXISTS idx_notes_created ON notes (created_at DESC, id DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_notes_title ON notes (title, id)',
+    ]),
+    (9, 'out-of-row content store', [
+        # Il testo lascia `notes`: l'indice full-text va ricreato sulla vista
+        # notes_text, i suoi trigger sostituiti
+        'DROP TRIGGER IF EXISTS notes_fts_insert',
+        'DROP TRIGGER IF EXISTS notes_fts_delete',
+        'DROP TRIGGER IF EXISTS notes_fts_update',
+        'DROP TABLE IF EXISTS notes_fts',
+        CONTENT_STORE_SCHEMA[0],
+        'ALTER TABLE notes ADD COLUMN content_id INTEGER REFERENCES note_contents (id)',
+        'ALTER TABLE note_history ADD COLUMN content_id INTEGER REFERENCES note_contents (id)',
+        _move_content_to_store,
+        'ALTER TABLE notes DROP COLUMN content',
+        # Controlli "testo ancora referenziato?" dei trigger
+        'CREATE INDEX IF NOT EXISTS idx_notes_content ON notes (content_id)',
+        'CREATE INDEX IF NOT EXISTS idx_note_history_content ON note_history (content_id) '
+        'WHERE content_id IS NOT NULL',
+        *CONTENT_STORE_SCHEMA[1:],
+        _backfill_search_index,
+    ]),
+    (10, 'trigram suggest index', SUGGEST_SCHEMA + [_backfill_suggest_index]),
+    (11, 'materialized counters', COUNTERS_SCHEMA + [rebuild_counters]),
+]
+
+
+def current_version(conn) -> int:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn) -> List[int]:
+    """Applica le migrazioni mancanti; restituisce le versioni applicate"""
+    if conn.in_transaction:
+        conn.commit()
+
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+
+        # BEGIN IMMEDIATE: se più processi partono insieme, uno solo migra
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                (version, name)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        logger.info(f"Applied schema migration {version}: {name}")
+        applied.append(version)
+
+    return applied
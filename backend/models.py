@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, field_serializer, model_validator
+from typing import Dict, List, Optional
+from datetime import datetime, timezone
 
 class FolderBase(BaseModel):
     name: str
@@ -34,6 +34,12 @@ class NoteHistoryEntry(BaseModel):
     changes: str
     timestamp: datetime
 
+class NoteDiff(BaseModel):
+    note_id: str
+    from_version: int
+    to_version: int
+    diff: str
+
 class NoteBase(BaseModel):
     title: str
     content: str
@@ -43,6 +49,58 @@ class NoteBase(BaseModel):
 class NoteCreate(NoteBase):
     tag_names: List[str] = []
 
+class NoteImport(NoteCreate):
+    """Riga di un import NDJSON: come NoteCreate, con id e date opzionali"""
+    id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    @field_serializer("created_at", "updated_at")
+    def store_timestamp(self, value: Optional[datetime]) -> Optional[str]:
+        """Data nel formato salvato da NotesDatabase (ISO, senza fuso: UTC)"""
+        if value is None:
+            return None
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+
+class BulkImportResult(BaseModel):
+    imported: int
+    seconds: float
+    notes_per_sec: Optional[float] = None
+
+class NoteFilter(BaseModel):
+    folder_id: Optional[str] = None
+    search: Optional[str] = None
+    tag: Optional[str] = None
+    q: Optional[str] = None
+
+class NoteBatchOperation(BaseModel):
+    """Operazione su più appunti, indicati per id oppure con un filtro"""
+    op: str = Field(..., pattern="^(move|tag|untag|delete)$")
+    ids: Optional[List[str]] = None
+    filter: Optional[NoteFilter] = None
+    folder_id: Optional[str] = None
+    tag_names: List[str] = []
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Specify exactly one of 'ids' or 'filter'")
+        # Un filtro vuoto selezionerebbe tutti gli appunti
+        if self.filter is not None and not any(
+            (value or '').strip() for value in self.filter.model_dump().values()
+        ):
+            raise ValueError("'filter' needs at least one condition")
+        if self.op in ("tag", "untag") and not self.tag_names:
+            raise ValueError("'tag_names' is required for tag/untag")
+        return self
+
+class NoteBatchResult(BaseModel):
+    op: str
+    matched: int
+    affected: int
+
 class NoteUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
@@ -54,5 +112,103 @@ class Note(NoteBase):
     updated_at: datetime
     tags: List[NoteTag] = []
 
+class NoteListItem(BaseModel):
+    """Appunto in una lista: `content` o `preview` sono presenti secondo la proiezione"""
+    id: str
+    title: str
+    type: str
+    folder_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    content: Optional[str] = None
+    preview: Optional[str] = None
+    tags: List[NoteTag] = []
+
+class NoteSearchResult(Note):
+    score: float
+    title_highlight: str
+    snippet: str
+
+class NoteSuggestion(BaseModel):
+    id: str
+    title: str
+
+class TagSuggestion(BaseModel):
+    id: int
+    name: str
+
+class Suggestions(BaseModel):
+    notes: List[NoteSuggestion] = []
+    tags: List[TagSuggestion] = []
+
 class NoteWithHistory(Note):
-    history: List[NoteHistoryEntry] = []
\ No newline at end of file
+    history: List[NoteHistoryEntry] = []
+
+class PoolStats(BaseModel):
+    max_size: int
+    open_connections: int
+    in_use: int
+    idle: int
+    checkouts: int
+    waits: int
+    wait_time_ms: float
+    timeouts: int
+    writes: int
+    write_lock_wait_ms: float
+    write_retries: int
+
+class AutosaveStats(BaseModel):
+    window_ms: float
+    pending: int
+    requests: int
+    merged: int
+    commits: int
+    notes_written: int
+    commits_saved: int
+    avg_batch: float
+    errors: int
+
+class CacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    expirations: int
+    invalidations: int
+
+class NoteStats(BaseModel):
+    """Conteggi degli appunti: `folders` per id della cartella, `tags` per nome"""
+    notes: int
+    by_type: Dict[str, int] = {}
+    unfiled: int = 0
+    folders: Dict[str, int] = {}
+    tags: Dict[str, int] = {}
+    history_versions: int = 0
+
+class ChangeEntry(BaseModel):
+    seq: int
+    entity: str
+    op: str
+    id: str
+    changed_at: str
+
+class ChangeFeed(BaseModel):
+    last_seq: int
+    changes: List[ChangeEntry]
+
+class SyncDeleted(BaseModel):
+    notes: List[str] = []
+    folders: List[str] = []
+    tags: List[int] = []
+
+class SyncResponse(BaseModel):
+    token: str
+    full: bool
+    has_more: bool
+    notes: List[Note] = []
+    folders: List[Folder] = []
+    tags: List[Tag] = []
+    deleted: SyncDeleted
@@ -0,0 +1,295 @@
+import functools
+import random
+import sqlite3
+import threading
+import time
+import queue
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Optional
+
+from metrics import InstrumentedConnection, QueryMetrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: il lock di scrittura vale solo tra thread
+    fcntl = None
+
+# Pragma applicati a ogni nuova connessione
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,        # ~20 MB di page cache per connessione
+    'mmap_size': 268435456,      # 256 MB di memory-mapped I/O
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+    'busy_timeout': 5000,
+}
+
+
+# Tentativi (con backoff esponenziale) di una scrittura che trova il database bloccato
+WRITE_RETRIES = 5
+WRITE_RETRY_DELAY = 0.05
+
+
+class PoolTimeout(Exception):
+    """Nessuna connessione disponibile entro il timeout di checkout"""
+
+
+def is_locked_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and (
+        'database is locked' in message or 'database is busy' in message
+    )
+
+
+class WriteLock:
+    """Lock di scrittura condiviso tra i thread e tra i processi (worker).
+
+    Tra processi usa `flock` su un file accanto al database: gli scrittori
+    si mettono in coda invece di contendersi il lock di SQLite a colpi di
+    busy timeout. È rientrante per thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._owner = None
+        self._depth = 0
+        self._file = None
+
+    def held(self) -> bool:
+        return self._owner == threading.get_ident()
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    if self._file is None:
+                        self._file = open(self.path, 'a')
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+            self._owner = threading.get_ident()
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            if self._file is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def serialized_write(method):
+    """Esegue un metodo di scrittura di NotesDatabase con il lock di scrittura.
+
+    Se SQLite risponde comunque 'database is locked' (es. scrittori esterni
+    all'applicazione) l'intera transazione viene ripetuta con backoff
+    esponenziale. Le chiamate annidate lasciano il retry al chiamante esterno.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        pool = self.pool
+        if pool.write_lock.held():
+            return method(self, *args, **kwargs)
+
+        delay = WRITE_RETRY_DELAY
+        for attempt in range(1, WRITE_RETRIES + 1):
+            started = time.perf_counter()
+            with pool.write_lock:
+                pool.record_write_wait(time.perf_counter() - started)
+                try:
+                    return method(self, *args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if attempt == WRITE_RETRIES or not is_locked_error(e):
+                        raise
+            pool.record_write_retry()
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
+    return wrapper
+
+
+class ConnectionPool:
+    """Pool limitato di connessioni SQLite riutilizzabili.
+
+    Le connessioni vengono aperte on demand fino a `max_size` e restituite
+    al pool a fine utilizzo. Il checkout è rientrante per thread: chiamate
+    annidate nello stesso thread riusano la stessa connessione e la stessa
+    transazione, che viene confermata solo all'uscita più esterna.
+    Con `query_metrics` le connessioni misurano ogni query; `on_connect`
+    viene chiamata su ogni nuova connessione (es. per registrare funzioni SQL).
+    """
+
+    def __init__(self, db_path: str, max_size: int = 8, timeout: float = 10.0,
+                 pragmas: Dict[str, Any] = None, query_metrics: Optional[QueryMetrics] = None,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.query_metrics = query_metrics
+        self.on_connect = on_connect
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open = 0
+        self._closed = False
+
+        # Metriche
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._in_use = 0
+        self._writes = 0
+        self._write_wait_time = 0.0
+        self._write_retries = 0
+
+        self.write_lock = WriteLock(f'{db_path}.lock')
+
+        # WAL è persistente nel file: basta impostarlo una volta
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.query_metrics is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   factory=InstrumentedConnection)
+            conn.query_metrics = self.query_metrics
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError('Connection pool is closed')
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._open < self.max_size:
+                self._open += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._open -= 1
+                    raise
+
+        # Pool esaurito: attende che una connessione venga restituita
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(
+                f'No database connection available after {self.timeout}s '
+                f'(pool size {self.max_size})'
+            )
+        with self._lock:
+            self._waits += 1
+            self._wait_time += time.perf_counter() - started
+        return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        if self._closed:
+            conn.close()
+            with self._lock:
+                self._open -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Checkout di una connessione con commit/rollback automatico"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # Checkout annidato nello stesso thread
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            with self._lock:
+                self._in_use -= 1
+            self._release(conn)
+
+    def record_write_wait(self, seconds: float):
+        with self._lock:
+            self._writes += 1
+            self._write_wait_time += seconds
+
+    def record_write_retry(self):
+        with self._lock:
+            self._write_retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open_connections': self._open,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_ms': round(self._wait_time * 1000, 3),
+                'timeouts': self._timeouts,
+                'writes': self._writes,
+                'write_lock_wait_ms': round(self._write_wait_time * 1000, 3),
+                'write_retries': self._write_retries,
+            }
+
+    def close(self):
+        """Chiude tutte le connessioni inattive; quelle in uso alla restituzione"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            # Aggiorna le statistiche del planner solo dove servono
+            conn.execute('PRAGMA optimize')
+            conn.close()
+            with self._lock:
+                self._open -= 1
+        self.write_lock.close()
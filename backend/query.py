@@ -0,0 +1,346 @@
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+
+from search import build_match_query
+
+# Linguaggio di interrogazione degli appunti (GET /api/notes?q=...):
+#
+#   tag:python AND NOT tag:todo folder:work updated:>2026-01-01 sort:title
+#
+# - termini `campo:valore`: tag, folder (id o nome; `none` = senza
+#   cartella), type, created, updated; i valori con spazi vanno tra
+#   virgolette (`folder:"Idee progetti"`)
+# - date: `2026-01-01`, `>2026-01-01`, `>=`, `<`, `<=`, `2026-01-01..2026-01-31`
+#   (giorni interi, estremi inclusi)
+# - parole e "frasi" senza campo: ricerca full-text (come `search`)
+# - AND (implicito tra termini vicini), OR, NOT o `-`, parentesi
+# - `sort:updated|created|title`, con `:asc` o `:desc` (default: date dalla
+#   più recente, titolo A-Z)
+
+FIELDS = ('tag', 'folder', 'type', 'created', 'updated')
+NOTE_TYPES = ('text', 'code', 'list')
+
+# Ordinamenti: colonna, chiave dell'appunto per il cursore, direzione di default
+SORTS = {
+    'updated': ('n.updated_at', 'updated_at', 'desc'),
+    'created': ('n.created_at', 'created_at', 'desc'),
+    'title': ('n.title', 'title', 'asc'),
+}
+
+# Piani compilati tenuti in memoria
+PLAN_CACHE_SIZE = 512
+
+
+class QuerySyntaxError(ValueError):
+    """Query non valida (gli endpoint rispondono 400)"""
+
+
+# AST
+
+@dataclass(frozen=True)
+class Text:
+    text: str
+
+
+@dataclass(frozen=True)
+class Term:
+    field: str
+    value: str
+
+
+@dataclass(frozen=True)
+class Not:
+    node: 'Node'
+
+
+@dataclass(frozen=True)
+class And:
+    nodes: Tuple['Node', ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    nodes: Tuple['Node', ...]
+
+
+Node = Union[Text, Term, Not, And, Or]
+
+
+@dataclass(frozen=True)
+class Sort:
+    field: str = 'updated'
+    direction: str = 'desc'
+
+    @property
+    def column(self) -> str:
+        return SORTS[self.field][0]
+
+    @property
+    def key(self) -> str:
+        """Chiave dell'appunto usata dal cursore di paginazione"""
+        return SORTS[self.field][1]
+
+    def order_by(self) -> str:
+        return f'{self.column} {self.direction.upper()}, n.id {self.direction.upper()}'
+
+    def after_cursor(self) -> str:
+        """Condizione keyset per la pagina successiva a (valore, id)"""
+        return f'({self.column}, n.id) {"<" if self.direction == "desc" else ">"} (?, ?)'
+
+
+DEFAULT_SORT = Sort()
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    where: str
+    params: Tuple[str, ...]
+    sort: Sort
+
+
+# Parser
+
+_TOKEN_RE = re.compile(r'''
+    (?P<lparen>\() | (?P<rparen>\)) | (?P<negparen>-(?=\()) |
+    (?P<neg>-)?(?:
+        (?P<field>[A-Za-z]+):(?:"(?P<quoted_value>[^"]*)"|(?P<value>[^\s()]*)) |
+        "(?P<phrase>[^"]*)" |
+        (?P<word>[^\s()"]+)
+    )
+''', re.VERBOSE)
+
+
+def _tokenize(text: str) -> List[Tuple[str, object]]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        if text[position].isspace():
+            position += 1
+            continue
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            # Virgolette non chiuse: il resto è una frase
+            match = _TOKEN_RE.match(text + '"', position)
+        position = min(match.end(), len(text))
+        if match['lparen']:
+            tokens.append(('(', None))
+            continue
+        if match['rparen']:
+            tokens.append((')', None))
+            continue
+        if match['negparen']:
+            # -( ... ) equivale a NOT ( ... )
+            tokens.append(('NOT', None))
+            continue
+
+        negated = bool(match['neg'])
+        field = (match['field'] or '').lower()
+        if field in FIELDS or field == 'sort':
+            value = match['quoted_value'] if match['quoted_value'] is not None else match['value']
+            node = ('sort', value) if field == 'sort' else ('node', Term(field, value))
+        elif match['field'] is not None:
+            # Campo sconosciuto (es. un URL): testo libero
+            node = ('node', Text(match.group(0).lstrip('-')))
+        elif match['phrase'] is not None:
+            node = ('node', Text(f'"{match["phrase"]}"'))
+        elif not negated and match['word'] in ('AND', 'OR', 'NOT'):
+            node = (match['word'], None)
+        else:
+            node = ('node', Text(match['word']))
+
+        if negated:
+            if node[0] != 'node':
+                raise QuerySyntaxError(f'Cannot negate {match.group(0)!r}')
+            node = ('node', Not(node[1]))
+        tokens.append(node)
+    return tokens
+
+
+class _Parser:
+    """Discesa ricorsiva: OR < AND (anche implicito) < NOT < termine o parentesi"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.sort = None
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> Tuple[Optional[Node], Sort]:
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError("Unbalanced ')'")
+        return node, self.sort or DEFAULT_SORT
+
+    def parse_or(self) -> Optional[Node]:
+        nodes = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            nodes.append(self.parse_and())
+        nodes = [node for node in nodes if node is not None]
+        if len(nodes) < 2:
+            return nodes[0] if nodes else None
+        return Or(tuple(nodes))
+
+    def parse_and(self) -> Optional[Node]:
+        nodes = []
+        while self.peek() not in (None, ')', 'OR'):
+            if self.peek() == 'AND':
+                self.take()
+                continue
+            if self.peek() == 'sort':
+                self.set_sort(self.take()[1])
+                continue
+            nodes.append(self.parse_not())
+        nodes = [node for node in nodes if node is not None]
+        if len(nodes) < 2:
+            return nodes[0] if nodes else None
+        return And(tuple(nodes))
+
+    def parse_not(self) -> Optional[Node]:
+        kind, value = self.take()
+        if kind == 'NOT':
+            if self.peek() in (None, ')', 'OR', 'AND'):
+                raise QuerySyntaxError('NOT without a term')
+            node = self.parse_not()
+            return Not(node) if node is not None else None
+        if kind == '(':
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise QuerySyntaxError("Missing ')'")
+            self.take()
+            return node
+        if kind == ')':
+            raise QuerySyntaxError("Unbalanced ')'")
+        if kind == 'sort':
+            raise QuerySyntaxError('sort: cannot be negated or grouped')
+        return value
+
+    def set_sort(self, value: str):
+        field, _, direction = value.lower().partition(':')
+        if field not in SORTS:
+            raise QuerySyntaxError(f'Unknown sort: {value!r} (use {", ".join(SORTS)})')
+        direction = direction or SORTS[field][2]
+        if direction not in ('asc', 'desc'):
+            raise QuerySyntaxError(f'Unknown sort direction: {direction!r}')
+        self.sort = Sort(field, direction)
+
+
+def parse_query(text: str) -> Tuple[Optional[Node], Sort]:
+    """AST della query (None se non ci sono condizioni) e ordinamento"""
+    return _Parser(_tokenize(text or '')).parse()
+
+
+# Compilatore
+
+_DATE_RE = re.compile(r'^(>=|<=|>|<|=)?(\d{4}-\d{2}-\d{2})(?:\.\.(\d{4}-\d{2}-\d{2}))?$')
+
+
+def _day(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise QuerySyntaxError(f'Invalid date: {value!r}') from None
+
+
+def _date_range(column: str, value: str) -> Tuple[str, List[str]]:
+    """Condizione su giorni interi; i confronti con 'YYYY-MM-DD' valgono per
+    entrambi i formati delle date salvate ('YYYY-MM-DD HH:MM:SS' e ISO)"""
+    match = _DATE_RE.match(value)
+    if not match:
+        raise QuerySyntaxError(f'Invalid date filter: {value!r} (e.g. >2026-01-01)')
+    op, first, last = match.groups()
+    start = _day(first)
+    if last:
+        if op:
+            raise QuerySyntaxError(f'Invalid date filter: {value!r}')
+        end = _day(last) + timedelta(days=1)
+        return f'{column} >= ? AND {column} < ?', [start.isoformat(), end.isoformat()]
+    next_day = (start + timedelta(days=1)).isoformat()
+    if op == '>':
+        return f'{column} >= ?', [next_day]
+    if op == '>=':
+        return f'{column} >= ?', [start.isoformat()]
+    if op == '<':
+        return f'{column} < ?', [start.isoformat()]
+    if op == '<=':
+        return f'{column} < ?', [next_day]
+    return f'{column} >= ? AND {column} < ?', [start.isoformat(), next_day]
+
+
+def _compile_term(term: Term, paged: bool, positive: bool) -> Tuple[str, List[str]]:
+    field, value = term.field, term.value
+    if not value:
+        raise QuerySyntaxError(f'Missing value for {field}:')
+
+    if field == 'tag':
+        tag_id = '(SELECT id FROM tags WHERE name = ?)'
+        if positive and not paged:
+            # Conteggi e batch: si parte dall'indice di note_tags sul tag (con
+            # OR, un indice per ramo)
+            return f'n.id IN (SELECT note_id FROM note_tags WHERE tag_id = {tag_id})', [value]
+        # Pagine ordinate: controllo per appunto sulla chiave primaria di note_tags
+        return (f'EXISTS (SELECT 1 FROM note_tags nt WHERE nt.note_id = n.id '
+                f'AND nt.tag_id = {tag_id})', [value])
+
+    if field == 'folder':
+        if value.lower() == 'none':
+            return 'n.folder_id IS NULL', []
+        return ('n.folder_id IN (SELECT id FROM folders WHERE id = ? OR name = ? COLLATE NOCASE)',
+                [value, value])
+
+    if field == 'type':
+        if value.lower() not in NOTE_TYPES:
+            raise QuerySyntaxError(f'Unknown note type: {value!r} (use {", ".join(NOTE_TYPES)})')
+        return 'n.type = ?', [value.lower()]
+
+    # created / updated
+    return _date_range(f'n.{field}_at', value)
+
+
+def _compile(node: Node, paged: bool, positive: bool) -> Tuple[str, List[str]]:
+    if isinstance(node, Term):
+        return _compile_term(node, paged, positive)
+
+    if isinstance(node, Text):
+        match = build_match_query(node.text)
+        if not match:
+            # Solo punteggiatura: non corrisponde a nessun appunto
+            return '0', []
+        return 'n.rowid IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)', [match]
+
+    if isinstance(node, Not):
+        sql, params = _compile(node.node, paged, False)
+        return f'NOT ({sql})', params
+
+    # And / Or: i figli restano "positivi" finché non si passa da un NOT
+    children = [_compile(child, paged, positive) for child in node.nodes]
+    joiner = ' AND ' if isinstance(node, And) else ' OR '
+    sql = joiner.join(f'({child_sql})' for child_sql, _ in children)
+    return sql, [param for _, child_params in children for param in child_params]
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_query(text: str, paged: bool = False) -> CompiledQuery:
+    """Compila una query in una condizione SQL sull'alias `n` di notes.
+
+    Il risultato è in cache per testo e modalità: le query ripetute (stessa
+    vista, pagine successive) non vengono rianalizzate, e lo stesso testo
+    SQL permette a sqlite3 di riusare lo statement già preparato. Con
+    `paged` i tag sono EXISTS correlati (ci si ferma a pagina piena),
+    altrimenti i tag non negati partono dall'indice di note_tags.
+    """
+    node, sort = parse_query(text)
+    if node is None:
+        return CompiledQuery('1=1', (), sort)
+    sql, params = _compile(node, paged, True)
+    return CompiledQuery(sql, tuple(params), sort)
@@ -0,0 +1,106 @@
+import re
+from typing import List
+
+# Indice full-text FTS5 sincronizzato con `notes` tramite trigger.
+# È una tabella "external content": il testo non viene duplicato, FTS5 lo
+# rilegge tramite rowid. Dopo un VACUUM i rowid di `notes`
+# possono cambiare: in quel caso va eseguito NotesDatabase.rebuild_search_index().
+# Dalla migrazione 9 il testo sta nel content store e FTS5 lo rilegge dalla
+# vista `notes_text` (vedi content_store.CONTENT_STORE_SCHEMA).
+FTS_TOKENIZE = 'unicode61 remove_diacritics 2'
+
+FTS_SCHEMA = [
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title,
+        content,
+        content='notes',
+        content_rowid='rowid',
+        tokenize='{FTS_TOKENIZE}'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts (rowid, title, content)
+        VALUES (new.rowid, new.title, new.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts (notes_fts, rowid, title, content)
+        VALUES ('delete', old.rowid, old.title, old.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN
+        INSERT INTO notes_fts (notes_fts, rowid, title, content)
+        VALUES ('delete', old.rowid, old.title, old.content);
+        INSERT INTO notes_fts (rowid, title, content)
+        VALUES (new.rowid, new.title, new.content);
+    END
+    ''',
+]
+
+# Peso del titolo rispetto al contenuto nel ranking bm25
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(text: str) -> str:
+    """Converte il testo digitato dall'utente in un'espressione MATCH FTS5.
+
+    - `"due parole"` diventa una ricerca per frase esatta
+    - ogni altra parola diventa una ricerca per prefisso (`parola*`)
+    - `OR` tra due termini viene mantenuto, altrimenti i termini sono in AND
+    - `-parola` esclude gli appunti che contengono il termine
+
+    Tutto il resto viene neutralizzato, quindi il risultato non genera mai
+    errori di sintassi FTS5. Restituisce una stringa vuota se non ci sono
+    termini ricercabili.
+    """
+    positive: List[str] = []
+    negative: List[str] = []
+    pending_or = False
+
+    for match in _TOKEN_RE.finditer(text or ''):
+        phrase, word = match.groups()
+
+        if word == 'OR':
+            pending_or = bool(positive)
+            continue
+
+        if phrase is not None:
+            words = _WORD_RE.findall(phrase)
+            if not words:
+                continue
+            term = '"' + ' '.join(words) + '"'
+            excluded = False
+        else:
+            excluded = word.startswith('-') and len(word) > 1
+            words = _WORD_RE.findall(word)
+            if not words:
+                continue
+            if len(words) == 1:
+                term = f'"{words[0]}"*'
+            else:
+                # es. "foo.bar" -> frase "foo bar" con prefisso sull'ultimo termine
+                term = '"' + ' '.join(words) + '"*'
+
+        if excluded:
+            negative.append(term)
+        elif pending_or:
+            positive[-1] = f'({positive[-1]} OR {term})'
+        else:
+            positive.append(term)
+        pending_or = False
+
+    if not positive:
+        return ''
+
+    query = ' AND '.join(positive)
+    if negative:
+        query = f'({query})' + ''.join(f' NOT {term}' for term in negative)
+    return query
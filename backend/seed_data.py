@@ -1,7 +1,7 @@
-from database import db
+from database import NotesDatabase
 import uuid
 
-def seed_sample_notes():
+def seed_sample_notes(db: NotesDatabase):
     """Aggiunge appunti di esempio al database"""
     
     # Sample notes data
@@ -168,21 +168,20 @@ else:
         }
     ]
     
-    # Add sample notes
-    for note_data in sample_notes:
-        try:
-            db.create_note(
-                title=note_data['title'],
-                content=note_data['content'],
-                note_type=note_data['type'],
-                folder_id=note_data['folder_id'],
-                tag_names=note_data['tag_names']
-            )
+    # Add sample notes (una sola transazione)
+    try:
+        result = db.import_notes(sample_notes)
+        for note_data in sample_notes:
             print(f"✅ Creato appunto: {note_data['title']}")
-        except Exception as e:
-            print(f"❌ Errore creando appunto {note_data['title']}: {e}")
+        print(f"📦 {result['imported']} appunti importati in {result['seconds']}s")
+    except Exception as e:
+        print(f"❌ Errore importando gli appunti: {e}")
 
 if __name__ == "__main__":
     print("🌱 Seeding database con appunti di esempio...")
-    seed_sample_notes()
+    db = NotesDatabase()
+    try:
+        seed_sample_notes(db)
+    finally:
+        db.close()
     print("✅ Seeding completato!")
\ No newline at end of file
@@ -0,0 +1,122 @@
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Type, get_args
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+
+# Serializzazione veloce delle risposte: i dizionari restituiti da
+# NotesDatabase sono già nella forma dei modelli di risposta, quindi invece
+# di farli rivalidare da FastAPI (response_model) e poi codificare con il
+# modulo json, vengono mappati una volta sola (Shape) e codificati con
+# orjson se installato. Il JSON prodotto è lo stesso del percorso validato.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Liste con almeno questo numero di elementi vengono inviate in streaming,
+# a blocchi di STREAM_CHUNK elementi
+STREAM_MIN_ITEMS = 1000
+STREAM_CHUNK = 500
+
+_DATETIME = TypeAdapter(datetime)
+# Formati delle date salvate da SQLite (CURRENT_TIMESTAMP) e da isoformat()
+_TIMESTAMP_RE = re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d{6})?')
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    # Come JSONResponse di Starlette
+    return json.dumps(value, ensure_ascii=False, allow_nan=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def timestamp(value: Any) -> Any:
+    """Data come la serializza pydantic per un campo datetime"""
+    if value is None:
+        return None
+    if isinstance(value, str) and _TIMESTAMP_RE.fullmatch(value):
+        return f'{value[:10]}T{value[11:]}'
+    return _DATETIME.dump_python(_DATETIME.validate_python(value), mode='json')
+
+
+class Shape:
+    """Forma di un modello di risposta: campi in ordine, default e date.
+
+    Applicata a un dizionario fidato ne produce uno con le stesse chiavi
+    (e lo stesso JSON) di `model.model_validate(row).model_dump(mode='json')`
+    senza validazione; i campi annidati non indicati in `nested` (es. i tag
+    di un appunto) passano così come sono.
+    Con `exclude_unset` le chiavi assenti vengono omesse, come con
+    `response_model_exclude_unset=True`; `nested` indica la Shape dei campi
+    che contengono altri modelli (o liste di modelli).
+    """
+
+    def __init__(self, model: Type[BaseModel], exclude_unset: bool = False,
+                 nested: Dict[str, 'Shape'] = None):
+        self.model = model
+        self.exclude_unset = exclude_unset
+        self.nested = nested or {}
+        self.fields = []
+        for name, info in model.model_fields.items():
+            is_datetime = datetime in (info.annotation, *get_args(info.annotation))
+            default = None if info.is_required() else info.get_default(call_default_factory=True)
+            self.fields.append((name, is_datetime, info.is_required(), default))
+
+    def __call__(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        shaped = {}
+        for name, is_datetime, required, default in self.fields:
+            if name in row:
+                value = row[name]
+                if is_datetime:
+                    value = timestamp(value)
+                elif name in self.nested and value is not None:
+                    shape = self.nested[name]
+                    value = shape.many(value) if isinstance(value, list) else shape(value)
+            elif self.exclude_unset:
+                continue
+            elif required:
+                raise ValueError(f'{self.model.__name__}: missing field {name!r}')
+            else:
+                value = default
+            shaped[name] = value
+        return shaped
+
+    def many(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self(row) for row in rows]
+
+
+class FastJSONResponse(Response):
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _array_chunks(rows: List[Dict[str, Any]], shape: Shape) -> Iterator[bytes]:
+    yield b'['
+    for start in range(0, len(rows), STREAM_CHUNK):
+        encoded = dumps(shape.many(rows[start:start + STREAM_CHUNK]))
+        # Elementi del blocco senza le parentesi dell'array
+        yield (b',' if start else b'') + encoded[1:-1]
+    yield b']'
+
+
+def json_response(response: Response, content: Any, shape: Optional[Shape] = None) -> Response:
+    """Risposta JSON già serializzata, con gli header impostati su `response`"""
+    if shape is not None:
+        content = shape(content)
+    return FastJSONResponse(content, headers=dict(response.headers))
+
+
+def json_list_response(response: Response, rows: List[Dict[str, Any]], shape: Shape) -> Response:
+    """Array JSON di righe: oltre STREAM_MIN_ITEMS viene codificato e inviato a
+    blocchi, così il primo byte parte subito e non serve un unico buffer"""
+    if len(rows) < STREAM_MIN_ITEMS:
+        return json_response(response, shape.many(rows))
+    return StreamingResponse(_array_chunks(rows, shape), media_type='application/json',
+                             headers=dict(response.headers))
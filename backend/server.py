@@ -1,33 +1,83 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 import os
+import json
 import logging
+import sqlite3
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager, suppress
 from typing import List, Optional
 
-from database import db
+from database import NotesDatabase, next_cursor, InvalidCursor, InvalidSyncToken, SyncTokenExpired
+from async_db import AsyncNotesDatabase
+from changes import ChangeNotifier
+from query import DEFAULT_SORT, QuerySyntaxError, compile_query
+from autosave import AutosaveQueue
+from settings import Settings, get_settings
+from http_cache import conditional, CompressionMiddleware, COMPRESSION_MIN_SIZE
+from serialization import Shape, dumps, json_list_response, json_response
+import metrics
 from models import (
     Folder, FolderCreate, 
     Tag, TagCreate,
-    Note, NoteCreate, NoteUpdate, NoteHistoryEntry
+    Note, NoteCreate, NoteUpdate, NoteHistoryEntry, NoteSearchResult, NoteListItem,
+    NoteDiff, NoteImport, BulkImportResult, NoteBatchOperation, NoteBatchResult,
+    PoolStats, CacheStats, AutosaveStats, NoteStats, ChangeFeed, SyncResponse, Suggestions
 )
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create FastAPI app
-app = FastAPI(title="Notes Dashboard API", version="1.0.0")
+# Intervallo dei commenti keep-alive sugli stream SSE
+SSE_HEARTBEAT = 15.0
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Intervallo tra due pulizie del change log (s): la conservazione si
+# esprime in giorni, con conservazioni più brevi si pulisce più spesso
+PRUNE_INTERVAL = 24 * 3600.0
+
+# Import NDJSON: righe già validate tenute in memoria fino a questa
+# dimensione (byte), oltre finiscono in un file temporaneo
+IMPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
+# Forme dei modelli di risposta per la serializzazione veloce (fast_json)
+FOLDER_SHAPE = Shape(Folder)
+TAG_SHAPE = Shape(Tag)
+NOTE_SHAPE = Shape(Note)
+NOTE_LIST_SHAPE = Shape(NoteListItem, exclude_unset=True)
+SEARCH_SHAPE = Shape(NoteSearchResult)
+SUGGEST_SHAPE = Shape(Suggestions)
+STATS_SHAPE = Shape(NoteStats)
+HISTORY_SHAPE = Shape(NoteHistoryEntry)
+SYNC_SHAPE = Shape(SyncResponse, nested={"notes": NOTE_SHAPE, "folders": FOLDER_SHAPE,
+                                         "tags": TAG_SHAPE})
+
+# Dipendenze: il database viene creato nel lifespan, non all'import
+def get_db(request: Request) -> AsyncNotesDatabase:
+    return request.app.state.db
+
+def get_notifier(request: Request) -> ChangeNotifier:
+    return request.app.state.notifier
+
+def get_autosave(request: Request) -> AutosaveQueue:
+    return request.app.state.autosave
+
+# Con fast_json le risposte vengono serializzate qui, senza la validazione
+# di response_model; altrimenti il contenuto passa a FastAPI
+def respond(request: Request, response: Response, content, shape: Shape):
+    if not request.app.state.settings.fast_json:
+        return content
+    return json_response(response, content, shape)
+
+def respond_list(request: Request, response: Response, rows: list, shape: Shape):
+    if not request.app.state.settings.fast_json:
+        return rows
+    return json_list_response(response, rows, shape)
 
 # Create API router with /api prefix
 api_router = APIRouter(prefix="/api")
@@ -37,32 +87,95 @@ api_router = APIRouter(prefix="/api")
 async def health_check():
     return {"status": "ok", "message": "Notes Dashboard API"}
 
+@api_router.get("/db/pool", response_model=PoolStats)
+async def get_pool_stats(adb: AsyncNotesDatabase = Depends(get_db)):
+    """Metriche del pool di connessioni SQLite"""
+    return adb.db.pool_stats()
+
+@api_router.get("/autosave/stats", response_model=AutosaveStats)
+async def get_autosave_stats(autosave: AutosaveQueue = Depends(get_autosave)):
+    """Contatori del group commit dei salvataggi automatici"""
+    return autosave.stats()
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request, adb: AsyncNotesDatabase = Depends(get_db),
+                      autosave: AutosaveQueue = Depends(get_autosave)):
+    """Metriche in formato Prometheus (per processo: ogni worker ha le sue)"""
+    families = []
+    http_metrics = getattr(request.app.state, "metrics", None)
+    if http_metrics is not None:
+        families += http_metrics.metrics()
+    if adb.db.query_metrics is not None:
+        families += adb.db.query_metrics.metrics()
+    families += metrics.stats_metrics(
+        "notes_db_pool", adb.db.pool_stats(),
+        counters=("checkouts", "waits", "wait_time_ms", "timeouts", "writes",
+                  "write_lock_wait_ms", "write_retries"),
+    )
+    families += metrics.stats_metrics(
+        "notes_cache", adb.db.cache_stats(),
+        counters=("hits", "misses", "evictions", "expirations", "invalidations"),
+    )
+    families += metrics.stats_metrics(
+        "notes_content_cache", adb.db.content_cache_stats(),
+        counters=("hits", "misses", "evictions"),
+    )
+    families += metrics.stats_metrics(
+        "notes_autosave", autosave.stats(),
+        counters=("requests", "merged", "commits", "notes_written", "commits_saved", "errors"),
+    )
+    return PlainTextResponse(metrics.render(families), media_type=metrics.CONTENT_TYPE)
+
+@api_router.get("/cache/stats", response_model=CacheStats)
+async def get_cache_stats(adb: AsyncNotesDatabase = Depends(get_db)):
+    """Contatori della cache delle letture"""
+    return adb.db.cache_stats()
+
+@api_router.get("/stats", response_model=NoteStats)
+async def get_stats(request: Request, response: Response,
+                    adb: AsyncNotesDatabase = Depends(get_db)):
+    """Conteggi degli appunti per tipo, cartella e tag (contatori materializzati)"""
+    not_modified = conditional(request, response, *await adb.data_version("notes"))
+    if not_modified:
+        return not_modified
+    try:
+        stats = await adb.get_stats()
+        return respond(request, response, stats, STATS_SHAPE)
+    except Exception as e:
+        logger.error(f"Error getting stats: {e}")
+        raise HTTPException(status_code=500, detail="Error retrieving stats")
+
 # FOLDERS ENDPOINTS
 @api_router.get("/folders", response_model=List[Folder])
-async def get_folders():
+async def get_folders(request: Request, response: Response,
+                      adb: AsyncNotesDatabase = Depends(get_db)):
     """Ottieni tutte le cartelle"""
+    not_modified = conditional(request, response, *await adb.data_version("folders"))
+    if not_modified:
+        return not_modified
     try:
-        folders = db.get_folders()
-        return folders
+        folders = await adb.get_folders()
+        return respond_list(request, response, folders, FOLDER_SHAPE)
     except Exception as e:
         logger.error(f"Error getting folders: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving folders")
 
 @api_router.post("/folders", response_model=Folder)
-async def create_folder(folder: FolderCreate):
+async def create_folder(folder: FolderCreate, adb: AsyncNotesDatabase = Depends(get_db)):
     """Crea nuova cartella"""
     try:
-        new_folder = db.create_folder(folder.name)
+        new_folder = await adb.create_folder(folder.name)
         return new_folder
     except Exception as e:
         logger.error(f"Error creating folder: {e}")
         raise HTTPException(status_code=500, detail="Error creating folder")
 
 @api_router.put("/folders/{folder_id}", response_model=Folder)
-async def update_folder(folder_id: str, folder: FolderCreate):
+async def update_folder(folder_id: str, folder: FolderCreate,
+                        adb: AsyncNotesDatabase = Depends(get_db)):
     """Aggiorna cartella"""
     try:
-        updated_folder = db.update_folder(folder_id, folder.name)
+        updated_folder = await adb.update_folder(folder_id, folder.name)
         if not updated_folder:
             raise HTTPException(status_code=404, detail="Folder not found")
         return updated_folder
@@ -73,10 +186,10 @@ async def update_folder(folder_id: str, folder: FolderCreate):
         raise HTTPException(status_code=500, detail="Error updating folder")
 
 @api_router.delete("/folders/{folder_id}")
-async def delete_folder(folder_id: str):
+async def delete_folder(folder_id: str, adb: AsyncNotesDatabase = Depends(get_db)):
     """Elimina cartella"""
     try:
-        success = db.delete_folder(folder_id)
+        success = await adb.delete_folder(folder_id)
         if not success:
             raise HTTPException(status_code=404, detail="Folder not found")
         return {"message": "Folder deleted successfully"}
@@ -88,48 +201,187 @@ async def delete_folder(folder_id: str):
 
 # TAGS ENDPOINTS
 @api_router.get("/tags", response_model=List[Tag])
-async def get_tags():
+async def get_tags(request: Request, response: Response,
+                   adb: AsyncNotesDatabase = Depends(get_db)):
     """Ottieni tutti i tag"""
+    not_modified = conditional(request, response, *await adb.data_version("tags"))
+    if not_modified:
+        return not_modified
     try:
-        tags = db.get_tags()
-        return tags
+        tags = await adb.get_tags()
+        return respond_list(request, response, tags, TAG_SHAPE)
     except Exception as e:
         logger.error(f"Error getting tags: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving tags")
 
 @api_router.post("/tags", response_model=Tag)
-async def create_tag(tag: TagCreate):
+async def create_tag(tag: TagCreate, adb: AsyncNotesDatabase = Depends(get_db)):
     """Crea nuovo tag"""
     try:
-        new_tag = db.create_tag(tag.name, tag.color)
+        new_tag = await adb.create_tag(tag.name, tag.color)
         return new_tag
     except Exception as e:
         logger.error(f"Error creating tag: {e}")
         raise HTTPException(status_code=500, detail="Error creating tag")
 
 # NOTES ENDPOINTS
-@api_router.get("/notes", response_model=List[Note])
+@api_router.get("/notes", response_model=List[NoteListItem], response_model_exclude_unset=True)
 async def get_notes(
+    request: Request,
+    response: Response,
     folder_id: Optional[str] = Query(None, description="Filter by folder ID"),
     search: Optional[str] = Query(None, description="Search in title and content"),
-    tag: Optional[str] = Query(None, description="Filter by tag name")
+    tag: Optional[str] = Query(None, description="Filter by tag name"),
+    q: Optional[str] = Query(None, description="Query, e.g. tag:python AND NOT tag:todo updated:>2026-01-01 sort:title"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (keyset pagination)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value of the previous page"),
+    fields: str = Query("full", pattern="^(full|list|preview)$",
+                        description="full, list (no content) or preview (truncated content)"),
+    include_total: bool = Query(False, description="Return total match count in X-Total-Count"),
+    adb: AsyncNotesDatabase = Depends(get_db)
 ):
     """Ottieni appunti con filtri opzionali"""
+    not_modified = conditional(request, response, *await adb.data_version("notes"))
+    if not_modified:
+        return not_modified
     try:
-        notes = db.get_notes(folder_id=folder_id, search=search, tag=tag)
-        return notes
+        notes = await adb.get_notes(folder_id=folder_id, search=search, tag=tag,
+                                    limit=limit, cursor=cursor, fields=fields, q=q)
+        
+        sort = compile_query(q).sort if q else DEFAULT_SORT
+        cursor_next = next_cursor(notes, limit, sort.key)
+        if cursor_next:
+            response.headers["X-Next-Cursor"] = cursor_next
+        if include_total:
+            total = await adb.count_notes(folder_id=folder_id, search=search, tag=tag, q=q)
+            response.headers["X-Total-Count"] = str(total)
+        
+        return respond_list(request, response, notes, NOTE_LIST_SHAPE)
+    except (QuerySyntaxError, InvalidCursor) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting notes: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving notes")
 
+@api_router.post("/notes/bulk", response_model=BulkImportResult)
+async def bulk_import_notes(
+    request: Request,
+    create_tags: bool = Query(False, description="Create tags that do not exist yet"),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
+    """Importa appunti da un corpo NDJSON (un appunto JSON per riga).
+
+    Le righe vengono validate mentre arrivano e accodate in un file
+    temporaneo (in memoria finché è piccolo); l'import le rilegge una per
+    volta, in un'unica transazione, solo se sono tutte valide.
+    """
+    line_number = 0
+    
+    def parse(line: bytes):
+        if line.strip():
+            try:
+                note = NoteImport.model_validate_json(line)
+            except ValidationError as e:
+                raise HTTPException(status_code=400, detail=f"Line {line_number}: {e.errors()[0]['msg']}")
+            spool.write(note.model_dump_json().encode() + b"\n")
+    
+    def validated_notes():
+        spool.seek(0)
+        for line in spool:
+            yield json.loads(line)
+    
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE) as spool:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                parse(line)
+        line_number += 1
+        parse(buffer)
+        
+        try:
+            return await adb.import_notes(validated_notes(), auto_create_tags=create_tags)
+        except sqlite3.IntegrityError as e:
+            raise HTTPException(status_code=409, detail=f"Import rejected: {e}")
+        except Exception as e:
+            logger.error(f"Error importing notes: {e}")
+            raise HTTPException(status_code=500, detail="Error importing notes")
+
+@api_router.post("/notes/batch", response_model=NoteBatchResult)
+async def batch_update_notes(
+    batch: NoteBatchOperation,
+    create_tags: bool = Query(False, description="Create tags that do not exist yet"),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
+    """Sposta, tagga, rimuove tag o elimina più appunti in una sola transazione"""
+    try:
+        return await adb.batch_update_notes(
+            op=batch.op,
+            note_ids=batch.ids,
+            filters=batch.filter.model_dump() if batch.filter else None,
+            folder_id=batch.folder_id,
+            tag_names=batch.tag_names,
+            auto_create_tags=create_tags
+        )
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in batch operation: {e}")
+        raise HTTPException(status_code=500, detail="Error executing batch operation")
+
+@api_router.get("/notes/search", response_model=List[NoteSearchResult])
+async def search_notes(
+    request: Request,
+    response: Response,
+    q: str = Query(..., description="Search terms: words (prefix), \"phrases\", OR, -excluded"),
+    folder_id: Optional[str] = Query(None, description="Filter by folder ID"),
+    limit: int = Query(20, ge=1, le=200),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
+    """Ricerca full-text ordinata per rilevanza"""
+    try:
+        results = await adb.search_notes(q, limit=limit, folder_id=folder_id)
+        return respond_list(request, response, results, SEARCH_SHAPE)
+    except Exception as e:
+        logger.error(f"Error searching notes: {e}")
+        raise HTTPException(status_code=500, detail="Error searching notes")
+
+@api_router.get("/notes/suggest", response_model=Suggestions)
+async def suggest_notes(
+    request: Request,
+    response: Response,
+    prefix: str = Query(..., max_length=200, description="Text typed so far (title or tag name, typos tolerated)"),
+    limit: int = Query(10, ge=1, le=50),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
+    """Apertura rapida: appunti e tag per titolo, dal più recente"""
+    try:
+        suggestions = await adb.suggest(prefix, limit=limit)
+        return respond(request, response, suggestions, SUGGEST_SHAPE)
+    except Exception as e:
+        logger.error(f"Error suggesting notes: {e}")
+        raise HTTPException(status_code=500, detail="Error suggesting notes")
+
 @api_router.get("/notes/{note_id}", response_model=Note)
-async def get_note(note_id: str):
+async def get_note(note_id: str, request: Request, response: Response,
+                   adb: AsyncNotesDatabase = Depends(get_db)):
     """Ottieni singolo appunto"""
+    # Prima del 304: la versione dei dati vale per tutti gli appunti, non
+    # dice se questo esiste
+    if not await adb.note_exists(note_id):
+        raise HTTPException(status_code=404, detail="Note not found")
+    not_modified = conditional(request, response, *await adb.data_version("notes"))
+    if not_modified:
+        return not_modified
     try:
-        note = db.get_note_by_id(note_id)
+        note = await adb.get_note_by_id(note_id)
         if not note:
             raise HTTPException(status_code=404, detail="Note not found")
-        return note
+        return respond(request, response, note, NOTE_SHAPE)
     except HTTPException:
         raise
     except Exception as e:
@@ -137,34 +389,66 @@ async def get_note(note_id: str):
         raise HTTPException(status_code=500, detail="Error retrieving note")
 
 @api_router.post("/notes", response_model=Note)
-async def create_note(note: NoteCreate):
+async def create_note(
+    note: NoteCreate,
+    request: Request,
+    response: Response,
+    create_tags: bool = Query(False, description="Create tags that do not exist yet"),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
     """Crea nuovo appunto"""
     try:
-        new_note = db.create_note(
+        new_note = await adb.create_note(
             title=note.title,
             content=note.content,
             note_type=note.type,
             folder_id=note.folder_id,
-            tag_names=note.tag_names
+            tag_names=note.tag_names,
+            auto_create_tags=create_tags
         )
-        return new_note
+        return respond(request, response, new_note, NOTE_SHAPE)
+    except sqlite3.IntegrityError:
+        # Chiave esterna: la cartella indicata non esiste
+        raise HTTPException(status_code=404, detail="Folder not found")
     except Exception as e:
         logger.error(f"Error creating note: {e}")
         raise HTTPException(status_code=500, detail="Error creating note")
 
 @api_router.put("/notes/{note_id}", response_model=Note)
-async def update_note(note_id: str, note_update: NoteUpdate):
+async def update_note(
+    note_id: str,
+    note_update: NoteUpdate,
+    request: Request,
+    response: Response,
+    create_tags: bool = Query(False, description="Create tags that do not exist yet"),
+    autosave: bool = Query(False, description="Coalesce with other autosaves (group commit)"),
+    adb: AsyncNotesDatabase = Depends(get_db),
+    queue: AutosaveQueue = Depends(get_autosave)
+):
     """Aggiorna appunto"""
     try:
-        updated_note = db.update_note(
-            note_id=note_id,
-            title=note_update.title,
-            content=note_update.content,
-            tag_names=note_update.tag_names
-        )
+        if autosave:
+            updated_note = await queue.submit(note_id, {
+                "title": note_update.title,
+                "content": note_update.content,
+                "tag_names": note_update.tag_names,
+                "auto_create_tags": create_tags,
+            })
+        else:
+            try:
+                updated_note = await adb.update_note(
+                    note_id=note_id,
+                    title=note_update.title,
+                    content=note_update.content,
+                    tag_names=note_update.tag_names,
+                    auto_create_tags=create_tags
+                )
+            except sqlite3.IntegrityError:
+                # Chiave esterna: l'appunto è stato eliminato nel frattempo
+                updated_note = None
         if not updated_note:
             raise HTTPException(status_code=404, detail="Note not found")
-        return updated_note
+        return respond(request, response, updated_note, NOTE_SHAPE)
     except HTTPException:
         raise
     except Exception as e:
@@ -172,10 +456,10 @@ async def update_note(note_id: str, note_update: NoteUpdate):
         raise HTTPException(status_code=500, detail="Error updating note")
 
 @api_router.delete("/notes/{note_id}")
-async def delete_note(note_id: str):
+async def delete_note(note_id: str, adb: AsyncNotesDatabase = Depends(get_db)):
     """Elimina appunto"""
     try:
-        success = db.delete_note(note_id)
+        success = await adb.delete_note(note_id)
         if not success:
             raise HTTPException(status_code=404, detail="Note not found")
         return {"message": "Note deleted successfully"}
@@ -186,39 +470,246 @@ async def delete_note(note_id: str):
         raise HTTPException(status_code=500, detail="Error deleting note")
 
 @api_router.get("/notes/{note_id}/history", response_model=List[NoteHistoryEntry])
-async def get_note_history(note_id: str):
+async def get_note_history(
+    note_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size"),
+    offset: int = Query(0, ge=0, description="Number of versions to skip"),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
     """Ottieni storico modifiche appunto"""
+    # Verifica che l'appunto esista (prima del 304, come get_note)
+    if not await adb.note_exists(note_id):
+        raise HTTPException(status_code=404, detail="Note not found")
+    not_modified = conditional(request, response, *await adb.data_version("notes"))
+    if not_modified:
+        return not_modified
     try:
-        # Verifica che l'appunto esista
-        note = db.get_note_by_id(note_id)
-        if not note:
-            raise HTTPException(status_code=404, detail="Note not found")
-        
-        history = db.get_note_history(note_id)
-        return history
+        history = await adb.get_note_history(note_id, limit=limit, offset=offset)
+        if limit is not None:
+            response.headers["X-Total-Count"] = str(await adb.count_note_history(note_id))
+        return respond_list(request, response, history, HISTORY_SHAPE)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error getting note history: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving note history")
 
-# Include API router
-app.include_router(api_router)
+@api_router.get("/notes/{note_id}/history/{version}", response_model=NoteHistoryEntry)
+async def get_note_version(note_id: str, version: int, request: Request, response: Response,
+                           adb: AsyncNotesDatabase = Depends(get_db)):
+    """Ottieni una singola versione di un appunto"""
+    try:
+        entry = await adb.get_note_version(note_id, version)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Version not found")
+        return respond(request, response, entry, HISTORY_SHAPE)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting note version: {e}")
+        raise HTTPException(status_code=500, detail="Error retrieving note version")
 
-# Serve React static files in production
-# In development, React dev server handles this
-static_path = Path(__file__).parent.parent / "frontend" / "build"
-if static_path.exists():
-    app.mount("/", StaticFiles(directory=static_path, html=True), name="static")
-    logger.info(f"Serving static files from {static_path}")
-else:
-    logger.info("Static files not found - running in development mode")
+@api_router.get("/notes/{note_id}/diff", response_model=NoteDiff)
+async def diff_note_versions(
+    note_id: str,
+    from_version: int = Query(..., alias="from", ge=1),
+    to_version: int = Query(..., alias="to", ge=1),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
+    """Differenze (unified diff) tra due versioni di un appunto"""
+    try:
+        diff = await adb.diff_note_versions(note_id, from_version, to_version)
+        if diff is None:
+            raise HTTPException(status_code=404, detail="Version not found")
+        return {"note_id": note_id, "from_version": from_version,
+                "to_version": to_version, "diff": diff}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error diffing note versions: {e}")
+        raise HTTPException(status_code=500, detail="Error computing diff")
 
-@app.on_event("startup")
-async def startup():
+# CHANGE FEED
+@api_router.get("/changes", response_model=ChangeFeed)
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="Last seen sequence number (default: now)"),
+    limit: int = Query(500, ge=1, le=5000),
+    timeout: float = Query(25.0, ge=0, le=60, description="Seconds to wait for new changes"),
+    adb: AsyncNotesDatabase = Depends(get_db),
+    notifier: ChangeNotifier = Depends(get_notifier)
+):
+    """Modifiche successive a `since` (long-poll: attende se non ce ne sono)"""
+    try:
+        if since is None:
+            since = await adb.latest_change_seq()
+        changes = await notifier.changes_after(
+            lambda seq: adb.get_changes(seq, limit), since, timeout
+        )
+        return {"last_seq": changes[-1]["seq"] if changes else since, "changes": changes}
+    except Exception as e:
+        logger.error(f"Error fetching changes: {e}")
+        raise HTTPException(status_code=500, detail="Error fetching changes")
+
+@api_router.get("/changes/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Last seen sequence number (default: now)"),
+    adb: AsyncNotesDatabase = Depends(get_db),
+    notifier: ChangeNotifier = Depends(get_notifier)
+):
+    """Stream Server-Sent Events delle modifiche (riprende da Last-Event-ID)"""
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = await adb.latest_change_seq()
+    
+    async def events(since):
+        # Indica al client dopo quanto riconnettersi se lo stream cade
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            changes = await notifier.changes_after(adb.get_changes, since, SSE_HEARTBEAT)
+            if not changes:
+                yield ": keep-alive\n\n"
+                continue
+            yield "".join(
+                f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+                for change in changes
+            )
+            since = changes[-1]["seq"]
+    
+    return StreamingResponse(
+        events(since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# SYNC
+@api_router.get("/sync", response_model=SyncResponse)
+async def sync(
+    request: Request,
+    response: Response,
+    since: Optional[str] = Query(None, description="Token returned by the previous sync"),
+    limit: int = Query(1000, ge=1, le=10000, description="Max change log entries per call"),
+    adb: AsyncNotesDatabase = Depends(get_db)
+):
+    """Sincronizzazione incrementale: solo le entità cambiate dal token"""
+    try:
+        return respond(request, response, await adb.sync(since, limit), SYNC_SHAPE)
+    except InvalidSyncToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SyncTokenExpired:
+        raise HTTPException(status_code=410, detail="Sync token expired, full sync required")
+    except Exception as e:
+        logger.error(f"Error syncing: {e}")
+        raise HTTPException(status_code=500, detail="Error syncing")
+
+# IMPORT / EXPORT
+@api_router.get("/export")
+async def export_notes(adb: AsyncNotesDatabase = Depends(get_db)):
+    """Esporta tutti gli appunti in NDJSON, in streaming"""
+    def chunks():
+        # Un blocco di righe per volta invece di una scrittura per appunto
+        lines = []
+        for note in adb.db.export_notes():
+            lines.append(dumps(note))
+            if len(lines) >= 500:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    
+    return StreamingResponse(
+        chunks(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="notes.ndjson"'}
+    )
+
+async def prune_change_log_periodically(adb: AsyncNotesDatabase, interval: float):
+    """Elimina le voci scadute del change log all'avvio e poi ogni `interval` secondi"""
+    while True:
+        try:
+            pruned = await adb.prune_change_log()
+            if pruned:
+                logger.info(f"Pruned {pruned} change log entries")
+        except Exception as e:
+            logger.error(f"Error pruning change log: {e}")
+        await asyncio.sleep(interval)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Apre il database all'avvio e lo chiude allo spegnimento"""
+    settings = app.state.settings
+    db = NotesDatabase.from_settings(settings)
+    adb = AsyncNotesDatabase(db, readers=settings.read_threads)
+    
+    # Notifiche del change feed ai client in attesa
+    notifier = ChangeNotifier()
+    notifier.attach(asyncio.get_running_loop())
+    db.add_change_listener(notifier.notify)
+    
+    app.state.db = adb
+    app.state.notifier = notifier
+    app.state.autosave = AutosaveQueue(adb, window=settings.autosave_window)
+    
+    interval = max(1.0, min(PRUNE_INTERVAL, settings.change_retention_days * 24 * 3600))
+    pruning = asyncio.create_task(prune_change_log_periodically(adb, interval))
     logger.info("🚀 Notes Dashboard API started successfully")
     logger.info(f"📁 Database location: {db.db_path}")
+    try:
+        yield
+    finally:
+        pruning.cancel()
+        with suppress(asyncio.CancelledError):
+            await pruning
+        await app.state.autosave.close()
+        adb.close()
+        db.close()
+
+def create_app(settings: Settings = None) -> FastAPI:
+    """Crea l'applicazione; il database viene aperto solo all'avvio (lifespan)"""
+    app = FastAPI(title="Notes Dashboard API", version="1.0.0", lifespan=lifespan)
+    app.state.settings = settings or get_settings()
+    
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified"],
+    )
+    
+    # Compressione delle risposte grandi (gzip, o brotli se disponibile)
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+    
+    # Latenza e dimensione delle richieste (/api/metrics): per ultimo, così
+    # è il middleware più esterno
+    if app.state.settings.metrics:
+        app.state.metrics = metrics.HttpMetrics()
+        app.add_middleware(metrics.MetricsMiddleware, metrics=app.state.metrics)
+    
+    # Include API router
+    app.include_router(api_router)
+    
+    # Serve React static files in production
+    # In development, React dev server handles this
+    static_path = Path(__file__).parent.parent / "frontend" / "build"
+    if static_path.exists():
+        app.mount("/", StaticFiles(directory=static_path, html=True), name="static")
+        logger.info(f"Serving static files from {static_path}")
+    else:
+        logger.info("Static files not found - running in development mode")
+    
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    settings = get_settings()
+    # Con più worker uvicorn importa l'app in ogni processo: serve il percorso, non l'oggetto
+    uvicorn.run("server:app", host=settings.host, port=settings.port, workers=settings.workers)
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, get_args, get_type_hints
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Configurazione del backend, letta dalle variabili d'ambiente (o da `.env`).
+
+    Ogni campo corrisponde alla variabile `NOTES_<NOME>`, ad esempio
+    `NOTES_DB_PATH=/tmp/notes.db`.
+    """
+    db_path: str = '/app/data/notes.db'
+    db_pool_size: int = 8
+    db_pool_timeout: float = 10.0
+    cache_size: int = 256
+    cache_ttl: float = 60.0
+    # Testi decompressi del content store tenuti in memoria (milioni di caratteri)
+    content_cache_mb: float = 32.0
+    change_retention_days: float = 30.0
+    # Thread per le letture (default: dimensione del pool - 1)
+    read_threads: Optional[int] = None
+    # Salvataggio automatico: finestra di raggruppamento delle scritture (s)
+    # e intervallo minimo tra due versioni nello storico (s)
+    autosave_window: float = 0.2
+    history_window: float = 60.0
+    # Metriche (/api/metrics): misura delle richieste e delle query, e soglia
+    # oltre la quale una query finisce nel log con il suo piano
+    metrics: bool = True
+    slow_query_ms: float = 100.0
+    # Risposte JSON serializzate senza rivalidazione dei modelli (orjson se
+    # installato); false: response_model di FastAPI, per confronto
+    fast_json: bool = True
+    # Inserisce cartelle e tag di esempio in un database vuoto
+    seed: bool = True
+    # Server (python server.py): con workers > 1 più processi condividono il database
+    host: str = '0.0.0.0'
+    port: int = 8001
+    workers: int = 1
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'Settings':
+        hints = get_type_hints(cls)
+        values = {}
+        for field in fields(cls):
+            raw = os.environ.get(f'NOTES_{field.name.upper()}')
+            if not raw:
+                continue
+            # Optional[X] -> X
+            kind = next((arg for arg in get_args(hints[field.name]) if arg is not type(None)),
+                        hints[field.name])
+            if kind is bool:
+                values[field.name] = raw.lower() in ('1', 'true', 'yes', 'on')
+            else:
+                values[field.name] = kind(raw)
+        return replace(cls(**values), **overrides)
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings.from_env()
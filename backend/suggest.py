@@ -0,0 +1,220 @@
+from typing import Any, Dict, List, Tuple
+
+# Suggerimenti per l'apertura rapida (GET /api/notes/suggest): indici FTS5
+# con tokenizer trigram sui titoli degli appunti e sui nomi dei tag,
+# sincronizzati con `notes` e `tags` tramite trigger come notes_fts. Un
+# trigram indicizza ogni sequenza di 3 caratteri, quindi risponde a
+# ricerche per sottostringa (anche a metà parola) e a pattern LIKE come
+# '%pyt_on%', usati per le parole con un errore di battitura.
+SUGGEST_SCHEMA = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_title_fts USING fts5(
+        title,
+        content='notes',
+        content_rowid='rowid',
+        tokenize='trigram'
+    )
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS tags_name_fts USING fts5(
+        name,
+        content='tags',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_title_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_title_fts (rowid, title) VALUES (new.rowid, new.title);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_title_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_title_fts (notes_title_fts, rowid, title)
+        VALUES ('delete', old.rowid, old.title);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_title_fts_update AFTER UPDATE OF title ON notes BEGIN
+        INSERT INTO notes_title_fts (notes_title_fts, rowid, title)
+        VALUES ('delete', old.rowid, old.title);
+        INSERT INTO notes_title_fts (rowid, title) VALUES (new.rowid, new.title);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS tags_name_fts_insert AFTER INSERT ON tags BEGIN
+        INSERT INTO tags_name_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS tags_name_fts_delete AFTER DELETE ON tags BEGIN
+        INSERT INTO tags_name_fts (tags_name_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS tags_name_fts_update AFTER UPDATE OF name ON tags BEGIN
+        INSERT INTO tags_name_fts (tags_name_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO tags_name_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    ''',
+]
+
+# Caratteri considerati del testo digitato
+MAX_PREFIX_LENGTH = 100
+# Candidati letti dall'indice, i più recenti per rowid (vedi RECENT_WINDOW)
+CANDIDATES = 200
+# Testi più corti di un trigram: prefisso cercato solo tra gli appunti
+# modificati più di recente
+SHORT_PREFIX_WINDOW = 1000
+# I candidati dell'indice sono i più recenti per creazione (rowid): vi si
+# aggiungono le corrispondenze tra gli appunti modificati più di recente,
+# così un appunto vecchio appena modificato non resta escluso. Oltre questa
+# finestra l'ordine per updated_at vale solo tra i candidati (ordinarli
+# tutti costerebbe una lettura per ogni titolo che contiene il testo)
+RECENT_WINDOW = 200
+# Ricerca con errori, solo se nessun titolo contiene il testo: le parole
+# trovate nell'indice restringono i candidati, le altre devono comparire
+# nel titolo con al più un errore (lettera sbagliata, mancante, in più o
+# due lettere scambiate). Se nessuna parola è nell'indice i candidati
+# vengono dalle varianti con un errore della parola più lunga
+FUZZY_CANDIDATES = 200
+FUZZY_MIN_LENGTH = 4
+# Le varianti con un carattere jolly servono solo se hanno almeno tanti
+# caratteri consecutivi noti: altrimenti FTS5 non può usare l'indice
+FUZZY_MIN_SEGMENT = 4
+# Parole più corte perdono alcune varianti: i candidati vengono anche dai
+# titoli con almeno uno dei loro trigram e dalla finestra RECENT_WINDOW
+# (un errore a metà di una parola di 4 lettere non lascia trigram intatti)
+FUZZY_SHORT_WORD = 2 * FUZZY_MIN_SEGMENT
+
+# Livelli di corrispondenza, dal migliore
+TIER_PREFIX = 0
+TIER_WORD_PREFIX = 1
+TIER_SUBSTRING = 2
+TIER_FUZZY = 3
+
+
+def normalize(text: str) -> str:
+    """Testo digitato in minuscolo, spazi compattati"""
+    return ' '.join((text or '').lower().split())[:MAX_PREFIX_LENGTH]
+
+
+def phrase(text: str) -> str:
+    """Stringa FTS5 tra virgolette: con il tokenizer trigram è una sottostringa"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def match_query(text: str) -> str:
+    """Espressione MATCH per le parole di almeno 3 caratteri (in AND,
+    in qualsiasi ordine); stringa vuota se non ce ne sono"""
+    return ' '.join(phrase(word) for word in text.split(' ') if len(word) >= 3)
+
+
+def _escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def like_prefix(text: str) -> Tuple[str, str]:
+    """Pattern LIKE (con ESCAPE '\\') per titolo e parola che iniziano con `text`"""
+    escaped = _escape_like(text)
+    return f'{escaped}%', f'% {escaped}%'
+
+
+def like_words(text: str) -> List[str]:
+    """Pattern LIKE (con ESCAPE '\\'), uno per parola di match_query"""
+    return [f'%{_escape_like(word)}%' for word in text.split(' ') if len(word) >= 3]
+
+
+def trigram_query(word: str) -> str:
+    """Espressione MATCH dei titoli che contengono almeno un trigram di `word`"""
+    return ' OR '.join(phrase(word[i:i + 3]) for i in range(len(word) - 2))
+
+
+def edit_patterns(word: str) -> List[str]:
+    """Pattern LIKE dei titoli che contengono `word` con al più un errore.
+
+    FTS5 usa l'indice trigram solo per LIKE senza ESCAPE: le parole con
+    `%` o `_` non hanno varianti.
+    """
+    if '%' in word or '_' in word:
+        return []
+    variants = {word, f'{word}_'}
+    for i in range(len(word)):
+        variants.add(word[:i] + '_' + word[i + 1:])   # lettera sbagliata
+        variants.add(word[:i] + '_' + word[i:])       # lettera mancante
+        variants.add(word[:i] + word[i + 1:])         # lettera in più
+        if i < len(word) - 1:
+            variants.add(word[:i] + word[i + 1] + word[i] + word[i + 2:])
+    return sorted(
+        f'%{variant}%' for variant in variants
+        if max(len(segment) for segment in variant.split('_')) >= FUZZY_MIN_SEGMENT
+    )
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Distanza di Damerau-Levenshtein (con scambi adiacenti) al più 1"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+
+
+def fuzzy_match(text: str, title: str) -> bool:
+    """Ogni parola del testo è nel titolo, o è a un errore dall'inizio di
+    una parola del titolo (si sta ancora scrivendo)"""
+    title = title.lower()
+    title_words = title.split()
+    for word in text.split(' '):
+        if word in title:
+            continue
+        if len(word) < FUZZY_MIN_LENGTH:
+            return False
+        lengths = (len(word) - 1, len(word), len(word) + 1)
+        if not any(within_one_edit(word, candidate[:length])
+                   for candidate in title_words for length in lengths if length <= len(candidate)):
+            return False
+    return True
+
+
+def tier(text: str, title: str) -> int:
+    """Livello di corrispondenza esatta di `text` (normalizzato) in `title`,
+    TIER_FUZZY se una delle parole manca"""
+    title = ' '.join(title.lower().split())
+    if title.startswith(text):
+        return TIER_PREFIX
+    words = text.split(' ')
+    if all(word in title for word in words):
+        padded = f' {title}'
+        if all(f' {word}' in padded for word in words):
+            return TIER_WORD_PREFIX
+        return TIER_SUBSTRING
+    return TIER_FUZZY
+
+
+def rank(text: str, rows: List[Dict[str, Any]], limit: int,
+         key: str = 'title', recency: str = None) -> List[Dict[str, Any]]:
+    """Migliori `limit` righe per livello di corrispondenza, poi `recency`
+    più recente (o `key` in ordine alfabetico); le righe che non
+    corrispondono nemmeno con un errore vengono scartate"""
+    scored = []
+    for row in rows:
+        level = tier(text, row[key])
+        if level == TIER_FUZZY and not fuzzy_match(text, row[key]):
+            continue
+        scored.append((level, row))
+
+    # Ordinamenti stabili: prima il criterio secondario
+    if recency:
+        scored.sort(key=lambda item: item[1][recency], reverse=True)
+    else:
+        scored.sort(key=lambda item: item[1][key].lower())
+    scored.sort(key=lambda item: item[0])
+    return [row for _, row in scored[:limit]]
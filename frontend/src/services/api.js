@@ -61,6 +61,15 @@ class NotesAPI {
     return response.data;
   }
 
+  // Salvataggio automatico durante l'editing: il backend raggruppa le
+  // scritture ravvicinate in un solo commit
+  async autosaveNote(id, noteData) {
+    const response = await axios.put(`${API_BASE}/notes/${id}`, noteData, {
+      params: { autosave: true },
+    });
+    return response.data;
+  }
+
   async deleteNote(id) {
     const response = await axios.delete(`${API_BASE}/notes/${id}`);
     return response.data;
@@ -71,6 +80,25 @@ class NotesAPI {
     return response.data;
   }
 
+  // CHANGE FEED
+  async getChanges(since, timeout = 25) {
+    const response = await axios.get(`${API_BASE}/changes`, {
+      params: { since, timeout },
+      timeout: (timeout + 5) * 1000,
+    });
+    return response.data;
+  }
+
+  // Stream SSE delle modifiche: onChange riceve { seq, entity, op, id }.
+  // Il browser si riconnette da solo riprendendo dall'ultimo id ricevuto.
+  // Restituisce l'EventSource, da chiudere con close().
+  subscribeChanges(onChange, since) {
+    const query = since !== undefined ? `?since=${since}` : '';
+    const source = new EventSource(`${API_BASE}/changes/stream${query}`);
+    source.addEventListener('change', (event) => onChange(JSON.parse(event.data)));
+    return source;
+  }
+
   // HEALTH CHECK
   async healthCheck() {
     const response = await axios.get(`${API_BASE}/`);
@@ -0,0 +1,52 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# I moduli del backend si importano per nome (come in server.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import migrations  # noqa: E402
+from database import NotesDatabase  # noqa: E402
+from settings import Settings  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Database vuoto, senza dati di esempio"""
+    db = NotesDatabase(str(tmp_path / 'notes.db'), seed=False)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Client HTTP dell'applicazione su un database vuoto"""
+    from fastapi.testclient import TestClient
+    from server import create_app
+
+    app = create_app(Settings(db_path=str(tmp_path / 'notes.db'), seed=False))
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """Crea un database con le sole migrazioni fino a `version` (formato di
+    allora): restituisce la connessione, il percorso si apre poi con NotesDatabase"""
+    connections = []
+
+    def create(version: int) -> sqlite3.Connection:
+        conn = sqlite3.connect(tmp_path / 'notes.db')
+        conn.row_factory = sqlite3.Row
+        connections.append(conn)
+        with monkeypatch.context() as patch:
+            patch.setattr(migrations, 'MIGRATIONS',
+                          [migration for migration in migrations.MIGRATIONS if migration[0] <= version])
+            migrations.apply_migrations(conn)
+        return conn
+
+    yield create
+    for conn in connections:
+        conn.close()
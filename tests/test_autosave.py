@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from async_db import AsyncNotesDatabase
+from autosave import AutosaveQueue
+from database import AUTOSAVE_CHANGES, NotesDatabase
+
+
+@pytest.fixture
+def adb(db):
+    adb = AsyncNotesDatabase(db)
+    yield adb
+    adb.close()
+
+
+def test_submits_in_window_share_one_commit(adb):
+    note = adb.db.create_note('Draft', 'v1', 'text')
+    other = adb.db.create_note('Other', 'o1', 'text')
+
+    async def edit():
+        queue = AutosaveQueue(adb, window=0.05)
+        results = await asyncio.gather(
+            queue.submit(note['id'], {'title': 'Draft, renamed'}),
+            queue.submit(note['id'], {'content': 'v2'}),
+            queue.submit(other['id'], {'content': 'o2'}),
+            queue.submit('missing', {'content': 'x'}),
+        )
+        await queue.close()
+        return results, queue.stats()
+
+    results, stats = asyncio.run(edit())
+    # Entrambe le richieste dello stesso appunto ricevono i campi fusi
+    for result in results[:2]:
+        assert (result['title'], result['content']) == ('Draft, renamed', 'v2')
+    assert results[2]['content'] == 'o2'
+    assert results[3] is None
+    assert (stats['requests'], stats['merged'], stats['commits'], stats['notes_written']) == (4, 1, 1, 3)
+    assert adb.db.get_note_by_id(note['id'])['title'] == 'Draft, renamed'
+
+
+def test_last_value_of_a_field_wins(adb):
+    note = adb.db.create_note('Draft', 'v1', 'text')
+
+    async def edit():
+        queue = AutosaveQueue(adb, window=0.05)
+        await asyncio.gather(*(queue.submit(note['id'], {'content': f'v{i}'}) for i in range(2, 6)))
+        await queue.close()
+
+    asyncio.run(edit())
+    assert adb.db.get_note_by_id(note['id'])['content'] == 'v5'
+
+
+class FailingDatabase:
+    async def apply_autosaves(self, updates):
+        raise RuntimeError('disk full')
+
+
+def test_failed_commit_reaches_every_waiter():
+    async def edit():
+        queue = AutosaveQueue(FailingDatabase(), window=0.01)
+        results = await asyncio.gather(
+            queue.submit('a', {'content': '1'}),
+            queue.submit('a', {'title': 't'}),
+            queue.submit('b', {'content': '2'}),
+            return_exceptions=True,
+        )
+        return results, queue.stats()
+
+    results, stats = asyncio.run(edit())
+    assert [str(result) for result in results] == ['disk full'] * 3
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert (stats['errors'], stats['commits']) == (1, 0)
+
+
+def test_cancelled_request_does_not_cancel_the_save(adb):
+    note = adb.db.create_note('Draft', 'v1', 'text')
+
+    async def edit():
+        queue = AutosaveQueue(adb, window=0.05)
+        cancelled = asyncio.create_task(queue.submit(note['id'], {'content': 'v2'}))
+        waiting = asyncio.create_task(queue.submit(note['id'], {'title': 'Renamed'}))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        result = await waiting
+        await queue.close()
+        return cancelled, result
+
+    cancelled, result = asyncio.run(edit())
+    assert cancelled.cancelled()
+    assert (result['title'], result['content']) == ('Renamed', 'v2')
+
+
+def history(db, note_id):
+    return [(entry['version'], entry['content'], entry['changes']) for entry in db.get_note_history(note_id)]
+
+
+def test_autosaves_amend_the_last_autosave_version(tmp_path):
+    db = NotesDatabase(str(tmp_path / 'notes.db'), seed=False, history_window=60)
+    try:
+        note = db.create_note('Script', 'v1', 'code')
+        db.apply_autosaves({note['id']: {'content': 'v2'}})
+        db.apply_autosaves({note['id']: {'content': 'v3'}})
+        # Salvataggio esplicito: sempre una nuova versione
+        db.update_note(note['id'], content='v4')
+        db.apply_autosaves({note['id']: {'content': 'v5'}})
+        db.apply_autosaves({note['id']: {'content': 'v6'}})
+
+        assert history(db, note['id']) == [
+            (1, 'v1', 'Versione iniziale'),
+            (2, 'v3', AUTOSAVE_CHANGES),
+            (3, 'v4', 'Modifica contenuto'),
+            (4, 'v6', AUTOSAVE_CHANGES),
+        ]
+    finally:
+        db.close()
+
+
+def test_autosaves_outside_the_window_append(tmp_path):
+    db = NotesDatabase(str(tmp_path / 'notes.db'), seed=False, history_window=0)
+    try:
+        note = db.create_note('Script', 'v1', 'code')
+        for content in ('v2', 'v3'):
+            db.apply_autosaves({note['id']: {'content': content}})
+        assert [version for version, _, _ in history(db, note['id'])] == [1, 2, 3]
+    finally:
+        db.close()
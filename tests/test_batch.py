@@ -0,0 +1,103 @@
+import pytest
+
+
+@pytest.fixture
+def notes(db):
+    """Titolo -> id di alcuni appunti con tag, in due cartelle"""
+    db.create_folder('Work')
+    work = db.get_folders()[0]['id']
+    ids = {}
+    for title, folder_id, tags in (
+        ('Alpha', work, ['python']),
+        ('Beta', work, ['python', 'todo']),
+        ('Gamma', None, ['todo']),
+        ('Delta', None, []),
+    ):
+        note = db.create_note(title, f'{title} body', 'text', folder_id, tags, auto_create_tags=True)
+        ids[title] = note['id']
+    return ids
+
+
+def titles(db, **filters):
+    return sorted(note['title'] for note in db.get_notes(fields='list', **filters))
+
+
+def test_move_by_ids(db, notes):
+    archive = db.create_folder('Archive')
+    result = db.batch_update_notes('move', note_ids=[notes['Gamma'], notes['Delta'], 'missing'],
+                                   folder_id=archive['id'])
+    assert result == {'op': 'move', 'matched': 2, 'affected': 2}
+    assert titles(db, folder_id=archive['id']) == ['Delta', 'Gamma']
+
+    # Nessuna cartella: appunti non archiviati
+    db.batch_update_notes('move', note_ids=[notes['Gamma']], folder_id=None)
+    assert db.get_note_by_id(notes['Gamma'])['folder_id'] is None
+    assert db.check_counters() == []
+
+
+def test_tag_and_untag(db, notes):
+    result = db.batch_update_notes('tag', note_ids=list(notes.values()), tag_names=['python', 'new'],
+                                   auto_create_tags=True)
+    # Alpha e Beta avevano già python
+    assert result == {'op': 'tag', 'matched': 4, 'affected': 6}
+    assert titles(db, tag='new') == ['Alpha', 'Beta', 'Delta', 'Gamma']
+
+    result = db.batch_update_notes('untag', filters={'tag': 'todo'}, tag_names=['todo', 'python'])
+    assert result == {'op': 'untag', 'matched': 2, 'affected': 4}
+    assert titles(db, tag='todo') == []
+    assert titles(db, tag='python') == ['Alpha', 'Delta']
+    assert db.check_counters() == []
+
+
+def test_unknown_tags_without_auto_create(db, notes):
+    result = db.batch_update_notes('tag', note_ids=[notes['Delta']], tag_names=['nope'])
+    assert result['affected'] == 0
+    assert 'nope' not in [tag['name'] for tag in db.get_tags()]
+
+
+@pytest.mark.parametrize('filters, deleted', [
+    ({'tag': 'todo'}, ['Beta', 'Gamma']),
+    ({'q': 'tag:python -tag:todo'}, ['Alpha']),
+    ({'search': 'gamma'}, ['Gamma']),
+    # Testo senza parole cercabili: nessun appunto
+    ({'q': '???'}, []),
+])
+def test_delete_by_filter(db, notes, filters, deleted):
+    result = db.batch_update_notes('delete', filters=filters)
+    assert (result['matched'], result['affected']) == (len(deleted), len(deleted))
+    assert titles(db) == sorted(set(notes) - set(deleted))
+
+
+def test_delete_by_folder(db, notes):
+    work = db.get_note_by_id(notes['Alpha'])['folder_id']
+    db.batch_update_notes('delete', filters={'folder_id': work})
+    assert titles(db) == ['Delta', 'Gamma']
+    assert db.check_counters() == []
+
+
+@pytest.mark.parametrize('filters', [{}, {'search': '!!!'}, {'search': '  ', 'tag': None}, {'q': ''}])
+def test_filter_without_condition_is_rejected(db, notes, filters):
+    with pytest.raises(ValueError, match='no condition'):
+        db.batch_update_notes('delete', filters=filters)
+    assert len(titles(db)) == 4
+
+
+def test_batch_endpoint_errors(client):
+    note = client.post('/api/notes', json={'title': 'A', 'content': 'a', 'type': 'text'}).json()
+
+    response = client.post('/api/notes/batch', json={'op': 'move', 'ids': [note['id']], 'folder_id': 'missing'})
+    assert response.status_code == 404
+    for body in (
+        {'op': 'delete', 'filter': {}},
+        {'op': 'delete', 'filter': {'search': ' '}},
+        {'op': 'delete', 'ids': [note['id']], 'filter': {'tag': 'x'}},
+        {'op': 'tag', 'ids': [note['id']]},
+    ):
+        assert client.post('/api/notes/batch', json=body).status_code == 422
+    # Passa la validazione del modello, ma non è una condizione
+    assert client.post('/api/notes/batch', json={'op': 'delete', 'filter': {'search': '!!!'}}).status_code == 400
+    assert client.get(f"/api/notes/{note['id']}").status_code == 200
+
+    response = client.post('/api/notes/batch', json={'op': 'delete', 'ids': [note['id']]})
+    assert response.json() == {'op': 'delete', 'matched': 1, 'affected': 1}
+    assert client.get(f"/api/notes/{note['id']}").status_code == 404
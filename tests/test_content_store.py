@@ -0,0 +1,121 @@
+import history
+from content_store import CODEC_RAW, CODEC_ZLIB, content_hash
+from database import NotesDatabase
+
+LONG_TEXT = 'def handler(event):\n    return event\n' * 50
+
+
+def content_id(db, note_id):
+    with db.get_connection() as conn:
+        return conn.execute('SELECT content_id FROM notes WHERE id = ?', (note_id,)).fetchone()[0]
+
+
+def stored(db, content_id):
+    with db.get_connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM note_contents WHERE id = ?', (content_id,)).fetchone()[0] == 1
+
+
+def test_identical_bodies_are_stored_once(db):
+    first = db.create_note('First', LONG_TEXT, 'text')
+    second = db.create_note('Second', LONG_TEXT, 'text')
+    code = db.create_note('Code', LONG_TEXT, 'code')
+
+    assert content_id(db, first['id']) == content_id(db, second['id']) == content_id(db, code['id'])
+    with db.get_connection() as conn:
+        rows = conn.execute('SELECT hash, codec FROM note_contents').fetchall()
+        # Anche lo snapshot della versione iniziale usa lo stesso testo
+        history_ids = {row[0] for row in conn.execute('SELECT content_id FROM note_history')}
+    assert [(row['hash'], row['codec']) for row in rows] == [(content_hash(LONG_TEXT), CODEC_ZLIB)]
+    assert history_ids == {content_id(db, code['id'])}
+    assert db.get_note_by_id(second['id'])['content'] == LONG_TEXT
+
+
+def test_short_bodies_are_not_compressed(db):
+    note = db.create_note('Short', 'hello', 'text')
+    with db.get_connection() as conn:
+        codec = conn.execute('SELECT codec FROM note_contents WHERE id = ?',
+                             (content_id(db, note['id']),)).fetchone()[0]
+    assert codec == CODEC_RAW
+
+
+def test_body_is_collected_after_last_note(db):
+    first = db.create_note('First', 'shared body', 'text')
+    second = db.create_note('Second', 'shared body', 'text')
+    shared = content_id(db, first['id'])
+
+    db.update_note(first['id'], content='other body')
+    assert stored(db, shared)
+    db.delete_note(second['id'])
+    assert not stored(db, shared)
+    assert stored(db, content_id(db, first['id']))
+
+
+def test_body_is_kept_while_history_uses_it(db):
+    note = db.create_note('Code', 'print(1)\n', 'code')
+    initial = content_id(db, note['id'])
+
+    db.update_note(note['id'], content='print(2)\n')
+    # Lo snapshot della versione 1 lo usa ancora
+    assert stored(db, initial)
+    assert db.get_note_version(note['id'], 1)['content'] == 'print(1)\n'
+
+    # Eliminando l'appunto lo storico va in cascata: nessun testo resta
+    db.delete_note(note['id'])
+    with db.get_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM note_contents').fetchone()[0] == 0
+
+
+def test_search_follows_content_changes(db):
+    note = db.create_note('Note', 'alpha beta', 'text')
+    db.update_note(note['id'], content='gamma delta')
+    assert db.search_notes('alpha') == []
+    assert [result['id'] for result in db.search_notes('gamma')] == [note['id']]
+
+
+def test_migrating_to_content_store(legacy_db, tmp_path):
+    # Schema prima della migrazione 9: testo in `notes.content`, snapshot in note_history.data
+    conn = legacy_db(8)
+    conn.execute("INSERT INTO folders (id, name) VALUES ('work', 'Work')")
+    conn.executemany('INSERT INTO notes (id, title, content, type, folder_id) VALUES (?, ?, ?, ?, ?)', [
+        ('n1', 'Handler', LONG_TEXT, 'code', 'work'),
+        ('n2', 'Copy', LONG_TEXT, 'text', None),
+        ('n3', 'Groceries', 'milk eggs bread', 'list', None),
+    ])
+    versions = [f'version {v}\n' for v in range(1, history.SNAPSHOT_INTERVAL + 3)] + [LONG_TEXT]
+    previous = None
+    for version, text in enumerate(versions, start=1):
+        storage, data = history.encode_version(version, text, previous)
+        conn.execute('''
+            INSERT INTO note_history (note_id, version, content, changes, storage, data)
+            VALUES ('n1', ?, '', 'edit', ?, ?)
+        ''', (version, storage, data))
+        previous = text
+    conn.commit()
+    changes = conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+    conn.close()
+
+    db = NotesDatabase(str(tmp_path / 'notes.db'), seed=False)
+    try:
+        with db.get_connection() as conn:
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(notes)')]
+            storages = {row[0] for row in conn.execute('SELECT DISTINCT storage FROM note_history')}
+            # Spostare i testi non è una modifica da sincronizzare
+            assert conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0] == changes
+            # LONG_TEXT una volta sola per due appunti e l'ultima versione
+            assert conn.execute('SELECT COUNT(*) FROM note_contents').fetchone()[0] == 4
+        assert 'content' not in columns
+        assert storages == {history.STORAGE_STORED, history.STORAGE_DELTA}
+
+        assert db.get_note_by_id('n1')['content'] == LONG_TEXT
+        assert db.get_note_by_id('n3')['content'] == 'milk eggs bread'
+        assert [entry['content'] for entry in db.get_note_history('n1')] == versions
+        assert sorted(result['id'] for result in db.search_notes('handler')) == ['n1', 'n2']
+        assert [result['id'] for result in db.search_notes('eggs')] == ['n3']
+        assert db.get_notes(folder_id='work')[0]['id'] == 'n1'
+
+        # Le scritture dopo la migrazione finiscono di nuovo nel change log
+        db.update_note('n3', content='milk bread')
+        assert db.search_notes('eggs') == []
+        assert db.get_changes(since=changes)[-1]['id'] == 'n3'
+    finally:
+        db.close()
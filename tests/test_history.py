@@ -0,0 +1,139 @@
+import history
+from database import NotesDatabase
+
+# Abbastanza versioni da attraversare almeno due snapshot dopo il primo
+VERSIONS = 2 * history.SNAPSHOT_INTERVAL + 5
+
+
+def version_text(version: int) -> str:
+    """Contenuto della versione `version`: righe modificate, aggiunte e
+    rimosse in punti diversi, ultima riga a volte senza a capo"""
+    lines = [f'line {i} of version {version if i % 7 == version % 7 else 0}\n' for i in range(30)]
+    if version % 3 == 0:
+        del lines[version % 30]
+    if version % 4 == 0:
+        lines.insert(version % 25, f'inserted in {version}\n')
+    text = ''.join(lines)
+    return text.rstrip('\n') if version % 5 == 0 else text
+
+
+def make_history(db, count: int = VERSIONS) -> str:
+    note = db.create_note('Script', version_text(1), 'code')
+    for version in range(2, count + 1):
+        db.update_note(note['id'], content=version_text(version))
+    return note['id']
+
+
+def storages(db, note_id):
+    with db.get_connection() as conn:
+        return dict(conn.execute(
+            'SELECT version, storage FROM note_history WHERE note_id = ? ORDER BY version', (note_id,)
+        ).fetchall())
+
+
+def test_delta_roundtrip():
+    old, new = version_text(3), version_text(4)
+    assert history.apply_delta(old, history.make_delta(old, new)) == new
+    assert history.apply_delta('', history.make_delta('', 'a\nb')) == 'a\nb'
+    assert history.apply_delta('a\nb\n', history.make_delta('a\nb\n', '')) == ''
+
+
+def test_every_version_is_rebuilt(db):
+    note_id = make_history(db)
+
+    entries = db.get_note_history(note_id)
+    assert [entry['version'] for entry in entries] == list(range(1, VERSIONS + 1))
+    assert [entry['content'] for entry in entries] == [version_text(v) for v in range(1, VERSIONS + 1)]
+    for version in range(1, VERSIONS + 1):
+        assert db.get_note_version(note_id, version)['content'] == version_text(version)
+
+    # Uno snapshot ogni SNAPSHOT_INTERVAL versioni, delta in mezzo
+    snapshots = [v for v, storage in storages(db, note_id).items() if storage != history.STORAGE_DELTA]
+    assert snapshots == [1, history.SNAPSHOT_INTERVAL + 1, 2 * history.SNAPSHOT_INTERVAL + 1]
+
+
+def test_history_pages_across_snapshots(db):
+    note_id = make_history(db)
+    first = history.SNAPSHOT_INTERVAL - 3
+    page = db.get_note_history(note_id, limit=history.SNAPSHOT_INTERVAL, offset=first - 1)
+    assert [entry['content'] for entry in page] == [
+        version_text(v) for v in range(first, first + history.SNAPSHOT_INTERVAL)
+    ]
+
+
+def test_legacy_text_rows(db):
+    note = db.create_note('Script', version_text(1), 'code')
+    # Righe scritte prima della compressione: testo in chiaro in `content`
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM note_history WHERE note_id = ?', (note['id'],))
+        conn.executemany(
+            'INSERT INTO note_history (note_id, version, content, changes) VALUES (?, ?, ?, ?)',
+            [(note['id'], version, version_text(version), 'legacy') for version in (1, 2, 3)]
+        )
+        conn.commit()
+
+    # La versione successiva è un delta dalla riga legacy
+    db.update_note(note['id'], content=version_text(4))
+    assert storages(db, note['id']) == {1: 'text', 2: 'text', 3: 'text', 4: history.STORAGE_DELTA}
+    assert [entry['content'] for entry in db.get_note_history(note['id'])] == [
+        version_text(v) for v in (1, 2, 3, 4)
+    ]
+    assert db.get_note_version(note['id'], 3)['content'] == version_text(3)
+
+
+def test_history_endpoint_pagination(client):
+    note = client.post('/api/notes', json={'title': 'Script', 'content': version_text(1), 'type': 'code'}).json()
+    for version in range(2, 26):
+        client.put(f"/api/notes/{note['id']}", json={'content': version_text(version)})
+
+    response = client.get(f"/api/notes/{note['id']}/history", params={'limit': 10, 'offset': 15})
+    assert response.status_code == 200
+    assert response.headers['X-Total-Count'] == '25'
+    assert [entry['version'] for entry in response.json()] == list(range(16, 26))
+    assert [entry['content'] for entry in response.json()] == [version_text(v) for v in range(16, 26)]
+
+    assert client.get(f"/api/notes/{note['id']}/history", params={'offset': 25}).json() == []
+    assert len(client.get(f"/api/notes/{note['id']}/history").json()) == 25
+    assert client.get('/api/notes/missing/history').status_code == 404
+
+
+def test_diff_endpoint(client):
+    note = client.post('/api/notes', json={'title': 'Script', 'content': 'a\nb\nc\n', 'type': 'code'}).json()
+    client.put(f"/api/notes/{note['id']}", json={'content': 'a\nB\nc\n'})
+
+    response = client.get(f"/api/notes/{note['id']}/diff", params={'from': 1, 'to': 2})
+    assert response.status_code == 200
+    assert response.json()['diff'].splitlines()[2:] == ['@@ -1,3 +1,3 @@', ' a', '-b', '+B', ' c']
+    assert client.get(f"/api/notes/{note['id']}/diff", params={'from': 1, 'to': 3}).status_code == 404
+
+
+def test_migrating_plain_history(legacy_db, tmp_path):
+    # Schema prima della migrazione 4: tutte le versioni in chiaro
+    conn = legacy_db(3)
+    conn.execute("INSERT INTO notes (id, title, content, type) VALUES ('n1', 'Script', ?, 'code')",
+                 (version_text(VERSIONS),))
+    conn.executemany(
+        'INSERT INTO note_history (note_id, version, content, changes) VALUES (?, ?, ?, ?)',
+        [('n1', version, version_text(version), 'legacy') for version in range(1, VERSIONS + 1)]
+    )
+    conn.commit()
+    conn.close()
+
+    db = NotesDatabase(str(tmp_path / 'notes.db'), seed=False)
+    try:
+        assert [entry['content'] for entry in db.get_note_history('n1')] == [
+            version_text(v) for v in range(1, VERSIONS + 1)
+        ]
+        kinds = storages(db, 'n1')
+        assert kinds[1] == kinds[history.SNAPSHOT_INTERVAL + 1] == history.STORAGE_STORED
+        assert kinds[2] == kinds[VERSIONS] == history.STORAGE_DELTA
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM note_history WHERE content != ''").fetchone()[0] == 0
+        assert db.get_note_by_id('n1')['content'] == version_text(VERSIONS)
+        assert db.count_note_history('n1') == VERSIONS
+
+        # Le nuove versioni proseguono dallo storico migrato
+        db.update_note('n1', content='new\n')
+        assert db.get_note_version('n1', VERSIONS + 1)['content'] == 'new\n'
+    finally:
+        db.close()
@@ -0,0 +1,27 @@
+from database import NotesDatabase
+
+
+def test_note_etag_does_not_hide_missing_notes(client):
+    note = client.post('/api/notes', json={'title': 'A', 'content': 'a', 'type': 'code'}).json()
+    response = client.get(f"/api/notes/{note['id']}")
+    etag, modified = response.headers['ETag'], response.headers['Last-Modified']
+
+    assert client.get(f"/api/notes/{note['id']}", headers={'If-None-Match': etag}).status_code == 304
+    for path in ('/api/notes/missing', '/api/notes/missing/history'):
+        assert client.get(path, headers={'If-None-Match': etag}).status_code == 404
+        assert client.get(path, headers={'If-Modified-Since': modified}).status_code == 404
+    assert client.get(f"/api/notes/{note['id']}/history", headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_last_modified_is_the_same_in_every_process(tmp_path):
+    # Nessuna voce nel change log: la data viene dal database, non dall'avvio
+    first = NotesDatabase(str(tmp_path / 'notes.db'), seed=False)
+    second = NotesDatabase(str(tmp_path / 'notes.db'), seed=False)
+    try:
+        assert first.data_version('folders') == second.data_version('folders')
+        with first.get_connection() as conn:
+            applied_at = conn.execute("SELECT strftime('%s', MAX(applied_at)) FROM schema_version").fetchone()[0]
+        assert first.data_version('folders')[1] == int(applied_at)
+    finally:
+        first.close()
+        second.close()
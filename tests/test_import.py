@@ -0,0 +1,46 @@
+import json
+
+import server
+
+
+def ndjson(notes):
+    return '\n'.join(json.dumps(note) for note in notes).encode()
+
+
+def note_titles(client):
+    return sorted(note['title'] for note in client.get('/api/notes').json())
+
+
+def test_import_spills_to_disk(client, monkeypatch):
+    # Spool minimo: le righe validate passano dal file temporaneo
+    monkeypatch.setattr(server, 'IMPORT_SPOOL_SIZE', 1024)
+    notes = [{'title': f'Note {i}', 'content': 'x' * 100, 'type': 'text', 'tag_names': ['t']}
+             for i in range(300)]
+    response = client.post('/api/notes/bulk', params={'create_tags': True}, content=ndjson(notes))
+    assert response.status_code == 200
+    assert response.json()['imported'] == 300
+    assert len(note_titles(client)) == 300
+
+
+def test_import_keeps_timestamps(client):
+    body = ndjson([{'title': 'Old', 'content': 'a', 'type': 'text',
+                    'created_at': '2024-01-02T03:04:05+02:00', 'updated_at': '2024-01-02T03:04:05Z'}])
+    assert client.post('/api/notes/bulk', content=body).status_code == 200
+    note = client.get('/api/notes').json()[0]
+    assert note['created_at'].startswith('2024-01-02T01:04:05')
+    assert note['updated_at'].startswith('2024-01-02T03:04:05')
+
+
+def test_invalid_line_rejects_the_whole_import(client):
+    body = ndjson([{'title': 'A', 'content': 'a', 'type': 'text'}]) + b'\n\n{"title": "B", "type": "text"}\n'
+    response = client.post('/api/notes/bulk', content=body)
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith('Line 3:')
+    assert note_titles(client) == []
+
+
+def test_conflict_rolls_back(client):
+    notes = [{'id': 'same', 'title': title, 'content': 'a', 'type': 'text'} for title in ('A', 'B')]
+    response = client.post('/api/notes/bulk', content=ndjson(notes))
+    assert response.status_code == 409
+    assert note_titles(client) == []
@@ -0,0 +1,167 @@
+import re
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from benchmarks.query_plans import full_scans
+from database import NotesDatabase
+from query import And, Not, Or, Sort, Term, Text, QuerySyntaxError, compile_query, parse_query
+
+
+# Parser
+
+@pytest.mark.parametrize('text, expected', [
+    ('', None),
+    ('tag:python', Term('tag', 'python')),
+    ('tag:"my tag"', Term('tag', 'my tag')),
+    ('react hooks', And((Text('react'), Text('hooks')))),
+    ('a AND b', And((Text('a'), Text('b')))),
+    # AND (anche implicito) lega più di OR
+    ('a OR b c', Or((Text('a'), And((Text('b'), Text('c')))))),
+    # NOT lega più di OR
+    ('NOT a OR b', Or((Not(Text('a')), Text('b')))),
+    ('-tag:todo', Not(Term('tag', 'todo'))),
+    ('-(tag:a OR tag:b) c', And((Not(Or((Term('tag', 'a'), Term('tag', 'b')))), Text('c')))),
+    ('NOT (a b)', Not(And((Text('a'), Text('b'))))),
+    ('"exact phrase"', Text('"exact phrase"')),
+    # Virgolette non chiuse: il resto è una frase
+    ('"unclosed phrase', Text('"unclosed phrase"')),
+    ('tag:a "open', And((Term('tag', 'a'), Text('"open"')))),
+    # Campo sconosciuto: testo libero
+    ('http://example.com', Text('http://example.com')),
+    # Operatori senza operandi vengono ignorati
+    ('a AND', Text('a')),
+    ('OR a', Text('a')),
+])
+def test_parse_query(text, expected):
+    assert parse_query(text)[0] == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('tag:a', Sort('updated', 'desc')),
+    ('sort:title', Sort('title', 'asc')),
+    ('sort:created', Sort('created', 'desc')),
+    ('tag:a sort:title:desc', Sort('title', 'desc')),
+    ('SORT:Updated:ASC', Sort('updated', 'asc')),
+])
+def test_parse_sort(text, expected):
+    assert parse_query(text)[1] == expected
+
+
+@pytest.mark.parametrize('text, message', [
+    ('(a', "Missing ')'"),
+    ('a)', "Unbalanced ')'"),
+    ('a OR (b c', "Missing ')'"),
+    ('NOT', 'NOT without a term'),
+    ('a NOT', 'NOT without a term'),
+    ('-sort:title', 'Cannot negate'),
+    ('NOT sort:title', 'cannot be negated'),
+    ('sort:size', 'Unknown sort'),
+    ('sort:title:up', 'Unknown sort direction'),
+    ('tag:', 'Missing value for tag:'),
+    ('type:image', 'Unknown note type'),
+    ('created:yesterday', 'Invalid date filter'),
+    ('updated:2026-02-30', 'Invalid date'),
+    ('created:>2026-01-01..2026-01-31', 'Invalid date filter'),
+])
+def test_syntax_errors(text, message):
+    with pytest.raises(QuerySyntaxError, match=re.escape(message)):
+        compile_query(text)
+
+
+# Compilatore
+
+def test_empty_query_has_no_condition():
+    assert compile_query('').where == '1=1'
+
+
+def test_unsearchable_text_matches_nothing():
+    assert compile_query('!!!').where == '0'
+    assert compile_query('tag:a OR ???').where.endswith(' OR (0)')
+
+
+@pytest.mark.parametrize('text, where, params', [
+    ('created:2026-01-15', 'n.created_at >= ? AND n.created_at < ?', ('2026-01-15', '2026-01-16')),
+    ('updated:>2026-01-31', 'n.updated_at >= ?', ('2026-02-01',)),
+    ('updated:>=2026-01-31', 'n.updated_at >= ?', ('2026-01-31',)),
+    ('created:<2026-01-31', 'n.created_at < ?', ('2026-01-31',)),
+    ('created:<=2026-12-31', 'n.created_at < ?', ('2027-01-01',)),
+    ('created:2026-01-01..2026-01-31', 'n.created_at >= ? AND n.created_at < ?', ('2026-01-01', '2026-02-01')),
+])
+def test_date_ranges(text, where, params):
+    compiled = compile_query(text)
+    assert (compiled.where, compiled.params) == (where, params)
+
+
+def test_tags_use_index_or_exists():
+    assert compile_query('tag:a').where.startswith('n.id IN (SELECT note_id FROM note_tags')
+    assert compile_query('tag:a', paged=True).where.startswith('EXISTS (')
+    # Negato: sempre un controllo per appunto
+    assert compile_query('-tag:a').where.startswith('NOT (EXISTS (')
+
+
+def test_type_is_normalized():
+    compiled = compile_query('type:CODE')
+    assert (compiled.where, compiled.params) == ('n.type = ?', ('code',))
+
+
+# Esecuzione
+
+@pytest.fixture(scope='module')
+def db():
+    db = NotesDatabase(str(Path(tempfile.mkdtemp(prefix='notes-test-')) / 'notes.db'), seed=False)
+    work = db.create_folder('Work')
+    notes = [
+        ('React hooks', 'code', work['id'], ['python', 'react']),
+        ('Python script', 'code', None, ['python', 'todo']),
+        ('Shopping list', 'list', None, ['todo']),
+        ('Meeting notes', 'text', work['id'], []),
+    ]
+    for title, note_type, folder_id, tags in notes:
+        db.create_note(title, f'{title} content', note_type, folder_id, tags, auto_create_tags=True)
+    yield db
+    db.close()
+
+
+def titles(db, q):
+    return sorted(note['title'] for note in db.get_notes(q=q, fields='list'))
+
+
+@pytest.mark.parametrize('q, expected', [
+    ('tag:python', ['Python script', 'React hooks']),
+    ('tag:python AND NOT tag:todo', ['React hooks']),
+    ('tag:react OR tag:todo', ['Python script', 'React hooks', 'Shopping list']),
+    ('tag:react OR tag:todo type:list', ['React hooks', 'Shopping list']),
+    ('-(tag:python OR tag:todo)', ['Meeting notes']),
+    ('folder:work', ['Meeting notes', 'React hooks']),
+    ('folder:none type:code', ['Python script']),
+    ('hooks OR shopping', ['React hooks', 'Shopping list']),
+    ('!!!', []),
+])
+def test_get_notes_with_query(db, q, expected):
+    assert titles(db, q) == expected
+    assert db.count_notes(q=q) == len(expected)
+
+
+def test_sort_by_title(db):
+    notes = db.get_notes(q='sort:title', fields='list')
+    assert [note['title'] for note in notes] == sorted(note['title'] for note in notes)
+
+
+# Piani di esecuzione: le condizioni con un termine positivo partono da un indice
+
+@pytest.mark.parametrize('q', [
+    'tag:python',
+    'tag:python AND NOT tag:todo',
+    '(tag:python OR tag:react) -tag:todo',
+    'folder:work updated:>2026-01-01',
+    'react hooks',
+    'folder:work react',
+])
+def test_count_plans_use_indexes(db, q):
+    compiled = compile_query(q)
+    sql = f'SELECT COUNT(*) FROM notes n WHERE {compiled.where}'
+    with db.get_connection() as conn:
+        plan = [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', compiled.params)]
+    assert full_scans(sql, plan) == []
@@ -0,0 +1,8 @@
+from benchmarks import query_plans
+
+
+def test_hot_queries_use_indexes():
+    problems = query_plans.check()
+    assert problems == {}, '\n'.join(
+        f'{name}: {scans}\n    {sql}' for name, entries in problems.items() for sql, scans in entries
+    )
@@ -0,0 +1,112 @@
+import asyncio
+
+import server
+from async_db import AsyncNotesDatabase
+
+
+def new_note(client, title, **fields):
+    response = client.post('/api/notes', json={'title': title, 'content': f'{title} body', 'type': 'text', **fields})
+    assert response.status_code == 200
+    return response.json()
+
+
+def backdate_change_log(client, days):
+    """Sposta indietro di `days` giorni le voci già presenti nel change log"""
+    with client.app.state.db.db.get_connection() as conn:
+        conn.execute('UPDATE change_log SET changed_at = datetime(changed_at, ?)', (f'-{days} days',))
+        conn.commit()
+
+
+def test_full_sync_without_token(client):
+    folder = client.post('/api/folders', json={'name': 'Work'}).json()
+    note = new_note(client, 'First', folder_id=folder['id'])
+
+    body = client.get('/api/sync').json()
+    assert body['full'] is True and body['has_more'] is False
+    assert [n['id'] for n in body['notes']] == [note['id']]
+    assert [f['id'] for f in body['folders']] == [folder['id']]
+    assert body['deleted'] == {'notes': [], 'folders': [], 'tags': []}
+
+    # Il token punta all'ultima modifica: nulla di nuovo
+    again = client.get('/api/sync', params={'since': body['token']}).json()
+    assert again['full'] is False
+    assert again['notes'] == [] and again['token'] == body['token']
+
+
+def test_incremental_sync_with_tombstones(client):
+    kept = new_note(client, 'Kept')
+    removed = new_note(client, 'Removed')
+    token = client.get('/api/sync').json()['token']
+
+    client.put(f"/api/notes/{kept['id']}", json={'title': 'Kept, edited'})
+    client.delete(f"/api/notes/{removed['id']}")
+    added = new_note(client, 'Added')
+    # Creato e subito eliminato: solo una tombstone
+    ephemeral = new_note(client, 'Ephemeral')
+    client.delete(f"/api/notes/{ephemeral['id']}")
+
+    body = client.get('/api/sync', params={'since': token}).json()
+    assert body['full'] is False and body['has_more'] is False
+    assert sorted(n['title'] for n in body['notes']) == ['Added', 'Kept, edited']
+    assert {n['id'] for n in body['notes']} == {kept['id'], added['id']}
+    assert body['deleted']['notes'] == sorted([removed['id'], ephemeral['id']])
+
+
+def test_sync_pages_with_has_more(client):
+    token = client.get('/api/sync').json()['token']
+    created = {new_note(client, f'Note {i}')['id'] for i in range(7)}
+
+    seen, pages = set(), 0
+    while True:
+        body = client.get('/api/sync', params={'since': token, 'limit': 3}).json()
+        seen.update(n['id'] for n in body['notes'])
+        token = body['token']
+        pages += 1
+        if not body['has_more']:
+            break
+    assert seen == created
+    assert pages == 3
+
+
+def test_expired_token_is_gone(client):
+    new_note(client, 'Old')
+    old_token = client.get('/api/sync').json()['token']
+    new_note(client, 'Older than the token')
+    backdate_change_log(client, 60)
+    new_note(client, 'Recent')
+
+    assert client.app.state.db.db.prune_change_log(30) == 2
+    response = client.get('/api/sync', params={'since': old_token})
+    assert response.status_code == 410
+    # Dopo la sincronizzazione completa il nuovo token vale di nuovo
+    token = client.get('/api/sync').json()['token']
+    assert client.get('/api/sync', params={'since': token}).status_code == 200
+    assert client.get('/api/sync', params={'since': 'not a token'}).status_code == 400
+
+
+def test_change_log_is_pruned_periodically(db):
+    adb = AsyncNotesDatabase(db)
+    db.create_note('Note', 'body', 'text')
+
+    def change_count():
+        with db.get_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+
+    async def prune_while_running():
+        task = asyncio.create_task(server.prune_change_log_periodically(adb, 0.02))
+        try:
+            await asyncio.sleep(0.01)
+            assert change_count() == 1
+            # Le voci scadono dopo la prima pulizia: le toglie un giro successivo
+            with db.get_connection() as conn:
+                conn.execute("UPDATE change_log SET changed_at = datetime(changed_at, '-60 days')")
+                conn.commit()
+            await asyncio.sleep(0.1)
+            assert change_count() == 0
+        finally:
+            task.cancel()
+
+    try:
+        asyncio.run(prune_while_running())
+    finally:
+        adb.close()
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+
+def tag_names(db, note_id):
+    return sorted(tag['name'] for tag in db.get_note_by_id(note_id)['tags'])
+
+
+def links(db, note_id):
+    """rowid di ogni collegamento: restano uguali se il collegamento non viene riscritto"""
+    with db.get_connection() as conn:
+        return {row['name']: row['rowid'] for row in conn.execute('''
+            SELECT t.name, nt.rowid FROM note_tags nt JOIN tags t ON t.id = nt.tag_id
+            WHERE nt.note_id = ?
+        ''', (note_id,))}
+
+
+def test_only_differences_are_written(db):
+    note = db.create_note('Note', 'body', 'text', tag_names=['a', 'b'], auto_create_tags=True)
+    before = links(db, note['id'])
+
+    db.update_note(note['id'], tag_names=['b', 'c'], auto_create_tags=True)
+    after = links(db, note['id'])
+    assert sorted(after) == ['b', 'c']
+    assert after['b'] == before['b']
+
+    # Stessi tag in un altro ordine, con doppioni: nessuna scrittura
+    db.update_note(note['id'], tag_names=['c', 'b', 'c'])
+    assert links(db, note['id']) == after
+    db.update_note(note['id'], tag_names=[])
+    assert links(db, note['id']) == {}
+    assert db.check_counters() == []
+
+
+def test_unknown_tags_are_ignored_without_auto_create(db):
+    db.create_tag('known', '#000000')
+    note = db.create_note('Note', 'body', 'text', tag_names=['known', 'unknown'])
+    assert tag_names(db, note['id']) == ['known']
+    assert [tag['name'] for tag in db.get_tags()] == ['known']
+
+
+def test_created_tags_are_reused(db):
+    first = db.create_note('First', 'body', 'text', tag_names=['fresh'], auto_create_tags=True)
+    # Ora il tag esiste: non serve crearlo
+    second = db.create_note('Second', 'body', 'text', tag_names=['fresh'])
+    assert tag_names(db, first['id']) == tag_names(db, second['id']) == ['fresh']
+
+
+def test_rolled_back_tags_are_forgotten(db):
+    db.get_tags()
+    # Il tag nuovo compare nel primo e nel secondo blocco dell'import, l'id
+    # duplicato in fondo annulla tutto
+    notes = [{'id': f'n{i}', 'title': f'Note {i}', 'content': 'body', 'type': 'text',
+              'tag_names': ['zzz'] if i in (0, 1000) else []} for i in range(1001)]
+    notes.append({'id': 'n0', 'title': 'Duplicate', 'content': 'body', 'type': 'text'})
+    with pytest.raises(sqlite3.IntegrityError):
+        db.import_notes(notes, auto_create_tags=True)
+
+    # AUTOINCREMENT assegna al prossimo tag l'id annullato
+    other = db.create_tag('other', '#000000')
+    note = db.create_note('Note', 'body', 'text', tag_names=['zzz'])
+    assert tag_names(db, note['id']) == []
+    assert db.count_notes(tag='other') == 0
+
+    note = db.create_note('Note', 'body', 'text', tag_names=['zzz'], auto_create_tags=True)
+    assert tag_names(db, note['id']) == ['zzz']
+    assert {tag['name']: tag['id'] for tag in db.get_tags()}['zzz'] != other['id']
+
+
+def test_tag_created_in_a_failed_import_is_forgotten(db):
+    note = db.create_note('Note', 'body', 'text')
+    db.get_tags()
+    # Tag creato e id duplicato nello stesso blocco
+    with pytest.raises(sqlite3.IntegrityError):
+        db.import_notes([{'id': note['id'], 'title': 'Duplicate', 'content': 'body', 'type': 'text',
+                          'tag_names': ['ghost']}], auto_create_tags=True)
+
+    db.create_tag('real', '#000000')
+    db.update_note(note['id'], tag_names=['ghost'])
+    assert tag_names(db, note['id']) == []